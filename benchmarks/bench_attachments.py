@@ -0,0 +1,103 @@
+import argparse
+import base64
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+from db.database import Database
+
+
+def measure(fn, runs):
+    # (median ms, peak traced MB) over runs calls
+    samples, peaks = [], []
+    for _ in range(runs):
+        tracemalloc.start()
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+        peaks.append(tracemalloc.get_traced_memory()[1] / 1e6)
+        tracemalloc.stop()
+    return statistics.median(samples), max(peaks)
+
+
+def write_file(path, size):
+    with open(path, "wb") as f:
+        for _ in range(size // (1 << 20)):
+            f.write(os.urandom(1 << 20))
+
+
+def write_image(path, width, height):
+    from PIL import Image
+
+    image = Image.effect_noise((width, height), 64).convert("RGB")
+    image.save(path, "JPEG", quality=90)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Attachment store: chunked blobs vs whole-file writes")
+    parser.add_argument("--size-mb", type=int, default=64)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, "bench.db"))
+        note_id = db.add_note("Attachments", "", "", "General")
+        big = os.path.join(tmp, "big.bin")
+        write_file(big, args.size_mb << 20)
+        photo = os.path.join(tmp, "photo.jpg")
+        write_image(photo, 4000, 3000)
+
+        def naive_add():
+            # The file read whole and inlined as base64, as pasting into content would
+            with open(big, "rb") as f:
+                data = base64.b64encode(f.read()).decode()
+            with db.conn as conn:
+                conn.execute(
+                    "INSERT INTO notes (title, content) VALUES (?, ?)", ("inline", data)
+                )
+
+        attachment_ids = []
+
+        def chunked_add():
+            # A fresh byte first, so every run stores a new blob
+            with open(big, "r+b") as f:
+                f.write(os.urandom(1))
+            attachment_ids.append(db.add_attachment(note_id, big))
+
+        rows = [
+            ("add, base64 in content", *measure(naive_add, args.runs)),
+            ("add, chunked blob", *measure(chunked_add, args.runs)),
+            ("add, duplicate", *measure(lambda: db.add_attachment(note_id, big), args.runs)),
+            (
+                "read, whole blob",
+                *measure(
+                    lambda: db.conn.execute(
+                        "SELECT data FROM blobs b JOIN attachments a ON a.blob_id = b.id WHERE a.id = ?",
+                        (attachment_ids[-1],),
+                    ).fetchone(),
+                    args.runs,
+                ),
+            ),
+            (
+                "read, chunked",
+                *measure(
+                    lambda: sum(len(chunk) for chunk in db.iter_attachment(attachment_ids[-1])),
+                    args.runs,
+                ),
+            ),
+        ]
+        photo_id = db.add_attachment(note_id, photo)
+        rows.append(("thumbnail, first", *measure(lambda: db.get_thumbnail(photo_id), 1)))
+        rows.append(("thumbnail, cached", *measure(lambda: db.get_thumbnail(photo_id), args.runs)))
+        db.close()
+
+    print(f"{args.size_mb} MB file, 4000x3000 JPEG for thumbnails")
+    print(f"{'operation':<26}{'ms':>10}{'peak MB':>10}")
+    for label, ms, peak in rows:
+        print(f"{label:<26}{ms:>10.2f}{peak:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from benchmarks.corpus import Corpus
+from db.database import Database
+
+
+class LegacyDatabase:
+    # Connection-per-call behaviour of the original Database, for comparison.
+    # Both sides run the same raw statements, so only the connection cost
+    # differs; benchmarks.run times the full search_notes/update_note paths.
+    def __init__(self, db_path):
+        self.db_path = db_path
+
+    def get_note_by_id(self, note_id):
+        with sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            return conn.execute("SELECT * FROM notes WHERE id = ?", (note_id,)).fetchone()
+
+    def fts_match(self, query):
+        with sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            return conn.execute(
+                "SELECT rowid FROM notes_fts WHERE notes_fts MATCH ? ORDER BY rank LIMIT 20",
+                (query,),
+            ).fetchall()
+
+    def update_title(self, note_id, title):
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("UPDATE notes SET title = ? WHERE id = ?", (title, note_id))
+            conn.commit()
+
+
+class PersistentDatabase(LegacyDatabase):
+    def __init__(self, db_path):
+        self.db = Database(db_path)
+
+    def get_note_by_id(self, note_id):
+        return self.db.get_note_by_id(note_id)
+
+    def fts_match(self, query):
+        return self.db.conn.execute(
+            "SELECT rowid FROM notes_fts WHERE notes_fts MATCH ? ORDER BY rank LIMIT 20",
+            (query,),
+        ).fetchall()
+
+    def update_title(self, note_id, title):
+        with self.db.conn as conn:
+            conn.execute("UPDATE notes SET title = ? WHERE id = ?", (title, note_id))
+
+
+def time_calls(fn, args_list):
+    start = time.perf_counter()
+    for args in args_list:
+        fn(*args)
+    return (time.perf_counter() - start) / len(args_list) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-call latency: connection-per-call vs persistent")
+    parser.add_argument("--notes", type=int, default=100_000)
+    parser.add_argument("--calls", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        corpus = Corpus(args.notes)
+        corpus.build(db_path).close()
+        ids = [(rng.randint(1, args.notes),) for _ in range(args.calls)]
+        queries = [(query,) for query in corpus.queries(args.calls // 10)]
+        updates = [(rng.randint(1, args.notes), "renamed") for _ in range(args.calls // 10)]
+
+        print(f"{'operation':<16}{'before (us)':>14}{'after (us)':>14}")
+        for label, method, calls in (
+            ("get_note_by_id", "get_note_by_id", ids),
+            ("fts_match", "fts_match", queries),
+            ("update_title", "update_title", updates),
+        ):
+            before = time_calls(getattr(LegacyDatabase(db_path), method), calls)
+            persistent = PersistentDatabase(db_path)
+            after = time_calls(getattr(persistent, method), calls)
+            persistent.db.close()
+            print(f"{label:<16}{before:>14.1f}{after:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
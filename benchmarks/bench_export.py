@@ -0,0 +1,70 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.corpus import Corpus
+from utils.export_utils import export_notes
+
+
+def legacy_export(db, filename):
+    # The original export: every note in memory, copied to dicts, one json.dump
+    notes = db.get_all_notes()
+    notes_data = [
+        {
+            "id": note["id"],
+            "title": note["title"],
+            "content": note["content"],
+            "tags": note["tags"],
+            "category": note["category"],
+            "created_at": note["created_at"],
+        }
+        for note in notes
+    ]
+    with open(filename, "w") as f:
+        json.dump(notes_data, f, indent=2)
+
+
+def peak_memory(fn, *args):
+    tracemalloc.start()
+    fn(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def elapsed(fn, *args):
+    # Timed separately: tracemalloc slows allocation-heavy code several times over
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Peak Python heap during export")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--legacy-limit", type=int, default=100_000)
+    parser.add_argument("--body-words", type=int, default=25)
+    args = parser.parse_args()
+
+    print(f"{'notes':>10}{'file (MB)':>11}{'legacy peak (MB)':>18}{'stream peak (MB)':>18}{'stream (s)':>12}{'jsonl.gz (s)':>14}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            corpus = Corpus(size, body_words=args.body_words, body_sigma=0.4, markdown=False)
+            db = corpus.build(os.path.join(tmp, "bench.db"))
+            out = os.path.join(tmp, "out.json")
+            legacy = "-"
+            if size <= args.legacy_limit:
+                legacy = f"{peak_memory(legacy_export, db, out) / 1e6:.1f}"
+            peak = peak_memory(export_notes, db, out, "json")
+            json_time = elapsed(export_notes, db, out, "json")
+            file_size = os.path.getsize(out) / 1e6
+            gz_time = elapsed(export_notes, db, out + "l.gz", "jsonl")
+            db.close()
+        print(f"{size:>10}{file_size:>11.1f}{legacy:>18}{peak / 1e6:>18.2f}{json_time:>12.1f}{gz_time:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from benchmarks.corpus import Corpus
+from db.database import match_query, month_range
+
+FACET_TRIGGERS = (
+    "facet_counts_insert",
+    "facet_counts_delete",
+    "facet_counts_update",
+    "tag_counts_insert",
+    "tag_counts_delete",
+)
+
+SCAN_COUNTS = (
+    "SELECT category, COUNT(*) FROM notes GROUP BY category",
+    "SELECT substr(created_at, 1, 7), COUNT(*) FROM notes GROUP BY 1",
+    "SELECT t.name, COUNT(*) FROM note_tags nt JOIN tags t ON t.id = nt.tag_id GROUP BY nt.tag_id",
+)
+
+
+def median_ms(fn, args_list):
+    samples = []
+    for args in args_list:
+        start = time.perf_counter()
+        fn(*args)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def without_triggers(db):
+    # The same vault as it was before facet counts were maintained
+    with db.conn as conn:
+        for name in FACET_TRIGGERS:
+            conn.execute(f"DROP TRIGGER {name}")
+    return db
+
+
+def scan_counts(db):
+    return [db.conn.execute(sql).fetchall() for sql in SCAN_COUNTS]
+
+
+def summary_counts(db):
+    return db.get_category_counts(), db.get_month_counts(), db.get_tag_counts()
+
+
+def filter_by_created_at(db, category, since, until):
+    # The category filter on the best index that existed before idx_notes_category
+    return db.conn.execute(
+        """
+        SELECT id, title, created_at FROM notes INDEXED BY idx_notes_created_at
+        WHERE category = ? AND created_at >= ? AND created_at < ?
+        ORDER BY created_at DESC, id DESC LIMIT 200
+        """,
+        (category, since, until),
+    ).fetchall()
+
+
+def write_ms(db, calls, seed):
+    # Median ms of add, category change and delete over calls notes each
+    rng = random.Random(seed)
+    categories = [row[0] for row in db.get_category_counts()] + ["Archive"]
+    ids = [db.add_note(f"Note {i}", "body", "alpha,beta", "General") for i in range(calls)]
+    add = median_ms(
+        lambda: ids.append(db.add_note("Note", "body", "alpha,beta", "General")),
+        [()] * calls,
+    )
+    update = median_ms(
+        lambda note_id: db.update_note_fields(note_id, category=rng.choice(categories)),
+        [(note_id,) for note_id in ids],
+    )
+    delete = median_ms(db.delete_note, [(note_id,) for note_id in ids])
+    return add, update, delete
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Facet counts and filters: summary tables vs scans")
+    parser.add_argument("--notes", type=int, default=100_000)
+    parser.add_argument("--calls", type=int, default=200)
+    args = parser.parse_args()
+
+    corpus = Corpus(args.notes)
+    with tempfile.TemporaryDirectory() as tmp:
+        db = corpus.build(os.path.join(tmp, "bench.db"))
+        months = [month for month, _ in db.get_month_counts()]
+        categories = [category for category, _ in db.get_category_counts()]
+        tags = [name for name, _ in db.get_tag_counts()]
+        rng = random.Random(3)
+        filters = [
+            (rng.choice(categories), *month_range(rng.choice(months)))
+            for _ in range(args.calls)
+        ]
+        queries = [match_query(q, prefix=False) for q in corpus.queries(args.calls // 4)]
+        rows = [
+            ("counts, scanning notes", median_ms(scan_counts, [(db,)] * 20)),
+            ("counts, summary tables", median_ms(summary_counts, [(db,)] * 20)),
+            (
+                "category + month, created_at index",
+                median_ms(lambda *f: filter_by_created_at(db, *f), filters),
+            ),
+            (
+                "category + month, covering index",
+                median_ms(
+                    lambda c, since, until: db.filter_notes(
+                        categories=[c], since=since, until=until, limit=200
+                    ),
+                    filters,
+                ),
+            ),
+            (
+                "tag + month",
+                median_ms(
+                    lambda c, since, until: db.filter_notes(
+                        tags=[rng.choice(tags)], since=since, until=until, limit=200
+                    ),
+                    filters,
+                ),
+            ),
+            (
+                "search",
+                median_ms(lambda q: db.search_notes(q, limit=50), [(q,) for q in queries]),
+            ),
+            (
+                "search + category + month",
+                median_ms(
+                    lambda q, f: db.search_notes(
+                        q,
+                        limit=50,
+                        facets={"categories": [f[0]], "since": f[1], "until": f[2]},
+                    ),
+                    list(zip(queries, filters)),
+                ),
+            ),
+        ]
+        with_counts = write_ms(db, args.calls, seed=5)
+        db.close()
+        plain = without_triggers(corpus.build(os.path.join(tmp, "plain.db")))
+        without_counts = write_ms(plain, args.calls, seed=5)
+        plain.close()
+
+    print(f"{args.notes} notes, {len(categories)} categories, {len(months)} months, {len(tags)} tags")
+    print(f"{'query':<36}{'ms':>10}")
+    for label, ms in rows:
+        print(f"{label:<36}{ms:>10.2f}")
+    print()
+    print(f"{'write':<36}{'no counts':>10}{'counts':>10}")
+    labels = ("add_note", "change category", "delete_note")
+    for label, before, after in zip(labels, without_counts, with_counts):
+        print(f"{label:<36}{before:>10.3f}{after:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
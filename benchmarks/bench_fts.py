@@ -0,0 +1,95 @@
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from benchmarks.corpus import Corpus
+from db.database import Database
+
+
+def build_legacy(db_path, corpus):
+    # Schema as it was before the external-content migration
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("""
+            CREATE TABLE notes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                title TEXT NOT NULL,
+                content TEXT,
+                tags TEXT,
+                category TEXT,
+                created_at TIMESTAMP
+            )
+        """)
+        conn.execute(
+            "CREATE VIRTUAL TABLE notes_fts USING fts5(title, content, tokenize=porter)"
+        )
+        for note in corpus.generate():
+            conn.execute(
+                "INSERT INTO notes (id, title, content, tags, category, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                note,
+            )
+            conn.execute(
+                "INSERT INTO notes_fts (rowid, title, content) VALUES (?, ?, ?)",
+                note[:3],
+            )
+
+
+def search_latency(db_path, queries):
+    conn = sqlite3.connect(db_path)
+    start = time.perf_counter()
+    for query in queries:
+        conn.execute(
+            "SELECT rowid FROM notes_fts WHERE notes_fts MATCH ? ORDER BY rank LIMIT 20",
+            (query,),
+        ).fetchall()
+    elapsed = (time.perf_counter() - start) / len(queries) * 1e3
+    conn.close()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Standalone vs external-content FTS index")
+    parser.add_argument("--notes", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--edits", type=int, default=20_000)
+    args = parser.parse_args()
+
+    rng = random.Random(2)
+    corpus = Corpus(args.notes)
+    queries = corpus.queries(args.queries)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        build_legacy(db_path, corpus)
+        with sqlite3.connect(db_path) as conn:
+            conn.execute("VACUUM")
+        rows = [("standalone", os.path.getsize(db_path), search_latency(db_path, queries))]
+
+        db = Database(db_path)
+        for _ in range(args.edits):
+            note_id = rng.randint(1, args.notes)
+            with db.conn as conn:
+                conn.execute(
+                    "UPDATE notes SET title = title || ' edited' WHERE id = ?", (note_id,)
+                )
+        db.close()
+        db = Database(db_path, journal_mode="DELETE")
+        with db.conn as conn:
+            conn.execute("VACUUM")
+        rows.append(("external, edited", os.path.getsize(db_path), search_latency(db_path, queries)))
+
+        db.optimize_search_index()
+        assert db.check_search_index()
+        with db.conn as conn:
+            conn.execute("VACUUM")
+        db.close()
+        rows.append(("external, optimized", os.path.getsize(db_path), search_latency(db_path, queries)))
+
+        print(f"{'index':<22}{'db size (MB)':>14}{'search (ms)':>14}")
+        for label, size, latency in rows:
+            print(f"{label:<22}{size / 1e6:>14.1f}{latency:>14.3f}")
+
+
+if __name__ == "__main__":
+    main()
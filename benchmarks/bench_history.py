@@ -0,0 +1,136 @@
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime
+
+from benchmarks.corpus import Corpus
+from db.database import Database
+
+
+def edit(rng, corpus, text):
+    # One save's worth of change: reword, add or drop a paragraph
+    blocks = text.split("\n\n")
+    kind = rng.random()
+    i = rng.randrange(len(blocks))
+    if kind < 0.6:
+        words = blocks[i].split(" ")
+        for _ in range(rng.randint(1, 3)):
+            words[rng.randrange(len(words))] = corpus.sample_words(rng, 1)[0]
+        blocks[i] = " ".join(words)
+    elif kind < 0.85 or len(blocks) == 1:
+        blocks.insert(i, " ".join(corpus.sample_words(rng, rng.randint(10, 60))))
+    else:
+        del blocks[i]
+    return "\n\n".join(blocks)
+
+
+def median_ms(fn, args_list):
+    samples = []
+    for args in args_list:
+        start = time.perf_counter()
+        fn(*args)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def table_size(conn, *names):
+    placeholders = ",".join("?" for _ in names)
+    return conn.execute(
+        f"SELECT SUM(pgsize) FROM dbstat WHERE name IN ({placeholders})", names
+    ).fetchone()[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Revision history: deltas vs full copies")
+    parser.add_argument("--notes", type=int, default=500)
+    parser.add_argument("--edits", type=int, default=60, help="saves per note")
+    parser.add_argument("--restores", type=int, default=300)
+    args = parser.parse_args()
+
+    rng = random.Random(5)
+    corpus = Corpus(args.notes)
+    notes = [(title, content) for _, title, content, *_ in corpus.generate()]
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, "delta.db"))
+        # The naive alternative: same schema, every overwritten version kept verbatim
+        full_db = Database(os.path.join(tmp, "full.db"))
+        full = full_db.conn
+        full.execute(
+            "CREATE TABLE full_revisions (note_id INTEGER, revision INTEGER, title TEXT, content TEXT,"
+            " PRIMARY KEY (note_id, revision))"
+        )
+        texts = {}
+        for title, content in notes:
+            note_id = db.add_note(title, content, "", "General")
+            full_db.add_note(title, content, "", "General")
+            texts[note_id] = content
+
+        delta_ms, full_ms = [], []
+        for revision in range(1, args.edits + 1):
+            for note_id, (title, _) in enumerate(notes, start=1):
+                text = texts[note_id] = edit(rng, corpus, texts[note_id])
+                start = time.perf_counter()
+                db.update_note(note_id, title, text, "", "General")
+                delta_ms.append((time.perf_counter() - start) * 1000)
+                start = time.perf_counter()
+                with full:
+                    full.execute(
+                        "INSERT INTO full_revisions SELECT id, ?, title, content FROM notes WHERE id = ?",
+                        (revision, note_id),
+                    )
+                    full.execute(
+                        "UPDATE notes SET content = ?, updated_at = ? WHERE id = ?",
+                        (text, datetime.now(), note_id),
+                    )
+                full_ms.append((time.perf_counter() - start) * 1000)
+
+        delta_bytes = db.conn.execute("SELECT SUM(LENGTH(data)) FROM note_revisions").fetchone()[0]
+        full_bytes = full.execute("SELECT SUM(LENGTH(content)) FROM full_revisions").fetchone()[0]
+        delta_pages = table_size(db.conn, "note_revisions", "idx_note_revisions")
+        full_pages = table_size(full, "full_revisions", "sqlite_autoindex_full_revisions_1")
+
+        picks = [
+            (rng.randint(1, args.notes), rng.randint(1, args.edits)) for _ in range(args.restores)
+        ]
+        rows = [
+            ("save (update_note)", statistics.median(delta_ms), statistics.median(full_ms)),
+            (
+                "get revision",
+                median_ms(db.get_revision, picks),
+                median_ms(
+                    lambda i, r: full.execute(
+                        "SELECT title, content FROM full_revisions WHERE note_id = ? AND revision = ?",
+                        (i, r),
+                    ).fetchone(),
+                    picks,
+                ),
+            ),
+            (
+                "list revisions",
+                median_ms(db.get_revisions, [(i,) for i, _ in picks]),
+                median_ms(
+                    lambda i: full.execute(
+                        "SELECT revision, title FROM full_revisions WHERE note_id = ? ORDER BY revision DESC",
+                        (i,),
+                    ).fetchall(),
+                    [(i,) for i, _ in picks],
+                ),
+            ),
+        ]
+        db.close()
+        full_db.close()
+
+    print(f"{args.notes} notes x {args.edits} saves")
+    print(f"{'storage (MB)':<24}{'deltas':>12}{'full copies':>14}")
+    print(f"{'revision payload':<24}{delta_bytes / 1e6:>12.2f}{full_bytes / 1e6:>14.2f}")
+    print(f"{'table + index pages':<24}{delta_pages / 1e6:>12.2f}{full_pages / 1e6:>14.2f}")
+    print(f"{'latency (ms)':<24}{'deltas':>12}{'full copies':>14}")
+    for label, delta, copy in rows:
+        print(f"{label:<24}{delta:>12.3f}{copy:>14.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from benchmarks.corpus import Corpus
+from db.database import Database
+from utils.import_utils import import_notes, read_jsonl
+
+
+def write_source(path, count):
+    with open(path, "w", encoding="utf-8") as f:
+        for note_id, title, content, tags, category, created_at in Corpus(count).generate():
+            note = {
+                "id": note_id,
+                "title": title,
+                "content": content,
+                "tags": tags,
+                "category": category,
+                "created_at": created_at.isoformat(),
+            }
+            f.write(json.dumps(note) + "\n")
+
+
+def add_note_loop(db, path, limit):
+    start = time.perf_counter()
+    count = 0
+    for item in read_jsonl(path):
+        db.add_note(item["title"], item["content"], item["tags"], item["category"])
+        count += 1
+        if count == limit:
+            break
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="add_note loop vs bulk import throughput")
+    parser.add_argument("--notes", type=int, default=100_000)
+    parser.add_argument("--loop-notes", type=int, default=10_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "notes.jsonl")
+        write_source(source, args.notes)
+        loop_db = Database(os.path.join(tmp, "loop.db"))
+        loop_rate = add_note_loop(loop_db, source, args.loop_notes)
+        loop_db.close()
+        bulk_db = Database(os.path.join(tmp, "bulk.db"))
+        imported, bulk_rate = import_notes(bulk_db, source)
+        assert bulk_db.check_search_index()
+        bulk_db.close()
+
+    print(f"{'path':<14}{'notes':>10}{'notes/s':>12}")
+    print(f"{'add_note':<14}{args.loop_notes:>10}{loop_rate:>12.0f}")
+    print(f"{'import_notes':<14}{imported:>10}{bulk_rate:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from benchmarks.corpus import Corpus
+from db.related import RelatedNotesIndex
+
+
+def python_related(vectors, note_id, k):
+    # The per-pair loop the index replaces
+    query = vectors[note_id]
+    scores = []
+    for other_id, vector in vectors.items():
+        if other_id != note_id:
+            score = sum(w * vector.get(t, 0.0) for t, w in query.items())
+            if score > 0:
+                scores.append((score, other_id))
+    scores.sort(reverse=True)
+    return scores[:k]
+
+
+def median_ms(fn, args_list):
+    samples = []
+    for args in args_list:
+        start = time.perf_counter()
+        fn(*args)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Related-notes index build and query cost")
+    parser.add_argument("--notes", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--python-queries", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    corpus = Corpus(args.notes)
+    with tempfile.TemporaryDirectory() as tmp:
+        db = corpus.build(os.path.join(tmp, "bench.db"))
+        index = RelatedNotesIndex(db.db_path)
+        rows = []
+
+        start = time.perf_counter()
+        index.open(db)
+        rows.append(("build + save", (time.perf_counter() - start) * 1000))
+        size = os.path.getsize(index.path)
+
+        reopened = RelatedNotesIndex(db.db_path)
+        start = time.perf_counter()
+        reopened.open(db)
+        rows.append(("load + sync", (time.perf_counter() - start) * 1000))
+
+        note_ids = [(rng.randint(1, args.notes),) for _ in range(args.queries)]
+        rows.append(("related() top 10", median_ms(index.related, note_ids)))
+
+        db.add_listener(index.on_change)
+        notes = list(corpus.generate())
+        edits = [
+            (note_id, *notes[note_id - 1][1:3])
+            for (note_id,) in note_ids[: args.queries // 4]
+        ]
+        rows.append((
+            "update_note + index",
+            median_ms(lambda i, t, c: db.update_note(i, t + " edited", c, "", "General"), edits),
+        ))
+
+        vectors = {
+            int(index.ids[row]): dict(zip(index.terms[row].tolist(), index.weights[row].tolist()))
+            for row in range(index.count)
+        }
+        rows.append((
+            "per-pair Python loop",
+            median_ms(lambda i: python_related(vectors, i, 10), note_ids[: args.python_queries]),
+        ))
+        db.close()
+
+    print(f"{args.notes} notes, index file {size / 1e6:.1f} MB")
+    print(f"{'operation':<24}{'ms':>12}")
+    for label, ms in rows:
+        print(f"{label:<24}{ms:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.corpus import Corpus
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLI = os.path.join(ROOT, "cli.py")
+OPEN_WINDOW = (
+    "from ui.main_window import MainWindow\n"
+    "w = MainWindow()\n"
+    "w.update()\n"
+    "w.destroy()\n"
+)
+
+
+def has_display():
+    probe = subprocess.run(
+        [sys.executable, "-c", "import tkinter; tkinter.Tk().destroy()"],
+        capture_output=True,
+    )
+    return probe.returncode == 0
+
+
+def cold_start(command, runs, cwd):
+    # Each run is a fresh interpreter, so module imports are never cached in-process
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=cwd, env=env, check=True, capture_output=True)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start time of the GUI and CLI entry points")
+    parser.add_argument("--notes", type=int, default=10_000)
+    parser.add_argument("--runs", type=int, default=15)
+    args = parser.parse_args()
+
+    corpus = Corpus(args.notes)
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus.build(os.path.join(tmp, "knowledge_base.db")).close()
+        query = corpus.queries(1)[0]
+        commands = [
+            ("python (no imports)", [sys.executable, "-c", "pass"]),
+            ("import ui.main_window", [sys.executable, "-c", "import ui.main_window"]),
+        ]
+        if has_display():
+            commands.append(("open main window", [sys.executable, "-c", OPEN_WINDOW]))
+        commands += [
+            ("cli stats", [sys.executable, CLI, "stats"]),
+            ("cli search", [sys.executable, CLI, "search", query]),
+            ("cli tags", [sys.executable, CLI, "tags"]),
+            ("cli add", [sys.executable, CLI, "add", "Benchmark", "body", "--tags", "bench"]),
+        ]
+        print(f"{'entry point':<24}{'cold start (ms)':>18}")
+        for label, command in commands:
+            print(f"{label:<24}{cold_start(command, args.runs, tmp):>18.1f}")
+
+
+if __name__ == "__main__":
+    main()
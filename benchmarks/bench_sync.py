@@ -0,0 +1,92 @@
+import argparse
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+
+from benchmarks.corpus import Corpus
+from db.database import Database
+from db.sync import sync_vaults
+from utils.export_utils import export_notes
+from utils.import_utils import import_notes
+
+
+def elapsed_ms(fn):
+    start = time.perf_counter()
+    result = fn()
+    return (time.perf_counter() - start) * 1000, result
+
+
+def edit(db, rng, count, label):
+    # count changes: mostly edits, some new notes and deletes
+    ids = [row[0] for row in db.conn.execute("SELECT id FROM notes")]
+    for note_id in rng.sample(ids, count * 3 // 4):
+        note = db.get_note_by_id(note_id)
+        db.update_note_fields(note_id, content=f"{note['content']}\n\n{label} edit")
+    for i in range(count // 8):
+        db.add_note(f"{label} note {i}", "new", "sync", "General")
+    for note_id in rng.sample(ids, count - count * 3 // 4 - count // 8):
+        db.delete_note(note_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Journal sync vs rewriting the whole vault")
+    parser.add_argument("--notes", type=int, default=100_000)
+    parser.add_argument("--changes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path_a, path_b = os.path.join(tmp, "a.db"), os.path.join(tmp, "b.db")
+        Corpus(args.notes).build(path_a).close()
+
+        # The whole vault moved once: export, then import into an empty file
+        export_path = os.path.join(tmp, "export.jsonl")
+        source, full = Database(path_a), Database(os.path.join(tmp, "full.db"))
+        ms_export, _ = elapsed_ms(lambda: export_notes(source, export_path, "jsonl"))
+        ms_import, _ = elapsed_ms(lambda: import_notes(full, export_path))
+        source.close()
+        full.close()
+        rows.append(("export + import", args.notes, args.notes, ms_export + ms_import))
+
+        # A second device starting from a copy of the file
+        shutil.copy(path_a, path_b)
+        a, b = Database(path_a), Database(path_b)
+        b.renew_vault_id()
+        ms, ((read_a, applied_a), (read_b, applied_b)) = elapsed_ms(lambda: sync_vaults(a, b))
+        rows.append(("first sync of a copy", read_a + read_b, applied_a + applied_b, ms))
+
+        for count in args.changes:
+            samples = []
+            for _ in range(args.rounds):
+                edit(a, rng, count, "a")
+                edit(b, rng, count, "b")
+                ms, ((read_a, applied_a), (read_b, applied_b)) = elapsed_ms(
+                    lambda: sync_vaults(a, b)
+                )
+                samples.append(ms)
+            rows.append(
+                (
+                    f"sync, {count} changes per side",
+                    read_a + read_b,
+                    applied_a + applied_b,
+                    statistics.median(samples),
+                )
+            )
+        ms, _ = elapsed_ms(lambda: sync_vaults(a, b))
+        rows.append(("sync, nothing changed", 0, 0, ms))
+        a.close()
+        b.close()
+
+    print(f"{args.notes} notes per vault, median of {args.rounds} rounds")
+    print(f"{'operation':<32}{'read':>10}{'applied':>10}{'ms':>12}")
+    for label, read, applied, ms in rows:
+        print(f"{label:<32}{read:>10}{applied:>10}{ms:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.corpus import Corpus
+from db.database import Database, match_query
+from db.vaults import VaultSet, last_by_vault
+
+
+def build_vaults(corpus, count, tmp):
+    # One corpus dealt round-robin into vaults, so they share a vocabulary
+    batches = [[] for _ in range(count)]
+    for i, (_, title, content, tags, category, created_at) in enumerate(corpus.generate()):
+        batches[i % count].append((title, content, tags, category, created_at, created_at))
+    paths = []
+    for i, batch in enumerate(batches):
+        path = os.path.join(tmp, f"vault{i}.db")
+        db = Database(path)
+        db.bulk_insert_notes(batch)
+        db.finish_import()
+        db.close()
+        paths.append(path)
+    return paths
+
+
+def median_ms(fn, queries):
+    samples = []
+    for query in queries:
+        start = time.perf_counter()
+        fn(query)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Federated search: parallel vaults vs one after another")
+    parser.add_argument("--notes", type=int, default=100_000, help="total across all vaults")
+    parser.add_argument("--vaults", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=40)
+    args = parser.parse_args()
+
+    corpus = Corpus(args.notes)
+    queries = [match_query(q, prefix=False) for q in corpus.queries(args.queries)]
+    search = dict(limit=50, weights=(10.0, 1.0), excerpts=True)
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = build_vaults(corpus, args.vaults, tmp)
+        primary = Database(paths[0], search_cache_size=0)
+        vaults = VaultSet(primary)
+        for path in paths[1:]:
+            vaults.mount(path)
+        dbs = [vault.db for vault in vaults.vaults.values()]
+
+        def serial(query):
+            return [db.search_notes(query, **search) for db in dbs]
+
+        page_3 = {}
+        for query in queries:
+            seen = None
+            for _ in range(2):
+                seen = last_by_vault(vaults.search_notes(query, after=seen, **search), seen)
+            page_3[query] = seen
+
+        per_vault = [median_ms(lambda q: db.search_notes(q, **search), queries) for db in dbs]
+        rows = [
+            ("slowest single vault", max(per_vault)),
+            ("sum of single vaults", sum(per_vault)),
+            ("one after another", median_ms(serial, queries)),
+            ("parallel, merged", median_ms(lambda q: vaults.search_notes(q, **search), queries)),
+            (
+                "parallel, page 3",
+                median_ms(lambda q: vaults.search_notes(q, after=page_3[q], **search), queries),
+            ),
+            ("tag counts, merged", median_ms(lambda q: vaults.get_tag_counts(), queries[:10])),
+        ]
+        vaults.close()
+        primary.close()
+
+    print(f"{args.notes} notes in {args.vaults} vaults, {len(queries)} queries, 50 results")
+    print(f"{'search':<24}{'ms':>10}")
+    for label, ms in rows:
+        print(f"{label:<24}{ms:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import argparse
+import random
+import time
+import tkinter
+
+from benchmarks.corpus import make_vocabulary
+from utils.html_render import IndexMapper, render_html
+from utils.markdown_utils import markdown_to_html
+
+
+WORDS = make_vocabulary(500)
+
+
+def generate_markdown(size, seed=0):
+    rng = random.Random(seed)
+    parts = []
+    length = 0
+    while length < size:
+        kind = rng.random()
+        words = rng.choices(WORDS, k=rng.randint(8, 40))
+        if kind < 0.1:
+            block = "## " + " ".join(words[:5])
+        elif kind < 0.3:
+            block = "\n".join(f"- {w} **{w}**" for w in words[:6])
+        elif kind < 0.4:
+            block = "```\n" + "\n".join(" ".join(words[i : i + 6]) for i in range(0, len(words), 6)) + "\n```"
+        elif kind < 0.5:
+            block = "> " + " ".join(words)
+        else:
+            block = " ".join(
+                f"**{w}**" if rng.random() < 0.1 else f"*{w}*" if rng.random() < 0.1 else w
+                for w in words
+            )
+        parts.append(block)
+        length += len(block) + 2
+    return "\n\n".join(parts)
+
+
+class RecordingText:
+    # Counts the Tk calls a renderer would make without needing a display
+    def __init__(self):
+        self.calls = 0
+
+    def insert(self, *args):
+        self.calls += 1
+
+    def tag_add(self, *args):
+        self.calls += 1
+
+
+def legacy_render(text, html):
+    # The original character-by-character MarkdownViewer.update_content loop
+    current_tag = None
+    buffer = ""
+    i = 0
+    while i < len(html):
+        if html[i] == "<":
+            if buffer:
+                text.insert("end", buffer)
+                buffer = ""
+            i += 1
+            if html[i : i + 2] == "b>":
+                current_tag = "bold"
+                i += 2
+            elif html[i : i + 2] == "i>":
+                current_tag = "italic"
+                i += 2
+            elif html[i : i + 3] == "h1>":
+                current_tag = "heading"
+                i += 3
+            elif html[i : i + 3] in ["</b>", "</i>", "</h1>"]:
+                current_tag = None
+                i += 3
+        else:
+            buffer += html[i]
+            i += 1
+        if buffer and current_tag:
+            text.insert("end", buffer, current_tag)
+            buffer = ""
+    if buffer:
+        text.insert("end", buffer)
+
+
+def streaming_render(text, html, batch=500):
+    content, ranges = render_html(html)
+    mapper = IndexMapper(content)
+    text.insert("1.0", content)
+    for tag, spans in ranges.items():
+        for i in range(0, len(spans), batch):
+            indexes = []
+            for start, end in spans[i : i + batch]:
+                indexes.append(mapper.index(start))
+                indexes.append(mapper.index(end))
+            text.tag_add(tag, *indexes)
+
+
+def make_widget():
+    try:
+        root = tkinter.Tk()
+    except tkinter.TclError:
+        return None
+    root.withdraw()
+    return tkinter.Text(root)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Legacy vs streaming preview renderer")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20_000, 200_000, 1_000_000])
+    args = parser.parse_args()
+
+    widget = make_widget()
+    target = "Tk widget" if widget else "recording stub (no display)"
+    print(f"rendering into: {target}")
+    print(f"{'markdown size':>14}{'legacy (ms)':>14}{'calls':>10}{'streaming (ms)':>16}{'calls':>10}")
+    for size in args.sizes:
+        html = markdown_to_html(generate_markdown(size))
+        row = []
+        for render in (legacy_render, streaming_render):
+            if widget is not None:
+                widget.delete("1.0", "end")
+            sink = widget or RecordingText()
+            start = time.perf_counter()
+            render(sink, html)
+            if widget is not None:
+                widget.update_idletasks()
+            row.append((time.perf_counter() - start) * 1000)
+            row.append(getattr(sink, "calls", "-"))
+        print(f"{size:>14}{row[0]:>14.1f}{row[1]:>10}{row[2]:>16.1f}{row[3]:>10}")
+
+
+if __name__ == "__main__":
+    main()
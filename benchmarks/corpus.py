@@ -0,0 +1,113 @@
+import itertools
+import math
+import random
+from datetime import datetime, timedelta
+
+from db.database import Database
+
+SYLLABLES = [
+    "ka", "lo", "mi", "ne", "ru", "sa", "ti", "vo", "ze", "pa",
+    "qu", "de", "fi", "go", "ha", "ju", "bo", "xe", "ly", "wa",
+]
+CATEGORIES = ["General", "Work", "Personal", "Study"]
+START = datetime(2020, 1, 1)
+
+
+def make_vocabulary(size, seed=0):
+    rng = random.Random(seed)
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choices(SYLLABLES, k=rng.randint(2, 4))))
+    return sorted(words)
+
+
+class Corpus:
+    # Deterministic synthetic vault: Zipf-distributed words, log-normal body
+    # lengths, a fixed tag vocabulary and weighted categories
+    def __init__(
+        self,
+        notes=10_000,
+        seed=0,
+        vocabulary=5000,
+        body_words=200,
+        body_sigma=0.8,
+        max_body_words=20_000,
+        tags=200,
+        tags_per_note=(0, 5),
+        categories=CATEGORIES,
+        category_weights=(4, 3, 2, 1),
+        markdown=True,
+    ):
+        self.notes = notes
+        self.seed = seed
+        # Zipf rank must not follow spelling, or the most frequent words would
+        # all share a prefix
+        self.words = make_vocabulary(vocabulary, seed)
+        random.Random(seed).shuffle(self.words)
+        self.cum_weights = list(
+            itertools.accumulate(1 / (rank + 1) for rank in range(len(self.words)))
+        )
+        self.body_mu = math.log(body_words)
+        self.body_sigma = body_sigma
+        self.max_body_words = max_body_words
+        self.tags = [f"tag-{word}" for word in make_vocabulary(tags, seed + 1)]
+        self.tags_per_note = tags_per_note
+        self.categories = list(categories)
+        self.category_weights = list(category_weights)
+        self.markdown = markdown
+
+    def sample_words(self, rng, count):
+        return rng.choices(self.words, cum_weights=self.cum_weights, k=count)
+
+    def body(self, rng):
+        count = min(int(rng.lognormvariate(self.body_mu, self.body_sigma)) + 1, self.max_body_words)
+        words = self.sample_words(rng, count)
+        if not self.markdown:
+            return " ".join(words)
+        blocks = []
+        i = 0
+        while i < len(words):
+            size = rng.randint(8, 60)
+            chunk = words[i : i + size]
+            i += size
+            kind = rng.random()
+            if kind < 0.1:
+                blocks.append("## " + " ".join(chunk[:6]))
+            elif kind < 0.2:
+                blocks.append("\n".join(f"- {w}" for w in chunk[:8]))
+            elif kind < 0.25:
+                blocks.append("```\n" + " ".join(chunk) + "\n```")
+            else:
+                blocks.append(
+                    " ".join(f"**{w}**" if rng.random() < 0.05 else w for w in chunk)
+                )
+        return "\n\n".join(blocks)
+
+    def generate(self):
+        # Yields (id, title, content, tags, category, created_at)
+        rng = random.Random(self.seed)
+        for note_id in range(1, self.notes + 1):
+            title = " ".join(self.sample_words(rng, rng.randint(2, 6))).capitalize()
+            tags = ",".join(rng.sample(self.tags, rng.randint(*self.tags_per_note)))
+            category = rng.choices(self.categories, weights=self.category_weights)[0]
+            created_at = START + timedelta(minutes=note_id * 7 + rng.randint(0, 6))
+            yield note_id, title, self.body(rng), tags, category, created_at
+
+    def queries(self, count, seed=1):
+        # Mid-frequency words: selective enough to be realistic searches
+        rng = random.Random(seed)
+        pool = self.words[len(self.words) // 50 : len(self.words) // 5]
+        return [rng.choice(pool) for _ in range(count)]
+
+    def build(self, db_path, batch_size=5000):
+        db = Database(db_path)
+        batch = []
+        for _, title, content, tags, category, created_at in self.generate():
+            batch.append((title, content, tags, category, created_at, created_at))
+            if len(batch) == batch_size:
+                db.bulk_insert_notes(batch)
+                batch = []
+        if batch:
+            db.bulk_insert_notes(batch)
+        db.finish_import()
+        return db
@@ -0,0 +1,201 @@
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tkinter
+
+from benchmarks.corpus import Corpus
+from db.database import match_query, month_range
+from utils.export_utils import export_notes_to_json
+from utils.html_render import render_html
+from utils.markdown_utils import markdown_to_html
+
+
+def time_op(fn, args_list, repeat=1):
+    samples = []
+    for _ in range(repeat):
+        for args in args_list:
+            start = time.perf_counter()
+            fn(*args)
+            samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "ops": len(samples),
+        "median_ms": statistics.median(samples),
+        "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        "min_ms": samples[0],
+    }
+
+
+def make_viewer():
+    try:
+        root = tkinter.Tk()
+    except tkinter.TclError:
+        return None
+    root.withdraw()
+    from ui.markdown_viewer import MarkdownViewer
+
+    return MarkdownViewer(root)
+
+
+def run_suite(corpus, calls, tmp):
+    rng = random.Random(corpus.seed + 7)
+    db = corpus.build(os.path.join(tmp, "bench.db"))
+    results = {}
+    note_ids = [(rng.randint(1, corpus.notes),) for _ in range(calls)]
+    notes = {row[0]: row for row in itertools.islice(corpus.generate(), 50)}
+
+    results["db.get_note_by_id"] = time_op(db.get_note_by_id, note_ids)
+    results["db.search_notes"] = time_op(
+        lambda query: db.search_notes(query, limit=50),
+        [(q,) for q in corpus.queries(calls)],
+    )
+    results["db.search_notes_all"] = time_op(
+        db.search_notes, [(q,) for q in corpus.queries(max(calls // 10, 1))]
+    )
+    # Search as you type: the first pass misses the query cache, the second hits it
+    prefixes = sorted({match_query(q[:3]) for q in corpus.queries(calls)})
+    search_page = lambda query: db.search_notes(
+        query, limit=50, weights=(10.0, 1.0), excerpts=True, rank_window=1000
+    )
+    results["db.search_prefix"] = time_op(search_page, [(q,) for q in prefixes])
+    recent = [(q,) for q in prefixes[-32:]]
+    results["db.search_prefix_cached"] = time_op(search_page, recent)
+    results["db.get_all_tags"] = time_op(db.get_all_tags, [()] * 20)
+    results["db.get_tag_counts"] = time_op(db.get_tag_counts, [()] * 20)
+    results["db.get_category_counts"] = time_op(db.get_category_counts, [()] * 20)
+    months = [month for month, _ in db.get_month_counts()]
+    results["db.filter_notes"] = time_op(
+        lambda category, month: db.filter_notes(
+            categories=[category], since=month, until=month_range(month)[1], limit=200
+        ),
+        [(rng.choice(corpus.categories), rng.choice(months)) for _ in range(calls)],
+    )
+    results["db.get_note_page"] = time_op(db.get_note_page, [()] * calls)
+    results["db.get_all_notes"] = time_op(db.get_all_notes, [()] * 3)
+    edits = itertools.count()
+    results["db.update_note"] = time_op(
+        lambda note_id: db.update_note(
+            note_id, notes[note_id][1], f"{notes[note_id][2]}\n\nedit {next(edits)}", *notes[note_id][3:5]
+        ),
+        [(rng.choice(list(notes)),) for _ in range(calls)],
+    )
+    # Saving a note as it is: change detection turns this into one read
+    results["db.update_note_unchanged"] = time_op(
+        db.update_note,
+        [tuple(db.get_note_by_id(rng.choice(list(notes))))[:5] for _ in range(calls)],
+    )
+    results["db.add_note"] = time_op(
+        db.add_note, [note[1:5] for note in notes.values()] * max(calls // 50, 1)
+    )
+
+    documents = [(note[2],) for note in notes.values()]
+    big_document = ("\n\n".join(doc for (doc,) in documents),)
+    results["markdown_to_html"] = time_op(markdown_to_html, documents)
+    results["markdown_to_html_large"] = time_op(markdown_to_html, [big_document] * 3)
+    html = [(markdown_to_html(doc),) for (doc,) in documents]
+    big_html = (markdown_to_html(big_document[0]),)
+    results["render_html"] = time_op(render_html, html)
+    results["render_html_large"] = time_op(render_html, [big_html] * 3)
+    viewer = make_viewer()
+    if viewer is not None:
+        def paint(page):
+            viewer.update_content(page)
+            viewer.update_idletasks()
+
+        results["MarkdownViewer.update_content"] = time_op(paint, html)
+        results["MarkdownViewer.update_content_large"] = time_op(paint, [big_html] * 3)
+
+    export_path = os.path.join(tmp, "export.json")
+    results["export_notes_to_json"] = time_op(
+        lambda: export_notes_to_json(db, export_path), [()]
+    )
+    db.close()
+    return results
+
+
+def metadata(corpus):
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "notes": corpus.notes,
+        "seed": corpus.seed,
+        "commit": commit,
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def compare(results, baseline, threshold):
+    # Returns the names whose median got slower than threshold allows
+    regressions = []
+    print(f"{'benchmark':<38}{'baseline ms':>13}{'current ms':>13}{'change':>10}")
+    for name, current in results.items():
+        before = baseline.get(name)
+        if before is None:
+            print(f"{name:<38}{'-':>13}{current['median_ms']:>13.3f}{'new':>10}")
+            continue
+        change = current["median_ms"] / before["median_ms"] - 1 if before["median_ms"] else 0
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(
+            f"{name:<38}{before['median_ms']:>13.3f}{current['median_ms']:>13.3f}{change:>+10.1%}{flag}"
+        )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Personal Knowledge Base benchmark suite")
+    parser.add_argument("--notes", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--body-words", type=int, default=200)
+    parser.add_argument("--tags", type=int, default=200)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="compare against a saved results file")
+    parser.add_argument(
+        "--threshold", type=float, default=0.10, help="allowed slowdown before flagging"
+    )
+    args = parser.parse_args()
+
+    corpus = Corpus(args.notes, seed=args.seed, body_words=args.body_words, tags=args.tags)
+    with tempfile.TemporaryDirectory() as tmp:
+        results = run_suite(corpus, args.calls, tmp)
+    report = {"meta": metadata(corpus), "results": results}
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline["meta"]["notes"] != corpus.notes:
+            print("warning: baseline was recorded with a different vault size")
+        regressions = compare(results, baseline["results"], args.threshold)
+        sys.exit(1 if regressions else 0)
+    if not args.output:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+import argparse
+import os
+import re
+import sqlite3
+import sys
+
+# Only the database layer is imported up front; nothing here needs a display
+from db.database import Database, match_query
+
+
+def cmd_add(db, args):
+    if args.file == "-":
+        content = sys.stdin.read()
+    elif args.file:
+        with open(args.file, encoding="utf-8") as f:
+            content = f.read()
+    else:
+        content = args.content or ""
+    note_id = db.add_note(args.title, content.strip(), args.tags, args.category)
+    print(note_id)
+
+
+def facets(args):
+    # The filter options of add_filter_arguments() as filter_notes() filters
+    return {
+        "categories": args.category,
+        "tags": args.tag,
+        "match": "any" if args.any_tag else "all",
+        "since": args.since,
+        "until": args.until,
+    }
+
+
+def cmd_search(db, args):
+    query = args.query if args.raw else match_query(args.query, prefix=args.prefix)
+    if not query:
+        print("Nothing to search for", file=sys.stderr)
+        return 1
+    try:
+        notes = (args.vaults or db).search_notes(
+            query,
+            limit=args.limit,
+            weights=(10.0, 1.0),
+            excerpts=True,
+            facets=facets(args),
+        )
+    except sqlite3.OperationalError as e:
+        print(f"Invalid query: {e}", file=sys.stderr)
+        return 1
+    for note in notes:
+        vault = f"{note['vault']}\t" if args.vaults else ""
+        print(f"{vault}{note['id']}\t{note['title_highlight']}\t{note['snippet']}")
+
+
+def cmd_list(db, args):
+    for note in (args.vaults or db).filter_notes(limit=args.limit, **facets(args)):
+        vault = f"{note['vault']}\t" if args.vaults else ""
+        print(f"{vault}{note['id']}\t{note['created_at']}\t{note['title']}")
+
+
+def cmd_related(db, args):
+    # NumPy is only needed here
+    from db.related import RelatedNotesIndex
+
+    index = RelatedNotesIndex(db.db_path)
+    index.open(db, rebuild=args.rebuild)
+    for note_id, score in index.related(args.note_id, args.limit):
+        note = db.get_note_summary(note_id)
+        print(f"{note_id}\t{score:.3f}\t{note['title']}")
+
+
+def cmd_history(db, args):
+    if args.show is not None:
+        revision = db.get_revision(args.note_id, args.show)
+        if revision is None:
+            print(f"No revision {args.show} of note {args.note_id}", file=sys.stderr)
+            return 1
+        print(revision["title"])
+        print()
+        print(revision["content"])
+        return
+    for row in db.get_revisions(args.note_id):
+        print(f"{row['revision']}\t{row['saved_at']}\t{row['size']}\t{row['title']}")
+
+
+def cmd_restore(db, args):
+    if not db.restore_revision(args.note_id, args.revision):
+        print(f"No revision {args.revision} of note {args.note_id}", file=sys.stderr)
+        return 1
+
+
+def cmd_compact(db, args):
+    print(f"Dropped {db.compact_history()} revisions", file=sys.stderr)
+
+
+def cmd_attach(db, args):
+    for path in args.files:
+        try:
+            print(db.add_attachment(args.note_id, path))
+        except KeyError as e:
+            print(e.args[0], file=sys.stderr)
+            return 1
+
+
+def cmd_attachments(db, args):
+    for row in db.get_attachments(args.note_id):
+        print(f"{row['id']}\t{row['size']}\t{row['mime_type']}\t{row['name']}")
+
+
+def cmd_attachment(db, args):
+    try:
+        if args.output == "-":
+            db.save_attachment(args.attachment_id, sys.stdout.buffer)
+        else:
+            db.save_attachment(args.attachment_id, args.output)
+    except KeyError as e:
+        print(e.args[0], file=sys.stderr)
+        return 1
+
+
+def cmd_tags(db, args):
+    for name, count in (args.vaults or db).get_tag_counts():
+        print(f"{name}\t{count}")
+
+
+def cmd_export(db, args):
+    from utils.export_utils import export_notes
+
+    fmt = args.format or (
+        "jsonl" if args.filename.endswith((".jsonl", ".jsonl.gz")) else "json"
+    )
+    count = export_notes(db, args.filename, fmt, since=args.since)
+    print(f"Exported {count} notes to {args.filename}", file=sys.stderr)
+
+
+def cmd_import(db, args):
+    from utils.import_utils import import_notes
+
+    def progress(done, rate):
+        print(f"\r{done} notes ({rate:.0f}/s)", end="", file=sys.stderr)
+
+    imported, rate = import_notes(
+        db, args.path, args.format, progress=progress, resume=not args.restart
+    )
+    print(f"\rImported {imported} notes ({rate:.0f}/s)", file=sys.stderr)
+
+
+def cmd_sync(db, args):
+    from db.sync import sync_vaults
+
+    # A new file starts out as an empty vault, so syncing into it makes a copy
+    other = Database(args.other)
+    try:
+        (received, applied), (sent, taken) = sync_vaults(db, other, args.batch_size)
+    except ValueError as e:
+        print(f"{e} (python cli.py --db FILE renew-vault-id)", file=sys.stderr)
+        return 1
+    finally:
+        other.close()
+    print(f"Received {received} changes, applied {applied}", file=sys.stderr)
+    print(f"Sent {sent} changes, applied {taken}", file=sys.stderr)
+
+
+def cmd_renew_vault_id(db, args):
+    print(db.renew_vault_id())
+
+
+def cmd_stats(db, args):
+    size = sum(
+        os.path.getsize(db.db_path + suffix)
+        for suffix in ("", "-wal")
+        if os.path.exists(db.db_path + suffix)
+    )
+    print(f"notes\t{db.count_notes()}")
+    print(f"tags\t{len(db.get_tag_counts())}")
+    for category, count in db.get_category_counts():
+        print(f"category:{category}\t{count}")
+    for month, count in db.get_month_counts():
+        print(f"month:{month}\t{count}")
+    print(f"size_mb\t{size / 1e6:.1f}")
+
+
+def date_bound(text):
+    # A bare year would compare as a number against the stored timestamps
+    if not re.fullmatch(r"\d{4}-\d{2}(-\d{2}.*)?", text):
+        raise argparse.ArgumentTypeError(f"not a YYYY-MM or YYYY-MM-DD date: {text!r}")
+    return text
+
+
+def add_filter_arguments(parser):
+    parser.add_argument(
+        "--category", action="append", help="only this category (repeatable, any matches)"
+    )
+    parser.add_argument("--tag", action="append", help="only notes with this tag (repeatable)")
+    parser.add_argument(
+        "--any-tag", action="store_true", help="match any --tag instead of all of them"
+    )
+    parser.add_argument(
+        "--since", type=date_bound, help="created at or after this date (YYYY-MM or YYYY-MM-DD)"
+    )
+    parser.add_argument(
+        "--until", type=date_bound, help="created before this date (YYYY-MM or YYYY-MM-DD)"
+    )
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Personal Knowledge Base from the command line")
+    parser.add_argument("--db", default="knowledge_base.db", help="database file")
+    parser.add_argument(
+        "--vault",
+        action="append",
+        default=[],
+        help="another vault file to include in search and tags (repeatable)",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add = commands.add_parser("add", help="add a note and print its id")
+    add.add_argument("title")
+    add.add_argument("content", nargs="?", help="markdown body")
+    add.add_argument("--file", help="read the body from a file, or - for stdin")
+    add.add_argument("--tags", default="", help="comma-separated tags")
+    add.add_argument("--category", default="General")
+    add.set_defaults(func=cmd_add)
+
+    search = commands.add_parser("search", help="full-text search, best matches first")
+    search.add_argument("query")
+    search.add_argument("--limit", type=int, default=20)
+    search.add_argument(
+        "--prefix", action="store_true", help="treat the last word as a prefix"
+    )
+    search.add_argument(
+        "--raw", action="store_true", help="pass the query to FTS5 MATCH unchanged"
+    )
+    add_filter_arguments(search)
+    search.set_defaults(func=cmd_search)
+
+    notes = commands.add_parser("list", help="list notes newest first, optionally filtered")
+    notes.add_argument("--limit", type=int, default=50)
+    add_filter_arguments(notes)
+    notes.set_defaults(func=cmd_list)
+
+    related = commands.add_parser("related", help="notes most similar to a note")
+    related.add_argument("note_id", type=int)
+    related.add_argument("--limit", type=int, default=10)
+    related.add_argument(
+        "--rebuild", action="store_true", help="rebuild the similarity index first"
+    )
+    related.set_defaults(func=cmd_related)
+
+    history = commands.add_parser("history", help="list the saved revisions of a note")
+    history.add_argument("note_id", type=int)
+    history.add_argument("--show", type=int, metavar="REVISION", help="print one revision")
+    history.set_defaults(func=cmd_history)
+
+    restore = commands.add_parser("restore", help="bring back an earlier revision of a note")
+    restore.add_argument("note_id", type=int)
+    restore.add_argument("revision", type=int)
+    restore.set_defaults(func=cmd_restore)
+
+    compact = commands.add_parser(
+        "compact-history", help="thin out old revisions (keeps one per day after a week)"
+    )
+    compact.set_defaults(func=cmd_compact)
+
+    attach = commands.add_parser("attach", help="attach files to a note and print their ids")
+    attach.add_argument("note_id", type=int)
+    attach.add_argument("files", nargs="+")
+    attach.set_defaults(func=cmd_attach)
+
+    attachments = commands.add_parser("attachments", help="list the attachments of a note")
+    attachments.add_argument("note_id", type=int)
+    attachments.set_defaults(func=cmd_attachments)
+
+    attachment = commands.add_parser("attachment", help="write an attachment to a file")
+    attachment.add_argument("attachment_id", type=int)
+    attachment.add_argument("output", help="file to write, or - for stdout")
+    attachment.set_defaults(func=cmd_attachment)
+
+    tags = commands.add_parser("tags", help="list tags with their note counts")
+    tags.set_defaults(func=cmd_tags)
+
+    export = commands.add_parser("export", help="export notes to JSON or JSON Lines")
+    export.add_argument("filename", help="output file; .gz compresses")
+    export.add_argument("--format", choices=["json", "jsonl"])
+    export.add_argument(
+        "--since",
+        type=date_bound,
+        help="only notes changed at or after this date or ISO time (YYYY-MM, YYYY-MM-DD...)",
+    )
+    export.set_defaults(func=cmd_export)
+
+    imp = commands.add_parser("import", help="import JSON, JSON Lines or a markdown folder")
+    imp.add_argument("path")
+    imp.add_argument("--format", choices=["json", "jsonl", "markdown"])
+    imp.add_argument(
+        "--restart", action="store_true", help="ignore the checkpoint of an earlier run"
+    )
+    imp.set_defaults(func=cmd_import)
+
+    sync = commands.add_parser(
+        "sync", help="exchange changes with another vault file (newest edit wins)"
+    )
+    sync.add_argument("other", help="the other vault file (created if missing)")
+    sync.add_argument("--batch-size", type=int, default=500, help="changes per transaction")
+    sync.set_defaults(func=cmd_sync)
+
+    renew = commands.add_parser(
+        "renew-vault-id", help="give a copied vault file its own id so it can sync"
+    )
+    renew.set_defaults(func=cmd_renew_vault_id)
+
+    stats = commands.add_parser("stats", help="vault size and counts")
+    stats.set_defaults(func=cmd_stats)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    db = Database(args.db)
+    args.vaults = None
+    try:
+        if args.vault:
+            from db.vaults import VaultSet
+
+            args.vaults = VaultSet(db)
+            for path in args.vault:
+                try:
+                    args.vaults.mount(path)
+                except (OSError, sqlite3.Error) as e:
+                    print(f"Cannot mount {path}: {e}", file=sys.stderr)
+                    return 1
+        status = args.func(db, args)
+    finally:
+        if args.vaults is not None:
+            args.vaults.close()
+        db.close()
+    return status or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
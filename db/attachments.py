@@ -0,0 +1,48 @@
+import hashlib
+import io
+import mimetypes
+import os
+
+# Attachments are copied in and out of the database this many bytes at a time
+CHUNK_SIZE = 1024 * 1024
+THUMBNAIL_SIZE = 128
+
+
+def open_source(source):
+    # A path or a binary file object; returns (file, close_when_done)
+    if isinstance(source, (str, os.PathLike)):
+        return open(source, "rb"), True
+    return source, False
+
+
+def hash_file(f, chunk_size=CHUNK_SIZE):
+    # (sha256 hex digest, size) of the rest of f
+    digest = hashlib.sha256()
+    size = 0
+    while chunk := f.read(chunk_size):
+        digest.update(chunk)
+        size += len(chunk)
+    return digest.hexdigest(), size
+
+
+def guess_mime_type(name):
+    return mimetypes.guess_type(name)[0] or "application/octet-stream"
+
+
+def make_thumbnail(f, size=THUMBNAIL_SIZE):
+    # PNG bytes no larger than size x size, or None if f is not an image
+    # Pillow can read; imported here so only thumbnail work pays for it
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        with Image.open(f) as image:
+            # Lets JPEG decode at a reduced scale instead of full size
+            image.draft("RGB", (size, size))
+            image.thumbnail((size, size))
+            if image.mode not in ("RGB", "RGBA"):
+                image = image.convert("RGBA")
+            out = io.BytesIO()
+            image.save(out, "PNG", optimize=True)
+    except (UnidentifiedImageError, OSError):
+        return None
+    return out.getvalue()
@@ -1,14 +1,224 @@
+import hashlib
+import os
+import re
 import sqlite3
+import threading
+from collections import Counter, OrderedDict
 from datetime import datetime
+from pathlib import Path
+
+from db.attachments import (
+    CHUNK_SIZE,
+    THUMBNAIL_SIZE,
+    guess_mime_type,
+    hash_file,
+    make_thumbnail,
+    open_source,
+)
+from db.history import (
+    COMPACT_TO,
+    MAX_REVISIONS,
+    SNAPSHOT_EVERY,
+    apply_delta,
+    make_delta,
+    make_snapshot,
+    read_snapshot,
+    revisions_to_keep,
+)
+from db.sync import new_uid, version
+
+# Schema upgrades, applied in order; PRAGMA user_version records how many ran
+MIGRATIONS = [
+    "_migrate_tag_index",
+    "_migrate_external_fts",
+    "_migrate_created_at_index",
+    "_migrate_render_cache",
+    "_migrate_updated_at",
+    "_migrate_import_checkpoints",
+    "_migrate_fts_prefix",
+    "_migrate_note_history",
+    "_migrate_fts_update_when_changed",
+    "_migrate_attachments",
+    "_migrate_facets",
+    "_migrate_change_journal",
+    "_migrate_prefix_search",
+]
+
+# Every note is indexed twice: notes_fts stems words for whole-word search,
+# notes_prefix keeps them as typed for prefix queries (search as you type)
+FTS_TABLES = ("notes_fts", "notes_prefix")
+
+FTS_INSERT_TRIGGER = """
+    CREATE TRIGGER notes_fts_insert AFTER INSERT ON notes BEGIN
+        INSERT INTO notes_fts (rowid, title, content)
+        VALUES (new.id, new.title, new.content);
+        INSERT INTO notes_prefix (rowid, title, content)
+        VALUES (new.id, new.title, new.content);
+    END
+"""
+
+# Count a new note under its category and month (YYYY-MM of created_at)
+FACET_COUNT_NEW = """
+    INSERT INTO category_counts (category, note_count)
+    VALUES (IFNULL(new.category, ''), 1)
+    ON CONFLICT (category) DO UPDATE SET note_count = note_count + 1;
+    INSERT INTO month_counts (month, note_count)
+    VALUES (IFNULL(substr(new.created_at, 1, 7), ''), 1)
+    ON CONFLICT (month) DO UPDATE SET note_count = note_count + 1;
+"""
+FACET_COUNTS_INSERT_TRIGGER = f"""
+    CREATE TRIGGER facet_counts_insert AFTER INSERT ON notes BEGIN
+        {FACET_COUNT_NEW}
+    END
+"""
+# Every note change leaves one journal entry per note (uid), moved to a new
+# seq each time; deletes leave a tombstone
+JOURNAL_INSERT_TRIGGER = """
+    CREATE TRIGGER notes_journal_insert AFTER INSERT ON notes
+    WHEN new.uid IS NOT NULL BEGIN
+        INSERT OR REPLACE INTO note_journal (uid, deleted, changed_at, origin)
+        VALUES (new.uid, 0, new.updated_at, (SELECT value FROM vault_info WHERE key = 'vault_id'));
+    END
+"""
+TAG_COUNTS_INSERT_TRIGGER = """
+    CREATE TRIGGER tag_counts_insert AFTER INSERT ON note_tags BEGIN
+        UPDATE tags SET note_count = note_count + 1 WHERE id = new.tag_id;
+    END
+"""
+
+# The columns an edit can change
+NOTE_FIELDS = ("title", "content", "tags", "category")
+# Prefix lengths FTS5 keeps extra index entries for (search as you type)
+FTS_PREFIX = "2 3"
+QUERY_TOKEN = re.compile(r"\w+")
+QUOTED = re.compile(r'"(?:[^"]|"")*"')
+
+
+def match_query(text, prefix=True):
+    # Turns free text into a safe FTS5 expression: every word is quoted, so
+    # punctuation and operators are never interpreted; the last word is a
+    # prefix while the user is still typing it. None if there are no words.
+    words = QUERY_TOKEN.findall(text or "")
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    if prefix:
+        terms[-1] += "*"
+    return " ".join(terms)
+
+
+def search_table(query):
+    # The FTS table that serves an FTS5 expression: prefix queries need the
+    # unstemmed index, since porter turns "meeting" into "meet" and a prefix
+    # such as "meeti*" would match nothing
+    return "notes_prefix" if "*" in QUOTED.sub("", query) else "notes_fts"
+
+
+def month_range(month):
+    # ("YYYY-MM", first month after it) as since/until bounds for filter_notes()
+    year, number = map(int, month.split("-"))
+    year, number = (year + 1, 1) if number == 12 else (year, number + 1)
+    return month, f"{year:04d}-{number:02d}"
+
+
+def split_tags(tags):
+    names = []
+    for tag in (tags or "").split(","):
+        tag = tag.strip()
+        if tag and tag not in names:
+            names.append(tag)
+    return names
 
 
 class Database:
-    def __init__(self, db_path="knowledge_base.db"):
+    def __init__(
+        self,
+        db_path="knowledge_base.db",
+        journal_mode="WAL",
+        synchronous="NORMAL",
+        cache_size=-16000,
+        mmap_size=256 * 1024 * 1024,
+        cached_statements=256,
+        search_cache_size=64,
+        read_only=False,
+    ):
         self.db_path = db_path
+        # Read-only connections can neither migrate nor switch journal modes
+        self.read_only = read_only
+        self.pragmas = {
+            "journal_mode": None if read_only else journal_mode,
+            "synchronous": synchronous,
+            "cache_size": cache_size,
+            "mmap_size": mmap_size,
+            "temp_store": "MEMORY",
+        }
+        self.cached_statements = cached_statements
+        # Recent search results, dropped whenever this instance writes notes
+        # or another connection's commit shows in PRAGMA data_version
+        self.search_cache_size = search_cache_size
+        self._search_cache = OrderedDict()
+        self._search_generation = 0
+        # Called after every committed note change, see add_listener()
+        self._listeners = []
+        self._vault_id = None
+        # One long-lived connection per thread (the Tk thread plus any workers)
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
         self._init_db()
 
+    def _connect(self):
+        if self.read_only:
+            path = Path(os.path.abspath(self.db_path)).as_uri() + "?mode=ro"
+        else:
+            path = self.db_path
+        conn = sqlite3.connect(
+            path,
+            check_same_thread=False,
+            cached_statements=self.cached_statements,
+            uri=self.read_only,
+        )
+        conn.row_factory = sqlite3.Row
+        for name, value in self.pragmas.items():
+            if value is not None:
+                conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    @property
+    def conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+    def release(self):
+        # Close the calling thread's connection, e.g. when a worker finishes
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            self._local.conn = None
+            with self._lock:
+                self._connections.remove(conn)
+            conn.close()
+
     def _init_db(self):
-        with sqlite3.connect(self.db_path) as conn:
+        if self.read_only:
+            version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+            if version < len(MIGRATIONS):
+                raise sqlite3.OperationalError(
+                    f"{self.db_path} has schema version {version}, open it writable once to upgrade"
+                )
+            return
+        with self.conn as conn:
             cursor = conn.cursor()
             # Create notes table
             cursor.execute("""
@@ -27,82 +237,1372 @@ class Database:
                     title, content, tokenize=porter
                 )
             """)
-            conn.commit()
+        self._migrate()
 
-    def add_note(self, title, content, tags, category):
-        created_at = datetime.now()
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "INSERT INTO notes (title, content, tags, category, created_at) VALUES (?, ?, ?, ?, ?)",
-                (title, content, tags, category, created_at),
+    def _migrate(self):
+        conn = self.conn
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for number, name in enumerate(MIGRATIONS[version:], start=version + 1):
+            with conn:
+                conn.execute("BEGIN")
+                getattr(self, name)(conn.cursor())
+                conn.execute(f"PRAGMA user_version = {number}")
+
+    def _migrate_tag_index(self, cursor):
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS tags (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE
             )
-            note_id = cursor.lastrowid
-            cursor.execute(
-                "INSERT INTO notes_fts (rowid, title, content) VALUES (?, ?, ?)",
-                (note_id, title, content),
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS note_tags (
+                note_id INTEGER NOT NULL,
+                tag_id INTEGER NOT NULL,
+                PRIMARY KEY (note_id, tag_id)
+            ) WITHOUT ROWID
+        """)
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_note_tags_tag ON note_tags (tag_id, note_id)"
+        )
+        # Move the existing comma-separated tags into the index
+        rows = cursor.execute(
+            "SELECT id, tags FROM notes WHERE tags IS NOT NULL AND tags != ''"
+        ).fetchall()
+        for row in rows:
+            self._set_note_tags(cursor, row["id"], row["tags"])
+
+    def _migrate_external_fts(self, cursor):
+        # Index notes in place instead of keeping a second copy of every note
+        cursor.execute("DROP TABLE IF EXISTS notes_fts")
+        cursor.execute("""
+            CREATE VIRTUAL TABLE notes_fts USING fts5(
+                title, content, content='notes', content_rowid='id', tokenize=porter
+            )
+        """)
+        cursor.execute("""
+            CREATE TRIGGER notes_fts_insert AFTER INSERT ON notes BEGIN
+                INSERT INTO notes_fts (rowid, title, content)
+                VALUES (new.id, new.title, new.content);
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER notes_fts_delete AFTER DELETE ON notes BEGIN
+                INSERT INTO notes_fts (notes_fts, rowid, title, content)
+                VALUES ('delete', old.id, old.title, old.content);
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER notes_fts_update AFTER UPDATE OF title, content ON notes BEGIN
+                INSERT INTO notes_fts (notes_fts, rowid, title, content)
+                VALUES ('delete', old.id, old.title, old.content);
+                INSERT INTO notes_fts (rowid, title, content)
+                VALUES (new.id, new.title, new.content);
+            END
+        """)
+        cursor.execute("INSERT INTO notes_fts (notes_fts) VALUES ('rebuild')")
+
+    def _migrate_created_at_index(self, cursor):
+        # Covers the note list query so pages never touch the note bodies
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_notes_created_at ON notes (created_at, id, title)"
+        )
+
+    def _migrate_render_cache(self, cursor):
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS rendered_notes (
+                note_id INTEGER PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                html TEXT NOT NULL
+            )
+        """)
+        # Stale renders go away as soon as the note changes
+        cursor.execute("""
+            CREATE TRIGGER rendered_notes_update AFTER UPDATE OF content ON notes
+            WHEN old.content IS NOT new.content BEGIN
+                DELETE FROM rendered_notes WHERE note_id = old.id;
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER rendered_notes_delete AFTER DELETE ON notes BEGIN
+                DELETE FROM rendered_notes WHERE note_id = old.id;
+            END
+        """)
+
+    def _migrate_updated_at(self, cursor):
+        cursor.execute("ALTER TABLE notes ADD COLUMN updated_at TIMESTAMP")
+        cursor.execute("UPDATE notes SET updated_at = created_at")
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_notes_updated_at ON notes (updated_at)"
+        )
+
+    def _migrate_import_checkpoints(self, cursor):
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS import_checkpoints (
+                source TEXT PRIMARY KEY,
+                position INTEGER NOT NULL
+            )
+        """)
+        # Imported notes waiting for their deferred full-text indexing
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS import_pending (
+                note_id INTEGER PRIMARY KEY
+            )
+        """)
+        # Pending notes have no index entries yet, so there is nothing to remove
+        cursor.execute("DROP TRIGGER notes_fts_delete")
+        cursor.execute("DROP TRIGGER notes_fts_update")
+        cursor.execute("""
+            CREATE TRIGGER notes_fts_delete AFTER DELETE ON notes BEGIN
+                INSERT INTO notes_fts (notes_fts, rowid, title, content)
+                SELECT 'delete', old.id, old.title, old.content
+                WHERE old.id NOT IN (SELECT note_id FROM import_pending);
+                DELETE FROM import_pending WHERE note_id = old.id;
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER notes_fts_update AFTER UPDATE OF title, content ON notes
+            WHEN old.id NOT IN (SELECT note_id FROM import_pending) BEGIN
+                INSERT INTO notes_fts (notes_fts, rowid, title, content)
+                VALUES ('delete', old.id, old.title, old.content);
+                INSERT INTO notes_fts (rowid, title, content)
+                VALUES (new.id, new.title, new.content);
+            END
+        """)
+
+    def _migrate_fts_prefix(self, cursor):
+        # Prefix indexes make "term*" queries a lookup instead of a term scan.
+        # The note triggers only name the table, so they survive the rebuild.
+        cursor.execute("DROP TABLE notes_fts")
+        cursor.execute(f"""
+            CREATE VIRTUAL TABLE notes_fts USING fts5(
+                title, content, content='notes', content_rowid='id',
+                tokenize=porter, prefix='{FTS_PREFIX}'
             )
-            conn.commit()
+        """)
+        cursor.execute("INSERT INTO notes_fts (notes_fts) VALUES ('rebuild')")
+        # The rebuild indexed interrupted imports too
+        cursor.execute("DELETE FROM import_pending")
+
+    def _migrate_note_history(self, cursor):
+        # Earlier versions of each note, newest stored as a delta against the
+        # current note and every older one as a delta against the next newer
+        # revision; snapshot rows hold a full copy and end the chain
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS note_revisions (
+                note_id INTEGER NOT NULL,
+                revision INTEGER NOT NULL,
+                saved_at TIMESTAMP,
+                title TEXT NOT NULL,
+                tags TEXT,
+                category TEXT,
+                size INTEGER NOT NULL,
+                snapshot INTEGER NOT NULL,
+                data BLOB NOT NULL
+            )
+        """)
+        # Covers listing revisions and finding the nearest snapshot
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_note_revisions
+            ON note_revisions (note_id, revision, snapshot, saved_at, title, size)
+        """)
+        cursor.execute("""
+            CREATE TRIGGER note_revisions_delete AFTER DELETE ON notes BEGIN
+                DELETE FROM note_revisions WHERE note_id = old.id;
+            END
+        """)
+
+    def _migrate_fts_update_when_changed(self, cursor):
+        # Writing a column with the value it already has must not re-index
+        cursor.execute("DROP TRIGGER notes_fts_update")
+        cursor.execute("""
+            CREATE TRIGGER notes_fts_update AFTER UPDATE OF title, content ON notes
+            WHEN (old.title IS NOT new.title OR old.content IS NOT new.content)
+                AND old.id NOT IN (SELECT note_id FROM import_pending) BEGIN
+                INSERT INTO notes_fts (notes_fts, rowid, title, content)
+                VALUES ('delete', old.id, old.title, old.content);
+                INSERT INTO notes_fts (rowid, title, content)
+                VALUES (new.id, new.title, new.content);
+            END
+        """)
+
+    def _migrate_attachments(self, cursor):
+        # File contents live once per distinct sha256 in blobs; attachments
+        # link them to notes under a file name
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS blobs (
+                id INTEGER PRIMARY KEY,
+                hash TEXT NOT NULL UNIQUE,
+                size INTEGER NOT NULL,
+                data BLOB NOT NULL
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS attachments (
+                id INTEGER PRIMARY KEY,
+                note_id INTEGER NOT NULL,
+                blob_id INTEGER NOT NULL,
+                name TEXT NOT NULL,
+                mime_type TEXT,
+                created_at TIMESTAMP
+            )
+        """)
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_attachments_note ON attachments (note_id)"
+        )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_attachments_blob ON attachments (blob_id)"
+        )
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS thumbnails (
+                blob_id INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                png BLOB,
+                PRIMARY KEY (blob_id, size)
+            )
+        """)
+        cursor.execute("""
+            CREATE TRIGGER attachments_note_delete AFTER DELETE ON notes BEGIN
+                DELETE FROM attachments WHERE note_id = old.id;
+            END
+        """)
+        # A blob goes away with the last attachment that uses it
+        cursor.execute("""
+            CREATE TRIGGER attachments_delete AFTER DELETE ON attachments
+            WHEN NOT EXISTS (SELECT 1 FROM attachments WHERE blob_id = old.blob_id) BEGIN
+                DELETE FROM blobs WHERE id = old.blob_id;
+                DELETE FROM thumbnails WHERE blob_id = old.blob_id;
+            END
+        """)
+
+    def _migrate_facets(self, cursor):
+        # Cover the note list filtered by category, newest first; a date range
+        # alone is covered by idx_notes_created_at
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_notes_category
+            ON notes (category, created_at, id, title)
+        """)
+        # Note counts per category, per month (YYYY-MM of created_at) and per
+        # tag, kept current by triggers so the sidebar never counts notes.
+        # A missing category or date counts under ''.
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS category_counts (
+                category TEXT PRIMARY KEY,
+                note_count INTEGER NOT NULL
+            ) WITHOUT ROWID
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS month_counts (
+                month TEXT PRIMARY KEY,
+                note_count INTEGER NOT NULL
+            ) WITHOUT ROWID
+        """)
+        cursor.execute("ALTER TABLE tags ADD COLUMN note_count INTEGER NOT NULL DEFAULT 0")
+        uncount_old = """
+                UPDATE category_counts SET note_count = note_count - 1
+                WHERE category = IFNULL(old.category, '');
+                DELETE FROM category_counts
+                WHERE category = IFNULL(old.category, '') AND note_count = 0;
+                UPDATE month_counts SET note_count = note_count - 1
+                WHERE month = IFNULL(substr(old.created_at, 1, 7), '');
+                DELETE FROM month_counts
+                WHERE month = IFNULL(substr(old.created_at, 1, 7), '') AND note_count = 0;
+        """
+        cursor.execute(FACET_COUNTS_INSERT_TRIGGER)
+        cursor.execute(f"""
+            CREATE TRIGGER facet_counts_delete AFTER DELETE ON notes BEGIN
+                {uncount_old}
+            END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER facet_counts_update AFTER UPDATE OF category, created_at ON notes
+            WHEN old.category IS NOT new.category OR old.created_at IS NOT new.created_at BEGIN
+                {uncount_old}
+                {FACET_COUNT_NEW}
+            END
+        """)
+        cursor.execute(TAG_COUNTS_INSERT_TRIGGER)
+        cursor.execute("""
+            CREATE TRIGGER tag_counts_delete AFTER DELETE ON note_tags BEGIN
+                UPDATE tags SET note_count = note_count - 1 WHERE id = old.tag_id;
+            END
+        """)
+        cursor.execute("""
+            INSERT INTO category_counts (category, note_count)
+            SELECT IFNULL(category, ''), COUNT(*) FROM notes GROUP BY 1
+        """)
+        cursor.execute("""
+            INSERT INTO month_counts (month, note_count)
+            SELECT IFNULL(substr(created_at, 1, 7), ''), COUNT(*) FROM notes GROUP BY 1
+        """)
+        cursor.execute("""
+            UPDATE tags SET note_count = (
+                SELECT COUNT(*) FROM note_tags WHERE tag_id = tags.id
+            )
+        """)
+
+    def _migrate_change_journal(self, cursor):
+        # Notes get a uid that is the same in every vault they sync to, and
+        # each vault a random id that records who made a change
+        cursor.execute("ALTER TABLE notes ADD COLUMN uid TEXT")
+        cursor.execute("UPDATE notes SET uid = lower(hex(randomblob(16)))")
+        cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_notes_uid ON notes (uid)")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS vault_info (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            ) WITHOUT ROWID
+        """)
+        cursor.execute(
+            "INSERT INTO vault_info (key, value) VALUES ('vault_id', ?)", (new_uid(),)
+        )
+        # AUTOINCREMENT: a seq is never handed out twice, even after the
+        # newest entry moves on
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS note_journal (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                uid TEXT NOT NULL UNIQUE,
+                deleted INTEGER NOT NULL,
+                changed_at TIMESTAMP,
+                origin TEXT NOT NULL
+            )
+        """)
+        # The highest seq of each other vault this one has applied
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS sync_peers (
+                vault_id TEXT PRIMARY KEY,
+                seq INTEGER NOT NULL,
+                synced_at TIMESTAMP
+            ) WITHOUT ROWID
+        """)
+        # Notes inserted without a uid (e.g. by hand) get one, which the
+        # update trigger then journals
+        cursor.execute("""
+            CREATE TRIGGER notes_uid_default AFTER INSERT ON notes
+            WHEN new.uid IS NULL BEGIN
+                UPDATE notes SET uid = lower(hex(randomblob(16))) WHERE id = new.id;
+            END
+        """)
+        cursor.execute(JOURNAL_INSERT_TRIGGER)
+        cursor.execute("""
+            CREATE TRIGGER notes_journal_update
+            AFTER UPDATE OF title, content, tags, category, uid ON notes
+            WHEN new.uid IS NOT NULL BEGIN
+                INSERT OR REPLACE INTO note_journal (uid, deleted, changed_at, origin)
+                VALUES (new.uid, 0, new.updated_at, (SELECT value FROM vault_info WHERE key = 'vault_id'));
+            END
+        """)
+        # delete_note() stamps updated_at with the time of the delete first
+        cursor.execute("""
+            CREATE TRIGGER notes_journal_delete AFTER DELETE ON notes
+            WHEN old.uid IS NOT NULL BEGIN
+                INSERT OR REPLACE INTO note_journal (uid, deleted, changed_at, origin)
+                VALUES (old.uid, 1, old.updated_at, (SELECT value FROM vault_info WHERE key = 'vault_id'));
+            END
+        """)
+        cursor.execute("""
+            INSERT INTO note_journal (uid, deleted, changed_at, origin)
+            SELECT uid, 0, updated_at, (SELECT value FROM vault_info WHERE key = 'vault_id')
+            FROM notes ORDER BY id
+        """)
+
+    def _migrate_prefix_search(self, cursor):
+        # Porter stems what it indexes, so prefix queries went blank partway
+        # through a word ("meeti*" finds no "meet"). They get an unstemmed
+        # index with prefix entries; notes_fts keeps stemming for whole words
+        # and no longer needs prefix entries of its own.
+        for trigger in ("notes_fts_insert", "notes_fts_delete", "notes_fts_update"):
+            cursor.execute(f"DROP TRIGGER {trigger}")
+        cursor.execute("DROP TABLE notes_fts")
+        cursor.execute("""
+            CREATE VIRTUAL TABLE notes_fts USING fts5(
+                title, content, content='notes', content_rowid='id', tokenize=porter
+            )
+        """)
+        cursor.execute(f"""
+            CREATE VIRTUAL TABLE notes_prefix USING fts5(
+                title, content, content='notes', content_rowid='id',
+                tokenize=unicode61, prefix='{FTS_PREFIX}'
+            )
+        """)
+        # One trigger per event keeps both tables in step: the delete trigger
+        # must check import_pending before it forgets the note
+        cursor.execute(FTS_INSERT_TRIGGER)
+        cursor.execute("""
+            CREATE TRIGGER notes_fts_delete AFTER DELETE ON notes BEGIN
+                INSERT INTO notes_fts (notes_fts, rowid, title, content)
+                SELECT 'delete', old.id, old.title, old.content
+                WHERE old.id NOT IN (SELECT note_id FROM import_pending);
+                INSERT INTO notes_prefix (notes_prefix, rowid, title, content)
+                SELECT 'delete', old.id, old.title, old.content
+                WHERE old.id NOT IN (SELECT note_id FROM import_pending);
+                DELETE FROM import_pending WHERE note_id = old.id;
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER notes_fts_update AFTER UPDATE OF title, content ON notes
+            WHEN (old.title IS NOT new.title OR old.content IS NOT new.content)
+                AND old.id NOT IN (SELECT note_id FROM import_pending) BEGIN
+                INSERT INTO notes_fts (notes_fts, rowid, title, content)
+                VALUES ('delete', old.id, old.title, old.content);
+                INSERT INTO notes_fts (rowid, title, content)
+                VALUES (new.id, new.title, new.content);
+                INSERT INTO notes_prefix (notes_prefix, rowid, title, content)
+                VALUES ('delete', old.id, old.title, old.content);
+                INSERT INTO notes_prefix (rowid, title, content)
+                VALUES (new.id, new.title, new.content);
+            END
+        """)
+        for table in FTS_TABLES:
+            cursor.execute(f"INSERT INTO {table} ({table}) VALUES ('rebuild')")
+        # The rebuild indexed interrupted imports too
+        cursor.execute("DELETE FROM import_pending")
+
+    def _set_note_tags(self, cursor, note_id, tags):
+        old_tag_ids = [
+            row[0]
+            for row in cursor.execute(
+                "SELECT tag_id FROM note_tags WHERE note_id = ?", (note_id,)
+            )
+        ]
+        cursor.execute("DELETE FROM note_tags WHERE note_id = ?", (note_id,))
+        names = [(name,) for name in split_tags(tags)]
+        cursor.executemany("INSERT OR IGNORE INTO tags (name) VALUES (?)", names)
+        cursor.executemany(
+            "INSERT OR IGNORE INTO note_tags (note_id, tag_id) SELECT ?, id FROM tags WHERE name = ?",
+            [(note_id, name) for (name,) in names],
+        )
+        # Drop tags that no other note uses any more
+        cursor.executemany(
+            "DELETE FROM tags WHERE id = ? AND NOT EXISTS (SELECT 1 FROM note_tags WHERE tag_id = ?)",
+            [(tag_id, tag_id) for tag_id in old_tag_ids],
+        )
+
+    def add_note(self, title, content, tags, category):
+        with self.conn as conn:
+            note_id = self._insert_note(conn.cursor(), title, content, tags, category)
+        self.clear_search_cache()
+        self._notify("add", note_id, (title, content))
+        return note_id
+
+    def _insert_note(
+        self, cursor, title, content, tags, category, created_at=None, updated_at=None, uid=None
+    ):
+        created_at = created_at or datetime.now()
+        cursor.execute(
+            "INSERT INTO notes (title, content, tags, category, created_at, updated_at, uid) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (title, content, tags, category, created_at, updated_at or created_at, uid or new_uid()),
+        )
+        note_id = cursor.lastrowid
+        self._set_note_tags(cursor, note_id, tags)
         return note_id
 
     def update_note(self, note_id, title, content, tags, category):
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
+        return self.update_note_fields(
+            note_id, title=title, content=content, tags=tags, category=category
+        )
+
+    def update_note_fields(self, note_id, **fields):
+        # Writes only the fields (title, content, tags, category) that differ
+        # from the stored note, so e.g. a tag edit never re-indexes the text.
+        # Returns {field: (old, new)} for what changed; empty if nothing did.
+        with self.conn as conn:
+            changes, old = self._update_note_fields(conn.cursor(), note_id, fields)
+        if changes:
+            self.clear_search_cache()
+            self._notify_update(note_id, changes, old)
+        return changes
+
+    def _update_note_fields(self, cursor, note_id, fields, updated_at=None):
+        # (changes, the row before them) or ({}, None) if nothing changed
+        old = cursor.execute(
+            "SELECT title, content, tags, category, updated_at FROM notes WHERE id = ?",
+            (note_id,),
+        ).fetchone()
+        if old is None:
+            return {}, None
+        changes = {
+            name: (old[name], value)
+            for name, value in fields.items()
+            if name in NOTE_FIELDS and old[name] != value
+        }
+        if not changes:
+            return {}, None
+        columns = ", ".join(f"{name} = ?" for name in changes)
+        cursor.execute(
+            f"UPDATE notes SET {columns}, updated_at = ? WHERE id = ?",
+            [new for _, new in changes.values()] + [updated_at or datetime.now(), note_id],
+        )
+        if "tags" in changes:
+            self._set_note_tags(cursor, note_id, changes["tags"][1])
+        content = changes["content"][1] if "content" in changes else old["content"]
+        self._save_revision(cursor, note_id, old, content)
+        return changes, old
+
+    def _notify_update(self, note_id, changes, old):
+        if "title" in changes or "content" in changes:
+            title = changes["title"][1] if "title" in changes else old["title"]
+            content = changes["content"][1] if "content" in changes else old["content"]
+            self._notify("update", note_id, (title, content), (old["title"], old["content"]))
+
+    def delete_note(self, note_id):
+        with self.conn as conn:
+            old = self._delete_note(conn.cursor(), note_id)
+        self.clear_search_cache()
+        self._notify("delete", note_id, None, old)
+
+    def _delete_note(self, cursor, note_id, deleted_at=None):
+        old = self._old_note(cursor, note_id)
+        # The journal dates the tombstone by the note's last update
+        cursor.execute(
+            "UPDATE notes SET updated_at = ? WHERE id = ?", (deleted_at or datetime.now(), note_id)
+        )
+        cursor.execute("DELETE FROM notes WHERE id = ?", (note_id,))
+        self._set_note_tags(cursor, note_id, None)
+        return old
+
+    def _save_revision(self, cursor, note_id, old, content):
+        # Keeps the version update_note just replaced, as a delta against the
+        # new content unless the chain since the last snapshot is full
+        recent = cursor.execute(
+            "SELECT revision, snapshot FROM note_revisions WHERE note_id = ? ORDER BY revision DESC LIMIT ?",
+            (note_id, SNAPSHOT_EVERY - 1),
+        ).fetchall()
+        revision = recent[0][0] + 1 if recent else 1
+        snapshot = len(recent) == SNAPSHOT_EVERY - 1 and not any(row[1] for row in recent)
+        old_content = old["content"] or ""
+        data = make_snapshot(old_content) if snapshot else make_delta(content or "", old_content)
+        cursor.execute(
+            """
+            INSERT INTO note_revisions
+                (note_id, revision, saved_at, title, tags, category, size, snapshot, data)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                note_id,
+                revision,
+                old["updated_at"],
+                old["title"],
+                old["tags"],
+                old["category"],
+                len(old_content),
+                int(snapshot),
+                data,
+            ),
+        )
+        count = cursor.execute(
+            "SELECT COUNT(*) FROM note_revisions WHERE note_id = ?", (note_id,)
+        ).fetchone()[0]
+        if count > MAX_REVISIONS:
+            self._compact_note(cursor, note_id, limit=COMPACT_TO)
+
+    def get_revisions(self, note_id):
+        # Newest first; served from the covering index without reading any deltas
+        cursor = self.conn.execute(
+            """
+            SELECT revision, saved_at, title, size FROM note_revisions
+            WHERE note_id = ? ORDER BY revision DESC
+            """,
+            (note_id,),
+        )
+        return cursor.fetchall()
+
+    def get_revision(self, note_id, revision):
+        # Rebuilds one revision from the nearest newer snapshot (or the current
+        # note) and at most SNAPSHOT_EVERY - 1 deltas. None if it does not exist.
+        with self.conn as conn:
+            conn.execute("BEGIN")
+            rows = conn.execute(
+                """
+                SELECT revision, saved_at, title, tags, category, snapshot, data
+                FROM note_revisions
+                WHERE note_id = ? AND revision >= ? AND revision <= COALESCE(
+                    (SELECT MIN(revision) FROM note_revisions
+                     WHERE note_id = ? AND revision >= ? AND snapshot),
+                    revision
+                )
+                ORDER BY revision DESC
+                """,
+                (note_id, revision, note_id, revision),
+            ).fetchall()
+            if not rows or rows[-1]["revision"] != revision:
+                return None
+            if rows[0]["snapshot"]:
+                content = read_snapshot(rows[0]["data"])
+                deltas = rows[1:]
+            else:
+                content = conn.execute(
+                    "SELECT content FROM notes WHERE id = ?", (note_id,)
+                ).fetchone()[0] or ""
+                deltas = rows
+        for row in deltas:
+            content = apply_delta(content, row["data"])
+        target = rows[-1]
+        return {
+            "note_id": note_id,
+            "revision": revision,
+            "saved_at": target["saved_at"],
+            "title": target["title"],
+            "content": content,
+            "tags": target["tags"],
+            "category": target["category"],
+        }
+
+    def restore_revision(self, note_id, revision):
+        # Restoring is itself an edit, so the version it replaces stays in history
+        old = self.get_revision(note_id, revision)
+        if old is None:
+            return False
+        self.update_note(note_id, old["title"], old["content"], old["tags"], old["category"])
+        return True
+
+    def compact_history(self, note_id=None, now=None):
+        # Applies the retention policy in db.history; returns how many
+        # revisions were dropped
+        if note_id is None:
+            note_ids = [
+                row[0] for row in self.conn.execute("SELECT DISTINCT note_id FROM note_revisions")
+            ]
+        else:
+            note_ids = [note_id]
+        dropped = 0
+        for note_id in note_ids:
+            with self.conn as conn:
+                conn.execute("BEGIN")
+                dropped += self._compact_note(conn.cursor(), note_id, now)
+        return dropped
+
+    def _compact_note(self, cursor, note_id, now=None, limit=MAX_REVISIONS):
+        revisions = cursor.execute(
+            "SELECT revision, saved_at FROM note_revisions WHERE note_id = ? ORDER BY revision DESC",
+            (note_id,),
+        ).fetchall()
+        saved_ats = [
+            datetime.fromisoformat(row["saved_at"]) if row["saved_at"] else datetime.min
+            for row in revisions
+        ]
+        keep = revisions_to_keep(saved_ats, now, limit)
+        if len(keep) == len(revisions):
+            return 0
+        if keep == list(range(len(keep))):
+            # Only the oldest go. Deltas point from newer to older revisions,
+            # so the survivors need no re-encoding.
             cursor.execute(
-                "UPDATE notes SET title = ?, content = ?, tags = ?, category = ? WHERE id = ?",
-                (title, content, tags, category, note_id),
+                "DELETE FROM note_revisions WHERE note_id = ? AND revision < ?",
+                (note_id, revisions[len(keep) - 1]["revision"]),
+            )
+            return len(revisions) - len(keep)
+        rows = cursor.execute(
+            """
+            SELECT revision, saved_at, title, tags, category, snapshot, data
+            FROM note_revisions WHERE note_id = ? ORDER BY revision DESC
+            """,
+            (note_id,),
+        ).fetchall()
+        current = cursor.execute(
+            "SELECT content FROM notes WHERE id = ?", (note_id,)
+        ).fetchone()[0] or ""
+        contents = []
+        content = current
+        for row in rows:
+            if row["snapshot"]:
+                content = read_snapshot(row["data"])
+            else:
+                content = apply_delta(content, row["data"])
+            contents.append(content)
+        # Re-encode the survivors, each against the next newer survivor
+        cursor.execute("DELETE FROM note_revisions WHERE note_id = ?", (note_id,))
+        newer = current
+        revisions = []
+        for position, i in enumerate(keep):
+            row, content = rows[i], contents[i]
+            snapshot = (position + 1) % SNAPSHOT_EVERY == 0
+            data = make_snapshot(content) if snapshot else make_delta(newer, content)
+            revisions.append((
+                note_id, row["revision"], row["saved_at"], row["title"], row["tags"],
+                row["category"], len(content), int(snapshot), data,
+            ))
+            newer = content
+        cursor.executemany(
+            """
+            INSERT INTO note_revisions
+                (note_id, revision, saved_at, title, tags, category, size, snapshot, data)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            revisions,
+        )
+        return len(rows) - len(keep)
+
+    def add_listener(self, listener):
+        # listener(event, note_id, new, old) runs on the writing thread after
+        # each committed "add", "delete" or "update" of the title or content;
+        # new and old are (title, content) tuples or None
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self._listeners.remove(listener)
+
+    def _old_note(self, cursor, note_id):
+        if not self._listeners:
+            return None
+        row = cursor.execute(
+            "SELECT title, content FROM notes WHERE id = ?", (note_id,)
+        ).fetchone()
+        return tuple(row) if row else None
+
+    def _notify(self, event, note_id, new=None, old=None):
+        for listener in self._listeners:
+            listener(event, note_id, new, old)
+
+    def bulk_insert_notes(self, notes, source=None, position=None):
+        # notes: (title, content, tags, category, created_at, updated_at) tuples.
+        # Full-text indexing is deferred to finish_import(); the checkpoint for
+        # source is written in the same transaction as the batch. Facet counts
+        # and journal entries are added once per batch instead of by the
+        # per-row triggers.
+        with self.conn as conn:
+            conn.execute("BEGIN")
+            cursor = conn.cursor()
+            cursor.execute("DROP TRIGGER notes_fts_insert")
+            cursor.execute("DROP TRIGGER facet_counts_insert")
+            cursor.execute("DROP TRIGGER tag_counts_insert")
+            cursor.execute("DROP TRIGGER notes_journal_insert")
+            # Continue from the AUTOINCREMENT counter, so ids of deleted notes
+            # are never handed out again (export_notes(after_id=...) relies on it)
+            first_id = cursor.execute(
+                """
+                SELECT MAX(
+                    COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'notes'), 0),
+                    COALESCE((SELECT MAX(id) FROM notes), 0)
+                ) + 1
+                """
+            ).fetchone()[0]
+            ids = range(first_id, first_id + len(notes))
+            cursor.executemany(
+                "INSERT INTO notes (id, title, content, tags, category, created_at, updated_at, uid) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(note_id,) + tuple(note) + (new_uid(),) for note_id, note in zip(ids, notes)],
+            )
+            cursor.executemany(
+                "INSERT INTO import_pending (note_id) VALUES (?)", [(i,) for i in ids]
             )
+            note_tags = [(note_id, split_tags(note[2])) for note_id, note in zip(ids, notes)]
+            names = {name for _, tags in note_tags for name in tags}
+            cursor.executemany(
+                "INSERT OR IGNORE INTO tags (name) VALUES (?)", [(n,) for n in names]
+            )
+            tag_ids = {}
+            names = list(names)
+            for i in range(0, len(names), 500):
+                chunk = names[i : i + 500]
+                placeholders = ",".join("?" for _ in chunk)
+                for row in cursor.execute(
+                    f"SELECT id, name FROM tags WHERE name IN ({placeholders})", chunk
+                ):
+                    tag_ids[row[1]] = row[0]
+            cursor.executemany(
+                "INSERT OR IGNORE INTO note_tags (note_id, tag_id) VALUES (?, ?)",
+                [(note_id, tag_ids[name]) for note_id, tags in note_tags for name in tags],
+            )
+            cursor.executemany(
+                "UPDATE tags SET note_count = note_count + ? WHERE id = ?",
+                [
+                    (count, tag_ids[name])
+                    for name, count in Counter(
+                        name for _, tags in note_tags for name in tags
+                    ).items()
+                ],
+            )
+            for table, column, value in (
+                ("category_counts", "category", "IFNULL(category, '')"),
+                ("month_counts", "month", "IFNULL(substr(created_at, 1, 7), '')"),
+            ):
+                cursor.execute(
+                    f"""
+                    INSERT INTO {table} ({column}, note_count)
+                    SELECT {value}, COUNT(*) FROM notes WHERE id BETWEEN ? AND ? GROUP BY 1
+                    ON CONFLICT ({column}) DO UPDATE SET note_count = note_count + excluded.note_count
+                    """,
+                    (ids.start, ids.stop - 1),
+                )
             cursor.execute(
-                "INSERT OR REPLACE INTO notes_fts (rowid, title, content) VALUES (?, ?, ?)",
-                (note_id, title, content),
+                """
+                INSERT INTO note_journal (uid, deleted, changed_at, origin)
+                SELECT uid, 0, updated_at, ? FROM notes WHERE id BETWEEN ? AND ? ORDER BY id
+                """,
+                (self.vault_id, ids.start, ids.stop - 1),
             )
-            conn.commit()
+            cursor.execute(FTS_INSERT_TRIGGER)
+            cursor.execute(FACET_COUNTS_INSERT_TRIGGER)
+            cursor.execute(TAG_COUNTS_INSERT_TRIGGER)
+            cursor.execute(JOURNAL_INSERT_TRIGGER)
+            if source is not None:
+                cursor.execute(
+                    "INSERT OR REPLACE INTO import_checkpoints (source, position) VALUES (?, ?)",
+                    (source, position),
+                )
+        self.clear_search_cache()
+        for note_id, note in zip(ids, notes):
+            self._notify("add", note_id, (note[0], note[1]))
+        return len(notes)
 
-    def delete_note(self, note_id):
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM notes WHERE id = ?", (note_id,))
-            cursor.execute("DELETE FROM notes_fts WHERE rowid = ?", (note_id,))
-            conn.commit()
+    def get_import_position(self, source):
+        row = self.conn.execute(
+            "SELECT position FROM import_checkpoints WHERE source = ?", (source,)
+        ).fetchone()
+        return row[0] if row else 0
 
-    def get_all_notes(self):
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM notes ORDER BY created_at DESC")
-            return cursor.fetchall()
+    def finish_import(self, source=None):
+        # One indexing pass over everything bulk_insert_notes left pending
+        with self.conn as conn:
+            conn.execute("BEGIN")
+            for table in FTS_TABLES:
+                conn.execute(f"""
+                    INSERT INTO {table} (rowid, title, content)
+                    SELECT n.id, n.title, n.content
+                    FROM import_pending p JOIN notes n ON n.id = p.note_id
+                """)
+            conn.execute("DELETE FROM import_pending")
+            if source is not None:
+                conn.execute("DELETE FROM import_checkpoints WHERE source = ?", (source,))
+        self.clear_search_cache()
 
-    def get_note_by_id(self, note_id):
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM notes WHERE id = ?", (note_id,))
-            return cursor.fetchone()
+    @property
+    def vault_id(self):
+        # Random id of this vault file, the origin of its journal entries
+        if self._vault_id is None:
+            self._vault_id = self.conn.execute(
+                "SELECT value FROM vault_info WHERE key = 'vault_id'"
+            ).fetchone()[0]
+        return self._vault_id
+
+    def renew_vault_id(self):
+        # For a copied vault file, so the copy and the original can sync;
+        # the copy's history still counts as the original's changes
+        with self.conn as conn:
+            conn.execute("UPDATE vault_info SET value = ? WHERE key = 'vault_id'", (new_uid(),))
+        self._vault_id = None
+        return self.vault_id
 
-    def search_notes(self, query):
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+    def get_changes(self, since=0, limit=None):
+        # Journal entries after seq since, oldest first, each with the note
+        # as it is now (all None for tombstones)
+        cursor = self.conn.execute(
+            """
+            SELECT j.seq, j.uid, j.deleted, j.changed_at, j.origin,
+                   n.title, n.content, n.tags, n.category, n.created_at
+            FROM note_journal j LEFT JOIN notes n ON n.uid = j.uid
+            WHERE j.seq > ?
+            ORDER BY j.seq
+            LIMIT ?
+            """,
+            (since, -1 if limit is None else limit),
+        )
+        return cursor.fetchall()
+
+    def get_sync_position(self, vault_id):
+        # The last seq of that vault applied here; 0 if never synced
+        row = self.conn.execute(
+            "SELECT seq FROM sync_peers WHERE vault_id = ?", (vault_id,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def apply_changes(self, vault_id, seq, changes):
+        # Applies get_changes() rows of another vault in one transaction and
+        # records seq as synced. The newer version of each note wins (see
+        # db.sync.version); notes change through the same paths as local
+        # edits, so revisions, tags and counts stay consistent. Returns the
+        # number of changes applied.
+        events = []
+        with self.conn as conn:
+            conn.execute("BEGIN")
             cursor = conn.cursor()
+            for change in changes:
+                local = cursor.execute(
+                    """
+                    SELECT j.changed_at, j.origin, n.id
+                    FROM note_journal j LEFT JOIN notes n ON n.uid = j.uid
+                    WHERE j.uid = ?
+                    """,
+                    (change["uid"],),
+                ).fetchone()
+                if local is not None and version(local) >= version(change):
+                    continue
+                note_id = local["id"] if local is not None else None
+                if change["deleted"]:
+                    if note_id is not None:
+                        old = self._delete_note(cursor, note_id, change["changed_at"])
+                        events.append(("delete", note_id, None, old))
+                elif note_id is None:
+                    note = tuple(change[name] for name in NOTE_FIELDS)
+                    note_id = self._insert_note(
+                        cursor, *note, change["created_at"], change["changed_at"], change["uid"]
+                    )
+                    events.append(("add", note_id, note[:2], None))
+                else:
+                    fields = {name: change[name] for name in NOTE_FIELDS}
+                    updates, old = self._update_note_fields(
+                        cursor, note_id, fields, change["changed_at"]
+                    )
+                    if updates:
+                        events.append(("update", note_id, updates, old))
+                # The entry keeps the other vault's time and origin, so it
+                # compares equal there and passes on to further vaults as is
+                cursor.execute(
+                    "INSERT OR REPLACE INTO note_journal (uid, deleted, changed_at, origin) VALUES (?, ?, ?, ?)",
+                    (change["uid"], change["deleted"], change["changed_at"], change["origin"]),
+                )
             cursor.execute(
-                "SELECT rowid FROM notes_fts WHERE notes_fts MATCH ? ORDER BY rank",
-                (query,),
+                """
+                INSERT INTO sync_peers (vault_id, seq, synced_at) VALUES (?, ?, ?)
+                ON CONFLICT (vault_id) DO UPDATE SET seq = excluded.seq, synced_at = excluded.synced_at
+                """,
+                (vault_id, seq, datetime.now()),
             )
-            note_ids = [row["rowid"] for row in cursor.fetchall()]
-            if not note_ids:
-                return []
-            placeholders = ",".join("?" for _ in note_ids)
-            cursor.execute(
-                f"SELECT * FROM notes WHERE id IN ({placeholders}) ORDER BY created_at DESC",
-                note_ids,
+        if events:
+            self.clear_search_cache()
+        for event, note_id, new, old in events:
+            if event == "update":
+                self._notify_update(note_id, new, old)
+            else:
+                self._notify(event, note_id, new, old)
+        return len(events)
+
+    def get_rendered_note(self, note_id, content_hash):
+        row = self.conn.execute(
+            "SELECT html FROM rendered_notes WHERE note_id = ? AND content_hash = ?",
+            (note_id, content_hash),
+        ).fetchone()
+        return row[0] if row else None
+
+    def save_rendered_note(self, note_id, content, content_hash, html):
+        # Only stored if the note still has the content that was rendered
+        with self.conn as conn:
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO rendered_notes (note_id, content_hash, html)
+                SELECT id, ?, ? FROM notes WHERE id = ? AND content = ?
+                """,
+                (content_hash, html, note_id, content),
+            )
+
+    def add_attachment(self, note_id, source, name=None, mime_type=None):
+        # source is a path or a binary file object. The file is hashed first,
+        # so content already stored is only linked, then streamed into a
+        # zeroblob through blobopen; it is never held in memory whole.
+        f, close = open_source(source)
+        try:
+            name = name or os.path.basename(getattr(f, "name", "") or "attachment")
+            start = f.tell()
+            digest, size = hash_file(f)
+            with self.conn as conn:
+                conn.execute("BEGIN")
+                if conn.execute("SELECT 1 FROM notes WHERE id = ?", (note_id,)).fetchone() is None:
+                    raise KeyError(f"No note {note_id}")
+                row = conn.execute("SELECT id FROM blobs WHERE hash = ?", (digest,)).fetchone()
+                if row is not None:
+                    blob_id = row[0]
+                else:
+                    blob_id = conn.execute(
+                        "INSERT INTO blobs (hash, size, data) VALUES (?, ?, zeroblob(?))",
+                        (digest, size, size),
+                    ).lastrowid
+                    f.seek(start)
+                    check = hashlib.sha256()
+                    with conn.blobopen("blobs", "data", blob_id) as blob:
+                        while chunk := f.read(min(CHUNK_SIZE, size - blob.tell())):
+                            check.update(chunk)
+                            blob.write(chunk)
+                    if check.hexdigest() != digest:
+                        raise ValueError(f"{name} changed while it was being attached")
+                attachment_id = conn.execute(
+                    """
+                    INSERT INTO attachments (note_id, blob_id, name, mime_type, created_at)
+                    VALUES (?, ?, ?, ?, ?)
+                    """,
+                    (note_id, blob_id, name, mime_type or guess_mime_type(name), datetime.now()),
+                ).lastrowid
+        finally:
+            if close:
+                f.close()
+        return attachment_id
+
+    def get_attachments(self, note_id):
+        cursor = self.conn.execute(
+            """
+            SELECT a.id, a.name, a.mime_type, a.created_at, b.size, b.hash
+            FROM attachments a JOIN blobs b ON b.id = a.blob_id
+            WHERE a.note_id = ?
+            ORDER BY a.id
+            """,
+            (note_id,),
+        )
+        return cursor.fetchall()
+
+    def _attachment_blob(self, attachment_id):
+        row = self.conn.execute(
+            "SELECT blob_id FROM attachments WHERE id = ?", (attachment_id,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(f"No attachment {attachment_id}")
+        return row[0]
+
+    def iter_attachment(self, attachment_id, chunk_size=CHUNK_SIZE):
+        # Yields the file contents chunk by chunk
+        blob_id = self._attachment_blob(attachment_id)
+        with self.conn.blobopen("blobs", "data", blob_id, readonly=True) as blob:
+            while chunk := blob.read(chunk_size):
+                yield chunk
+
+    def save_attachment(self, attachment_id, target):
+        # Copies an attachment to a path or writable binary file object
+        chunks = self.iter_attachment(attachment_id)
+        # Fails on unknown ids before a target file is created
+        first = next(chunks, b"")
+        if isinstance(target, (str, os.PathLike)):
+            with open(target, "wb") as f:
+                return self._write_chunks(f, first, chunks)
+        return self._write_chunks(target, first, chunks)
+
+    def _write_chunks(self, f, first, chunks):
+        f.write(first)
+        size = len(first)
+        for chunk in chunks:
+            f.write(chunk)
+            size += len(chunk)
+        return size
+
+    def delete_attachment(self, attachment_id):
+        with self.conn as conn:
+            conn.execute("DELETE FROM attachments WHERE id = ?", (attachment_id,))
+
+    def get_thumbnail(self, attachment_id, size=THUMBNAIL_SIZE):
+        # PNG bytes, made with Pillow on first request and kept in the
+        # database; None for attachments that are not images
+        blob_id = self._attachment_blob(attachment_id)
+        row = self.conn.execute(
+            "SELECT png FROM thumbnails WHERE blob_id = ? AND size = ?", (blob_id, size)
+        ).fetchone()
+        if row is not None:
+            return row[0]
+        with self.conn.blobopen("blobs", "data", blob_id, readonly=True) as blob:
+            png = make_thumbnail(blob, size)
+        with self.conn as conn:
+            # Non-images are remembered too, so they are only tried once
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO thumbnails (blob_id, size, png)
+                SELECT id, ?, ? FROM blobs WHERE id = ?
+                """,
+                (size, png, blob_id),
             )
-            return cursor.fetchall()
+        return png
+
+    def rebuild_search_index(self):
+        with self.conn as conn:
+            for table in FTS_TABLES:
+                conn.execute(f"INSERT INTO {table} ({table}) VALUES ('rebuild')")
+
+    def optimize_search_index(self):
+        with self.conn as conn:
+            for table in FTS_TABLES:
+                conn.execute(f"INSERT INTO {table} ({table}) VALUES ('optimize')")
+
+    def merge_search_index(self, pages=500):
+        with self.conn as conn:
+            for table in FTS_TABLES:
+                conn.execute(
+                    f"INSERT INTO {table} ({table}, rank) VALUES ('merge', ?)", (pages,)
+                )
+
+    def set_search_automerge(self, segments=4):
+        # 0 disables automatic merging, otherwise 2-16 segments per level
+        with self.conn as conn:
+            for table in FTS_TABLES:
+                conn.execute(
+                    f"INSERT INTO {table} ({table}, rank) VALUES ('automerge', ?)",
+                    (segments,),
+                )
+
+    def check_search_index(self):
+        try:
+            with self.conn as conn:
+                for table in FTS_TABLES:
+                    conn.execute(
+                        f"INSERT INTO {table} ({table}, rank) VALUES ('integrity-check', 1)"
+                    )
+        except sqlite3.DatabaseError:
+            return False
+        return True
+
+    def get_all_notes(self):
+        cursor = self.conn.execute("SELECT * FROM notes ORDER BY created_at DESC")
+        return cursor.fetchall()
+
+    def _changed_filter(self, since, after_id):
+        clauses, params = [], []
+        if since is not None:
+            if isinstance(since, str):
+                try:
+                    since = datetime.fromisoformat(since)
+                except ValueError:
+                    # A month ("2024-01") compares correctly as text
+                    pass
+            clauses.append("updated_at >= ?")
+            params.append(since)
+        if after_id is not None:
+            clauses.append("id > ?")
+            params.append(after_id)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def count_notes(self, since=None, after_id=None):
+        where, params = self._changed_filter(since, after_id)
+        return self.conn.execute(f"SELECT COUNT(*) FROM notes{where}", params).fetchone()[0]
+
+    def iter_notes(self, since=None, after_id=None, batch_size=500):
+        # Streams full notes in id order without materialising the result set
+        where, params = self._changed_filter(since, after_id)
+        cursor = self.conn.execute(
+            f"""
+            SELECT id, title, content, tags, category, created_at, updated_at
+            FROM notes{where} ORDER BY id
+            """,
+            params,
+        )
+        try:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                yield from rows
+        finally:
+            cursor.close()
+
+    def get_note_page(self, after=None, limit=200):
+        # Keyset paging, newest first; after is the (created_at, id) of the last row seen
+        if after is None:
+            cursor = self.conn.execute(
+                "SELECT id, title, created_at FROM notes ORDER BY created_at DESC, id DESC LIMIT ?",
+                (limit,),
+            )
+        else:
+            cursor = self.conn.execute(
+                """
+                SELECT id, title, created_at FROM notes
+                WHERE (created_at, id) < (?, ?)
+                ORDER BY created_at DESC, id DESC LIMIT ?
+                """,
+                (after[0], after[1], limit),
+            )
+        return cursor.fetchall()
+
+    def get_note_summary(self, note_id):
+        cursor = self.conn.execute(
+            "SELECT id, title, created_at FROM notes WHERE id = ?", (note_id,)
+        )
+        return cursor.fetchone()
+
+    def get_note_by_id(self, note_id):
+        cursor = self.conn.execute("SELECT * FROM notes WHERE id = ?", (note_id,))
+        return cursor.fetchone()
+
+    def search_notes(
+        self,
+        query,
+        limit=None,
+        offset=0,
+        weights=(1.0, 1.0),
+        excerpts=False,
+        marks=("[", "]"),
+        rank_window=None,
+        facets=None,
+        after=None,
+    ):
+        # Ranked by BM25 (lower is better); weights apply to (title, content).
+        # With rank_window only that many of the newest matches are ranked,
+        # which bounds the cost of unselective queries such as a short prefix.
+        # facets: a dict of filter_notes() filters the matches must pass.
+        # after is the (score, id) of the last row seen, for keyset paging
+        # like get_note_page(); a write between pages cannot repeat rows.
+        facets = facets or {}
+        key = (
+            query,
+            limit,
+            offset,
+            tuple(after) if after is not None else None,
+            tuple(weights),
+            excerpts,
+            tuple(marks),
+            rank_window,
+            tuple(
+                (name, tuple(value) if isinstance(value, (list, tuple, set)) else value)
+                for name, value in sorted(facets.items())
+            ),
+        )
+        self._check_data_version()
+        with self._lock:
+            rows = self._search_cache.get(key)
+            if rows is not None:
+                self._search_cache.move_to_end(key)
+                return rows
+            generation = self._search_generation
+        table = search_table(query)
+        columns = f"n.id, n.title, n.tags, n.category, n.created_at, bm25({table}, ?, ?) AS score"
+        params = [weights[0], weights[1]]
+        if excerpts:
+            columns += (
+                f", highlight({table}, 0, ?, ?) AS title_highlight"
+                f", snippet({table}, 1, ?, ?, '…', 12) AS snippet"
+            )
+            params += [marks[0], marks[1], marks[0], marks[1]]
+        where = f"{table} MATCH ?"
+        params.append(query)
+        if rank_window and not facets:
+            # Walking the rowids of the matches is cheap; scoring them is not.
+            # Filtered searches rank only what passes the filters anyway, and
+            # a window over all matches could leave them without results.
+            row = self.conn.execute(
+                f"SELECT rowid FROM {table} WHERE {table} MATCH ? ORDER BY rowid DESC LIMIT 1 OFFSET ?",
+                (query, rank_window - 1),
+            ).fetchone()
+            if row is not None:
+                where += f" AND {table}.rowid >= ?"
+                params.append(row[0])
+        clauses, facet_params = self._facet_filter("n.", **facets)
+        for clause in clauses:
+            where += f" AND {clause}"
+        params += facet_params
+        if after is not None:
+            where += " AND (score, n.id) > (?, ?)"
+            params += list(after)
+        cursor = self.conn.execute(
+            f"""
+            SELECT {columns}
+            FROM {table} JOIN notes n ON n.id = {table}.rowid
+            WHERE {where}
+            ORDER BY score, n.id
+            LIMIT ? OFFSET ?
+            """,
+            params + [-1 if limit is None else limit, offset],
+        )
+        rows = cursor.fetchall()
+        with self._lock:
+            # A write that committed while the query ran may make rows stale;
+            # unbounded result sets are not worth keeping
+            if (
+                generation == self._search_generation
+                and self.search_cache_size
+                and limit is not None
+            ):
+                self._search_cache[key] = rows
+                if len(self._search_cache) > self.search_cache_size:
+                    self._search_cache.popitem(last=False)
+        return rows
+
+    def clear_search_cache(self):
+        with self._lock:
+            self._search_generation += 1
+            self._search_cache.clear()
+
+    def _check_data_version(self):
+        # cli.py, a sync from another process or another Database on the same
+        # file write without clearing this cache. data_version changes with
+        # every commit made through any other connection; a thread's first
+        # look has nothing to compare with, so it clears as well.
+        version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        if version != getattr(self._local, "data_version", None):
+            self.clear_search_cache()
+            self._local.data_version = version
 
     def get_all_tags(self):
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT tags FROM notes")
-            tags = set()
-            for row in cursor.fetchall():
-                if row[0]:
-                    tags.update(tag.strip() for tag in row[0].split(","))
-            return sorted(tags)
+        cursor = self.conn.execute("SELECT name FROM tags ORDER BY name")
+        return [row[0] for row in cursor.fetchall()]
+
+    def get_tag_counts(self, names=None):
+        # All tags, or only the given ones (tags no note uses are left out);
+        # the counts are kept by triggers on note_tags
+        where, params = "", []
+        if names is not None:
+            names = list(names)
+            if not names:
+                return []
+            where = f"AND name IN ({','.join('?' for _ in names)})"
+            params = names
+        cursor = self.conn.execute(
+            f"SELECT name, note_count FROM tags WHERE note_count > 0 {where} ORDER BY name",
+            params,
+        )
+        return [(row[0], row[1]) for row in cursor.fetchall()]
+
+    def get_category_counts(self):
+        # '' stands for notes without a category
+        cursor = self.conn.execute(
+            "SELECT category, note_count FROM category_counts ORDER BY category"
+        )
+        return [(row[0], row[1]) for row in cursor.fetchall()]
+
+    def get_month_counts(self):
+        # ("YYYY-MM", count) by creation month, oldest first; '' for undated notes
+        cursor = self.conn.execute("SELECT month, note_count FROM month_counts ORDER BY month")
+        return [(row[0], row[1]) for row in cursor.fetchall()]
+
+    def _facet_filter(
+        self, prefix="", categories=None, tags=None, match="all", since=None, until=None
+    ):
+        # SQL conditions for the filters of filter_notes(), on columns named
+        # prefix + column
+        clauses, params = [], []
+        if categories:
+            categories = list(categories)
+            clause = f"{prefix}category IN ({','.join('?' for _ in categories)})"
+            if "" in categories:
+                clause = f"({clause} OR {prefix}category IS NULL)"
+            clauses.append(clause)
+            params += categories
+        if since is not None:
+            clauses.append(f"{prefix}created_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append(f"{prefix}created_at < ?")
+            params.append(until)
+        names = split_tags(",".join(tags or ()))
+        if names:
+            having = f"HAVING COUNT(*) = {len(names)}" if match == "all" else ""
+            clauses.append(f"""{prefix}id IN (
+                SELECT nt.note_id
+                FROM tags t JOIN note_tags nt ON nt.tag_id = t.id
+                WHERE t.name IN ({','.join('?' for _ in names)})
+                GROUP BY nt.note_id {having}
+            )""")
+            params += names
+        return clauses, params
+
+    def filter_notes(
+        self,
+        categories=None,
+        tags=None,
+        match="all",
+        since=None,
+        until=None,
+        after=None,
+        limit=None,
+    ):
+        # Newest first, keyset paged like get_note_page(). Filters combine:
+        # any of categories, all (or with match="any", any) of tags, and
+        # created_at in [since, until) given as dates or ISO strings of at
+        # least year and month, e.g. "2024-03" (see month_range()).
+        clauses, params = self._facet_filter(
+            "", categories, tags, match, since, until
+        )
+        if after is not None:
+            clauses.append("(created_at, id) < (?, ?)")
+            params += list(after)
+        where = " WHERE " + " AND ".join(clauses) if clauses else ""
+        cursor = self.conn.execute(
+            f"""
+            SELECT id, title, created_at FROM notes{where}
+            ORDER BY created_at DESC, id DESC
+            LIMIT ?
+            """,
+            params + [-1 if limit is None else limit],
+        )
+        return cursor.fetchall()
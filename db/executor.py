@@ -0,0 +1,122 @@
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+POLL_MS = 10
+
+
+class DatabaseExecutor:
+    # Runs Database calls on one worker thread and hands results back to the
+    # Tk thread through after(). Requests sharing a key supersede each other:
+    # a queued one is cancelled and a running one has its result dropped (and,
+    # for read-only requests submitted with interrupt=True, is aborted).
+    def __init__(self, db, widget):
+        self.db = db
+        self.widget = widget
+        self.requests = queue.Queue()
+        self.results = queue.Queue()
+        self.latest = {}
+        self.pending = 0
+        self.poll_id = None
+        self.lock = threading.Lock()
+        self.running = None
+        self.connection = None
+        # Extra callables run on interrupt, for requests that query other
+        # connections (e.g. mounted vaults)
+        self.interrupt_hooks = []
+        self.worker = threading.Thread(target=self.work, name="db-worker", daemon=True)
+        self.worker.start()
+
+    def submit(
+        self, method, *args, key=None, callback=None, errback=None, interrupt=False, **kwargs
+    ):
+        # method is a Database method name or a callable taking the database
+        future = Future()
+        if key is not None:
+            previous = self.latest.get(key)
+            if previous is not None and not previous.cancel() and interrupt:
+                self.interrupt(previous)
+            self.latest[key] = future
+        self.requests.put((future, method, args, kwargs, key, callback, errback))
+        self.pending += 1
+        if self.poll_id is None:
+            self.poll_id = self.widget.after(POLL_MS, self.poll)
+        return future
+
+    def cancel(self, key):
+        future = self.latest.pop(key, None)
+        if future is not None:
+            future.cancel()
+
+    def interrupt(self, future):
+        # sqlite3_interrupt is a no-op when no statement is running, and the
+        # lock keeps the worker from starting the next request meanwhile
+        with self.lock:
+            if self.running is future:
+                self.connection.interrupt()
+                for hook in self.interrupt_hooks:
+                    hook()
+
+    def work(self):
+        self.connection = self.db.conn
+        while True:
+            request = self.requests.get()
+            if request is None:
+                break
+            future, method, args, kwargs = request[:4]
+            with self.lock:
+                self.running = future if future.set_running_or_notify_cancel() else None
+            if self.running is future:
+                try:
+                    if isinstance(method, str):
+                        result = getattr(self.db, method)(*args, **kwargs)
+                    else:
+                        result = method(self.db, *args, **kwargs)
+                except Exception as e:
+                    future.set_exception(e)
+                else:
+                    future.set_result(result)
+                with self.lock:
+                    self.running = None
+            self.results.put(request)
+        self.db.release()
+
+    def poll(self):
+        try:
+            while not self.results.empty():
+                self.deliver(self.results.get_nowait())
+        finally:
+            # A callback that raised must not stop later results reaching the UI
+            if self.pending:
+                self.poll_id = self.widget.after(POLL_MS, self.poll)
+            else:
+                self.poll_id = None
+
+    def deliver(self, request):
+        future, method, args, kwargs, key, callback, errback = request
+        self.pending -= 1
+        if key is not None:
+            if self.latest.get(key) is not future:
+                return
+            del self.latest[key]
+        if future.cancelled():
+            return
+        error = future.exception()
+        try:
+            if error is not None:
+                if errback is not None:
+                    errback(error)
+                else:
+                    logger.error("Database call %s failed", method, exc_info=error)
+            elif callback is not None:
+                callback(future.result())
+        except Exception:
+            logger.exception("Callback for database call %s failed", method)
+
+    def shutdown(self, timeout=5):
+        # Requests already queued (e.g. a save) still run before the worker exits
+        self.requests.put(None)
+        self.worker.join(timeout)
@@ -0,0 +1,70 @@
+import json
+import zlib
+from datetime import datetime, timedelta
+from difflib import SequenceMatcher
+
+# A full copy is stored at least every this many revisions, so restoring any
+# revision applies at most SNAPSHOT_EVERY - 1 deltas
+SNAPSHOT_EVERY = 16
+# Retention: every revision of the last KEEP_ALL_DAYS, one per day before
+# that, and never more than MAX_REVISIONS per note
+KEEP_ALL_DAYS = 7
+MAX_REVISIONS = 200
+# A save that takes a note past MAX_REVISIONS trims it to this many, so the
+# next trim is MAX_REVISIONS - COMPACT_TO saves away rather than on every save
+COMPACT_TO = 150
+
+
+def make_delta(base, text):
+    # Line delta that rebuilds text from base: a JSON list whose [start, end]
+    # pairs copy base lines and whose strings are inserted verbatim
+    base_lines = base.splitlines(keepends=True)
+    lines = text.splitlines(keepends=True)
+    ops = []
+    matcher = SequenceMatcher(None, base_lines, lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append([i1, i2])
+        elif j1 < j2:
+            inserted = "".join(lines[j1:j2])
+            if ops and isinstance(ops[-1], str):
+                ops[-1] += inserted
+            else:
+                ops.append(inserted)
+    return zlib.compress(json.dumps(ops, separators=(",", ":")).encode())
+
+
+def apply_delta(base, delta):
+    base_lines = base.splitlines(keepends=True)
+    parts = []
+    for op in json.loads(zlib.decompress(delta)):
+        if isinstance(op, str):
+            parts.append(op)
+        else:
+            parts.extend(base_lines[op[0] : op[1]])
+    return "".join(parts)
+
+
+def make_snapshot(text):
+    return zlib.compress(text.encode())
+
+
+def read_snapshot(data):
+    return zlib.decompress(data).decode()
+
+
+def revisions_to_keep(saved_ats, now=None, limit=MAX_REVISIONS):
+    # saved_ats: datetimes of one note's revisions, newest first. Returns the
+    # indexes to keep under the retention policy above, at most limit of them.
+    now = now or datetime.now()
+    cutoff = now - timedelta(days=KEEP_ALL_DAYS)
+    keep = []
+    days = set()
+    for i, saved_at in enumerate(saved_ats):
+        if saved_at >= cutoff:
+            keep.append(i)
+        elif saved_at.date() not in days:
+            # Newest first, so this is the last version saved that day
+            days.add(saved_at.date())
+            keep.append(i)
+    return keep[:limit]
@@ -0,0 +1,324 @@
+import os
+import re
+import threading
+import zlib
+from array import array
+from collections import Counter
+from datetime import datetime
+
+import numpy as np
+
+TOKEN = re.compile(r"[^\W\d_]{2,}")
+# Strongest terms kept per note; similarity is exact cosine over these
+TERMS_PER_NOTE = 32
+# Notes vectorised together during a build
+BUILD_CHUNK = 10_000
+FETCH_BATCH = 500
+
+
+def term_counts(title, content):
+    # Title words count twice; they say more about a note than body words
+    return Counter(TOKEN.findall(f"{title} {title} {content or ''}".lower()))
+
+
+def top_terms(row, term_ids, counts, idf, size):
+    # Vectorised TF-IDF for a batch of notes given as flat (row, term, count)
+    # arrays, rows numbered from 0: keeps each row's heaviest `size` terms,
+    # L2-normalised. Returns zero-padded (terms, weights) of shape (rows, size).
+    rows = int(row[-1]) + 1 if len(row) else 0
+    weights = (1 + np.log(counts)) * idf[term_ids]
+    order = np.lexsort((-weights, row))
+    starts = np.searchsorted(row[order], np.arange(rows))
+    rank = np.arange(len(order)) - np.repeat(starts, np.diff(np.append(starts, len(order))))
+    keep = rank < size
+    order, rank = order[keep], rank[keep]
+    terms = np.zeros((rows, size), dtype=np.uint32)
+    values = np.zeros((rows, size), dtype=np.float32)
+    terms[row[order], rank] = term_ids[order]
+    values[row[order], rank] = weights[order]
+    norms = np.linalg.norm(values, axis=1, keepdims=True)
+    np.divide(values, norms, out=values, where=norms > 0)
+    return terms, values
+
+
+class RelatedNotesIndex:
+    # TF-IDF vectors for every note, kept in NumPy arrays in a file next to
+    # the database. Terms are hashed (crc32) and then numbered densely, so a
+    # top-k cosine query is one gather plus one multiply-sum over an (n, T)
+    # array. IDF weights are fixed when a note is indexed; open(db,
+    # rebuild=True) refreshes them.
+    def __init__(self, db_path, terms_per_note=TERMS_PER_NOTE):
+        self.path = db_path + ".related.npz"
+        self.terms_per_note = terms_per_note
+        self.lock = threading.Lock()
+        self.ready = False
+        self.dirty = False
+        self.pending = []
+        self.clear()
+
+    def clear(self):
+        self.count = 0
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.terms = np.zeros((0, self.terms_per_note), dtype=np.uint32)
+        self.weights = np.zeros((0, self.terms_per_note), dtype=np.float32)
+        self.rows = {}
+        # Term id 0 is padding; vocabulary maps term hash -> id
+        self.vocabulary = {}
+        self.term_hashes = array("I", [0])
+        self.hashes = {}
+        self.df = np.zeros(1, dtype=np.int64)
+        self.doc_count = 0
+        self.synced_at = None
+
+    def term_ids(self, counts):
+        ids = []
+        hashes, vocabulary = self.hashes, self.vocabulary
+        for term in counts:
+            h = hashes.get(term)
+            if h is None:
+                h = hashes[term] = zlib.crc32(term.encode())
+            term_id = vocabulary.get(h)
+            if term_id is None:
+                term_id = vocabulary[h] = len(self.term_hashes)
+                self.term_hashes.append(h)
+            ids.append(term_id)
+        if len(self.term_hashes) > len(self.df):
+            df = np.zeros(2 * len(self.term_hashes), dtype=np.int64)
+            df[: len(self.df)] = self.df
+            self.df = df
+        return np.array(ids, dtype=np.uint32)
+
+    def idf(self):
+        n = self.doc_count + 1
+        return (np.log(n / (1 + self.df)) + 1).astype(np.float32)
+
+    def vector(self, title, content, add_df=True):
+        counts = term_counts(title, content)
+        ids = self.term_ids(counts)
+        if add_df:
+            self.df[ids] += 1
+        if not len(ids):
+            size = self.terms_per_note
+            return np.zeros(size, dtype=np.uint32), np.zeros(size, dtype=np.float32)
+        values = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+        terms, weights = top_terms(
+            np.zeros(len(ids), dtype=np.int64), ids, values, self.idf(), self.terms_per_note
+        )
+        return terms[0], weights[0]
+
+    def _reserve(self, rows):
+        if rows <= len(self.ids):
+            return
+        capacity = max(rows, 2 * len(self.ids), 1024)
+        for name in ("ids", "terms", "weights"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[: self.count] = old[: self.count]
+            setattr(self, name, new)
+
+    def _put(self, note_id, terms, weights):
+        row = self.rows.get(note_id)
+        if row is None:
+            self._reserve(self.count + 1)
+            row = self.count
+            self.count += 1
+            self.rows[note_id] = row
+            self.ids[row] = note_id
+        self.terms[row] = terms
+        self.weights[row] = weights
+
+    def _drop(self, note_id):
+        row = self.rows.pop(note_id, None)
+        if row is None:
+            return
+        last = self.count - 1
+        if row != last:
+            # Move the last row into the hole to keep the arrays dense
+            moved = int(self.ids[last])
+            self.ids[row] = moved
+            self.terms[row] = self.terms[last]
+            self.weights[row] = self.weights[last]
+            self.rows[moved] = row
+        self.count = last
+
+    def _apply(self, event, note_id, new, old):
+        if event == "add" and note_id in self.rows:
+            # Queued while building, and the build already read it
+            return
+        if old is not None:
+            self.df[self.term_ids(term_counts(*old))] -= 1
+        if event == "delete":
+            self.doc_count -= 1
+            self._drop(note_id)
+            return
+        if event == "add":
+            self.doc_count += 1
+        self._put(note_id, *self.vector(*new))
+
+    def on_change(self, event, note_id, new, old):
+        # Database listener; changes made before the index is ready are
+        # replayed once it is
+        with self.lock:
+            if self.ready:
+                self._apply(event, note_id, new, old)
+                self.dirty = True
+            else:
+                self.pending.append((event, note_id, new, old))
+
+    def _iter_notes(self, conn, ids=None):
+        if ids is None:
+            yield from conn.execute("SELECT id, title, content FROM notes")
+            return
+        ids = list(ids)
+        for i in range(0, len(ids), FETCH_BATCH):
+            chunk = ids[i : i + FETCH_BATCH]
+            placeholders = ",".join("?" for _ in chunk)
+            yield from conn.execute(
+                f"SELECT id, title, content FROM notes WHERE id IN ({placeholders})", chunk
+            )
+
+    def build(self, db):
+        # One tokenising pass collects flat (term, count) arrays; document
+        # frequencies and the per-note vectors are then computed in bulk
+        synced_at = datetime.now()
+        with self.lock:
+            self.clear()
+        note_ids = array("q")
+        lengths = array("q")
+        flat_terms = array("I")
+        flat_counts = array("f")
+        for note_id, title, content in self._iter_notes(db.conn):
+            counts = term_counts(title, content)
+            note_ids.append(note_id)
+            lengths.append(len(counts))
+            flat_terms.extend(self.term_ids(counts))
+            flat_counts.extend(counts.values())
+        term_ids = np.frombuffer(flat_terms, dtype=np.uint32)
+        counts = np.frombuffer(flat_counts, dtype=np.float32)
+        lengths = np.frombuffer(lengths, dtype=np.int64)
+        self.df = np.bincount(term_ids, minlength=len(self.df)).astype(np.int64)
+        self.doc_count = len(note_ids)
+        idf = self.idf()
+
+        self._reserve(len(note_ids))
+        offsets = np.concatenate(([0], np.cumsum(lengths)))
+        for first in range(0, len(note_ids), BUILD_CHUNK):
+            last = min(first + BUILD_CHUNK, len(note_ids))
+            row = np.repeat(np.arange(last - first), lengths[first:last])
+            start, end = offsets[first], offsets[last]
+            terms, weights = top_terms(
+                row, term_ids[start:end], counts[start:end], idf, self.terms_per_note
+            )
+            # Trailing notes without a single word keep their all-zero rows
+            self.terms[first : first + len(terms)] = terms
+            self.weights[first : first + len(weights)] = weights
+        self.ids[: len(note_ids)] = np.frombuffer(note_ids, dtype=np.int64)
+        self.count = len(note_ids)
+        self.rows = {note_id: row for row, note_id in enumerate(note_ids)}
+        self.synced_at = synced_at
+        self.dirty = True
+
+    def sync(self, db):
+        # Catches up with changes made while no listener was attached (e.g.
+        # by cli.py). Old content is gone by now, so document frequencies
+        # of changed notes drift until the next rebuild.
+        synced_at = datetime.now()
+        conn = db.conn
+        ids = np.fromiter((row[0] for row in conn.execute("SELECT id FROM notes")), dtype=np.int64)
+        indexed = self.ids[: self.count]
+        removed = np.setdiff1d(indexed, ids).tolist()
+        changed = set(np.setdiff1d(ids, indexed).tolist())
+        for note_id in removed:
+            self._drop(note_id)
+        self.doc_count += len(changed) - len(removed)
+        if self.synced_at is not None:
+            changed.update(
+                row[0]
+                for row in conn.execute(
+                    "SELECT id FROM notes WHERE updated_at >= ?", (self.synced_at,)
+                )
+            )
+        for note_id, title, content in self._iter_notes(conn, sorted(changed)):
+            self._put(note_id, *self.vector(title, content, add_df=note_id not in self.rows))
+        self.synced_at = synced_at
+        self.dirty = self.dirty or bool(changed) or bool(removed)
+
+    def open(self, db, rebuild=False):
+        # Loads the saved index (or builds one), then replays the changes
+        # queued meanwhile. Runs fine on a background thread.
+        with self.lock:
+            self.ready = False
+        if rebuild or not self.load():
+            self.build(db)
+        else:
+            self.sync(db)
+        with self.lock:
+            for change in self.pending:
+                self._apply(*change)
+            self.pending = []
+            self.ready = True
+        if self.dirty:
+            self.save()
+
+    def load(self):
+        try:
+            with np.load(self.path) as data:
+                if data["terms"].shape[1] != self.terms_per_note:
+                    return False
+                count = len(data["ids"])
+                self.clear()
+                self._reserve(count)
+                self.ids[:count] = data["ids"]
+                self.terms[:count] = data["terms"]
+                self.weights[:count] = data["weights"]
+                self.count = count
+                self.term_hashes = array("I", data["term_hashes"].tobytes())
+                self.df = data["df"].copy()
+                self.doc_count = int(data["doc_count"])
+                self.synced_at = datetime.fromisoformat(str(data["synced_at"]))
+        except (OSError, KeyError, ValueError):
+            self.clear()
+            return False
+        self.vocabulary = {h: term_id for term_id, h in enumerate(self.term_hashes) if term_id}
+        self.rows = {int(note_id): row for row, note_id in enumerate(self.ids[: self.count])}
+        self.dirty = False
+        return True
+
+    def save(self):
+        with self.lock:
+            n = self.count
+            arrays = {
+                "ids": self.ids[:n].copy(),
+                "terms": self.terms[:n].copy(),
+                "weights": self.weights[:n].copy(),
+                "term_hashes": np.frombuffer(self.term_hashes, dtype=np.uint32).copy(),
+                "df": self.df[: len(self.term_hashes)].copy(),
+                "doc_count": np.int64(self.doc_count),
+                "synced_at": np.str_(self.synced_at.isoformat()),
+            }
+            self.dirty = False
+        # Write-then-rename so a crash never leaves a truncated index behind
+        temp = self.path + ".tmp"
+        with open(temp, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(temp, self.path)
+
+    def related(self, note_id, k=10):
+        # [(note_id, cosine similarity)] best first, excluding the note itself
+        with self.lock:
+            row = self.rows.get(note_id) if self.ready else None
+            if row is None or self.count < 2:
+                return []
+            n = self.count
+            # Dense query vector over the vocabulary; padding id 0 stays 0
+            query = np.zeros(len(self.term_hashes), dtype=np.float32)
+            query[self.terms[row]] = self.weights[row]
+            query[0] = 0
+            scores = np.einsum("ij,ij->i", self.weights[:n], query[self.terms[:n]])
+            scores[row] = 0
+            k = min(k, n - 1)
+            top = np.argpartition(scores, -k)[-k:]
+            top = top[np.argsort(-scores[top])]
+            return [
+                (int(self.ids[i]), float(scores[i])) for i in top if scores[i] > 0
+            ]
@@ -0,0 +1,56 @@
+import uuid
+from datetime import datetime
+
+# Journal entries read from the other vault per transaction
+BATCH_SIZE = 500
+
+
+def new_uid():
+    # Identifies a note across vaults; row ids differ from vault to vault
+    return uuid.uuid4().hex
+
+
+def _timestamp(value):
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return datetime.min
+
+
+def version(change):
+    # What last-writer-wins compares: the time of the change, then the id of
+    # the vault that made it, so equal times resolve the same way everywhere
+    return _timestamp(change["changed_at"]), change["origin"] or ""
+
+
+def pull(target, source, batch_size=BATCH_SIZE, progress=None):
+    # Applies what source changed since target last pulled from it, a batch
+    # per transaction. Returns (changes received, changes applied).
+    if target.vault_id == source.vault_id:
+        raise ValueError(
+            f"{source.db_path} is a copy of {target.db_path}; renew the vault id "
+            "of one of them first"
+        )
+    since = target.get_sync_position(source.vault_id)
+    received = applied = 0
+    while True:
+        changes = source.get_changes(since, batch_size)
+        if not changes:
+            break
+        since = changes[-1]["seq"]
+        # Changes target passed on come back once; they compare equal to
+        # what target has and are skipped
+        applied += target.apply_changes(source.vault_id, since, changes)
+        received += len(changes)
+        if progress:
+            progress(received, applied)
+    return received, applied
+
+
+def sync_vaults(local, remote, batch_size=BATCH_SIZE):
+    # Two-way sync of two open databases; only journal entries newer than
+    # each side's last sync are read. Returns the pull() results as
+    # (from remote, to remote).
+    return pull(local, remote, batch_size), pull(remote, local, batch_size)
@@ -0,0 +1,196 @@
+import errno
+import heapq
+import itertools
+import logging
+import os
+import sqlite3
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from db.database import Database
+
+logger = logging.getLogger(__name__)
+
+
+def vault_name(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def tag_rows(name, rows):
+    for row in rows:
+        yield {"vault": name, **dict(row)}
+
+
+def last_by_vault(rows, last=None):
+    # {vault name: last row seen from it} after rows, the after= of the next
+    # VaultSet page
+    last = dict(last or {})
+    for row in rows:
+        last[row["vault"]] = row
+    return last
+
+
+class Vault:
+    # One mounted database with its own worker thread, so the vault is only
+    # ever read through a single connection and vaults run side by side
+    # (SQLite releases the GIL while a statement runs)
+    def __init__(self, name, db):
+        self.name = name
+        self.db = db
+        self.connection = None
+        self.pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"vault-{name}")
+
+    def submit(self, method, *args, **kwargs):
+        return self.pool.submit(self.call, method, args, kwargs)
+
+    def call(self, method, args, kwargs):
+        self.connection = self.db.conn
+        return getattr(self.db, method)(*args, **kwargs)
+
+    def interrupt(self):
+        if self.connection is not None:
+            self.connection.interrupt()
+
+    def close(self):
+        self.pool.submit(self.db.release)
+        self.pool.shutdown(wait=True)
+
+
+class VaultSet:
+    # The primary vault plus any number of mounted vault files, queried in
+    # parallel and merged into single result lists. Rows come back as dicts
+    # with a "vault" key naming the vault they belong to.
+    def __init__(self, primary):
+        self.primary = vault_name(primary.db_path)
+        self.vaults = OrderedDict({self.primary: Vault(self.primary, primary)})
+
+    @property
+    def federated(self):
+        return len(self.vaults) > 1
+
+    def mount(self, path):
+        # Mounted vaults are read-only; the schema is upgraded once if the
+        # file is writable. Returns the vault's name.
+        if not os.path.exists(path):
+            raise FileNotFoundError(errno.ENOENT, "No such vault file", path)
+        name = base = vault_name(path)
+        for n in itertools.count(2):
+            if name not in self.vaults:
+                break
+            name = f"{base}-{n}"
+        if os.access(path, os.W_OK):
+            Database(path).close()
+        # Other processes may write to a mounted vault, so cached searches
+        # could go stale unnoticed
+        db = Database(path, read_only=True, search_cache_size=0)
+        self.vaults[name] = Vault(name, db)
+        return name
+
+    def unmount(self, name):
+        if name != self.primary:
+            self.vaults.pop(name).close()
+
+    def close(self):
+        # Only the primary's worker connection is closed; the primary
+        # database itself belongs to the caller
+        for vault in self.vaults.values():
+            vault.close()
+        self.vaults.clear()
+
+    def interrupt(self):
+        for vault in self.vaults.values():
+            vault.interrupt()
+
+    def _gather(self, method, *args, vault_kwargs=None, **kwargs):
+        # Runs method on every vault at once; [(vault name, result)] in mount
+        # order, skipping vaults whose query failed. vault_kwargs adds
+        # arguments for single vaults: {vault name: {name: value}}.
+        vault_kwargs = vault_kwargs or {}
+        futures = [
+            (name, vault.submit(method, *args, **kwargs, **vault_kwargs.get(name, {})))
+            for name, vault in self.vaults.items()
+        ]
+        results = []
+        for name, future in futures:
+            try:
+                results.append((name, future.result()))
+            except sqlite3.Error as e:
+                if str(e) != "interrupted":
+                    logger.warning("Vault %s: %s failed: %s", name, method, e)
+        return results
+
+    def _merge(self, results, key, limit):
+        streams = [tag_rows(name, rows) for name, rows in results]
+        return list(itertools.islice(heapq.merge(*streams, key=key), limit))
+
+    def _cursors(self, after, key):
+        # Each vault continues after the last of its rows the caller has seen
+        return {name: {"after": key(row)} for name, row in (after or {}).items()}
+
+    def search_notes(self, query, limit=None, after=None, **kwargs):
+        # Same arguments as Database.search_notes; BM25 scores of all vaults
+        # are merged into one ranking. after is last_by_vault() of the rows
+        # seen so far, so a page reads at most limit rows of every vault.
+        results = self._gather(
+            "search_notes",
+            query,
+            limit=limit,
+            vault_kwargs=self._cursors(after, lambda row: (row["score"], row["id"])),
+            **kwargs,
+        )
+        order = {name: i for i, name in enumerate(self.vaults)}
+        return self._merge(
+            results, lambda row: (row["score"], order[row["vault"]], row["id"]), limit
+        )
+
+    def filter_notes(self, limit=None, after=None, **facets):
+        # Same filters as Database.filter_notes, newest first across all
+        # vaults; after as for search_notes()
+        results = self._gather(
+            "filter_notes",
+            limit=limit,
+            vault_kwargs=self._cursors(after, lambda row: (row["created_at"], row["id"])),
+            **facets,
+        )
+        order = {name: i for i, name in enumerate(self.vaults)}
+        return self._merge(
+            results,
+            lambda row: (_Descending((row["created_at"] or "", row["id"])), order[row["vault"]]),
+            limit,
+        )
+
+    def _sum_counts(self, method, *args):
+        # [(value, count)] summed over all vaults, sorted by value
+        totals = {}
+        for _, counts in self._gather(method, *args):
+            for value, count in counts:
+                totals[value] = totals.get(value, 0) + count
+        return sorted(totals.items())
+
+    def get_tag_counts(self, names=None):
+        return self._sum_counts("get_tag_counts", names)
+
+    def get_category_counts(self):
+        return self._sum_counts("get_category_counts")
+
+    def get_month_counts(self):
+        return self._sum_counts("get_month_counts")
+
+    def get_note(self, name, note_id):
+        return self.vaults[name].submit("get_note_by_id", note_id).result()
+
+
+class _Descending:
+    # Sort key wrapper that reverses the order of the wrapped value
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return self.value > other.value
+
+    def __eq__(self, other):
+        # Tuple comparison checks equality first, so ties fall through to
+        # the next key
+        return self.value == other.value
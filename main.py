@@ -1,9 +1,11 @@
-import ttkbootstrap as ttk
+import sys
+
 from ui.main_window import MainWindow
 
 
 def main():
-    app = MainWindow()
+    # Any arguments are extra vault files to search alongside knowledge_base.db
+    app = MainWindow(vaults=sys.argv[1:])
     app.mainloop()
 
 
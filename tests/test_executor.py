@@ -0,0 +1,42 @@
+import time
+
+from db.database import Database
+from db.executor import DatabaseExecutor
+
+
+class FakeWidget:
+    # Collects after() timers so the test runs them by hand
+    def __init__(self):
+        self.timers = []
+
+    def after(self, ms, fn):
+        self.timers.append(fn)
+        return len(self.timers)
+
+
+def run_timers(widget, executor, timeout=5):
+    deadline = time.monotonic() + timeout
+    while widget.timers and time.monotonic() < deadline:
+        widget.timers.pop(0)()
+        if executor.pending:
+            time.sleep(0.01)
+
+
+def test_failing_callback_keeps_polling(tmp_path):
+    db = Database(str(tmp_path / "notes.db"))
+    widget = FakeWidget()
+    executor = DatabaseExecutor(db, widget)
+    delivered = []
+
+    def broken(result):
+        raise RuntimeError("duplicate iid")
+
+    executor.submit("get_all_notes", callback=broken)
+    executor.submit("add_note", "Title", "Body", "", "General", callback=delivered.append)
+    run_timers(widget, executor)
+    executor.shutdown()
+    db.close()
+
+    assert len(delivered) == 1
+    assert executor.pending == 0
+    assert executor.poll_id is None
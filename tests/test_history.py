@@ -0,0 +1,101 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from db.database import Database
+from db.history import COMPACT_TO, MAX_REVISIONS, SNAPSHOT_EVERY
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(str(tmp_path / "notes.db"))
+    yield db
+    db.close()
+
+
+def version(i):
+    # Versions that differ in inserted, changed and removed lines
+    lines = [f"line {n} of the note" for n in range(30)]
+    lines[i % 30] = f"changed in version {i} ✓"
+    del lines[(i * 7) % 30]
+    lines.insert(i % 11, f"inserted {i}")
+    return "\n".join(lines) + ("\n" if i % 2 else "")
+
+
+def write_versions(db, count):
+    # Returns (note id, {revision: the content that revision holds})
+    note_id = db.add_note("Note", version(0), "", "General")
+    for i in range(1, count):
+        db.update_note_fields(note_id, content=version(i))
+    revisions = {row["revision"]: row for row in db.get_revisions(note_id)}
+    return note_id, revisions
+
+
+def stored(db, note_id):
+    return {
+        row[0]: (row[1], row[2])
+        for row in db.conn.execute(
+            "SELECT revision, snapshot, data FROM note_revisions WHERE note_id = ?", (note_id,)
+        )
+    }
+
+
+def test_chain_across_snapshots_rebuilds_every_revision(db):
+    count = 3 * SNAPSHOT_EVERY + 5
+    note_id, revisions = write_versions(db, count)
+    assert len(revisions) == count - 1
+    snapshots = [revision for revision, (snapshot, _) in stored(db, note_id).items() if snapshot]
+    assert len(snapshots) >= 2
+    for revision in revisions:
+        # Revision n holds the content before the n-th edit
+        assert db.get_revision(note_id, revision)["content"] == version(revision - 1)
+
+
+def test_restore_brings_back_the_exact_text(db):
+    note_id, _ = write_versions(db, SNAPSHOT_EVERY + 4)
+    assert db.restore_revision(note_id, 3)
+    assert db.get_note_by_id(note_id)["content"] == version(2)
+    # The version the restore replaced is kept as the newest revision
+    newest = db.get_revisions(note_id)[0]["revision"]
+    assert db.get_revision(note_id, newest)["content"] == version(SNAPSHOT_EVERY + 3)
+    assert not db.restore_revision(note_id, 10_000)
+
+
+def test_compaction_drops_only_the_oldest_without_reencoding(db):
+    note_id, _ = write_versions(db, MAX_REVISIONS)
+    before = stored(db, note_id)
+    assert len(before) == MAX_REVISIONS - 1
+    # The save that passes MAX_REVISIONS trims to COMPACT_TO
+    db.update_note_fields(note_id, content=version(MAX_REVISIONS))
+    db.update_note_fields(note_id, content=version(MAX_REVISIONS + 1))
+    after = stored(db, note_id)
+    assert len(after) == COMPACT_TO
+    oldest = min(after)
+    assert all(after[revision] == before[revision] for revision in after if revision in before)
+    for revision in after:
+        assert db.get_revision(note_id, revision)["content"] == version(revision - 1)
+    assert db.get_revision(note_id, oldest - 1) is None
+
+
+def test_thinning_old_days_reencodes_the_survivors(db):
+    count = 2 * SNAPSHOT_EVERY + 3
+    note_id, revisions = write_versions(db, count)
+    # Spread the revisions over days, three per day, all older than a week
+    start = datetime(2024, 1, 1)
+    for revision in revisions:
+        saved_at = start + timedelta(days=revision // 3, minutes=revision)
+        db.conn.execute(
+            "UPDATE note_revisions SET saved_at = ? WHERE note_id = ? AND revision = ?",
+            (saved_at, note_id, revision),
+        )
+    db.conn.commit()
+    dropped = db.compact_history(note_id, now=start + timedelta(days=60))
+    kept = [row["revision"] for row in db.get_revisions(note_id)]
+    assert dropped == len(revisions) - len(kept)
+    # The last version of each day survives
+    days = {}
+    for revision in revisions:
+        days[revision // 3] = max(days.get(revision // 3, 0), revision)
+    assert sorted(kept) == sorted(days.values())
+    for revision in kept:
+        assert db.get_revision(note_id, revision)["content"] == version(revision - 1)
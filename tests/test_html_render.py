@@ -0,0 +1,47 @@
+import pytest
+
+from utils.html_render import render_html
+from utils.markdown_utils import markdown_to_html
+
+
+def render(markdown):
+    return render_html(markdown_to_html(markdown))
+
+
+def tagged(text, spans):
+    # A loose item's range also covers its paragraph's line break
+    return [text[start:end].rstrip("\n") for start, end in spans]
+
+
+@pytest.mark.parametrize(
+    "markdown",
+    ["- one\n- two", "- one\n\n- two"],
+    ids=["tight", "loose"],
+)
+def test_bullet_list(markdown):
+    text, ranges = render(markdown)
+    assert text == "• one\n• two"
+    assert tagged(text, ranges["list1"]) == ["• one", "• two"]
+
+
+@pytest.mark.parametrize(
+    "markdown",
+    ["1. one\n2. two", "1. one\n\n2. two"],
+    ids=["tight", "loose"],
+)
+def test_numbered_list(markdown):
+    assert render(markdown)[0] == "1. one\n2. two"
+
+
+def test_loose_item_with_two_paragraphs():
+    assert render("- one\n\n    more\n\n- two")[0] == "• one\nmore\n• two"
+
+
+def test_list_between_paragraphs():
+    assert render("Intro\n\n- one\n\n- two\n\nAfter")[0] == "Intro\n\n• one\n• two\n\nAfter"
+
+
+def test_nested_list():
+    text, ranges = render("- one\n    - nested\n- two")
+    assert text == "• one\n• nested\n• two"
+    assert tagged(text, ranges["list2"]) == ["• nested"]
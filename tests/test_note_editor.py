@@ -0,0 +1,133 @@
+from ui.note_editor import AUTOSAVE_IDLE_MS, NoteEditor
+
+
+class Var:
+    def __init__(self, value=""):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+    def set(self, value):
+        self.value = value
+
+
+class Text:
+    # Tk's Text.get() ends with a newline
+    def __init__(self, value=""):
+        self.value = value
+
+    def get(self, start, end):
+        return self.value + "\n"
+
+
+class Executor:
+    # Keeps submitted writes so the test decides when they complete
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, method, callback=None, errback=None):
+        self.submitted.append((method, callback))
+
+
+class Database:
+    def update_note_fields(self, note_id, **fields):
+        return {name: (None, value) for name, value in fields.items()}
+
+
+class EditorStub:
+    # NoteEditor's dirty tracking and autosave without any Tk widgets
+    form_fields = NoteEditor.form_fields
+    dirty_fields = NoteEditor.dirty_fields
+    schedule_autosave = NoteEditor.schedule_autosave
+    cancel_autosave = NoteEditor.cancel_autosave
+    flush_autosave = NoteEditor.flush_autosave
+    autosave = NoteEditor.autosave
+    autosave_done = NoteEditor.autosave_done
+    autosave_failed = NoteEditor.autosave_failed
+
+    def __init__(self):
+        self.executor = Executor()
+        self.saves = []
+        self.timers = {}
+        self.current_note_id = 1
+        self.loaded_content = "body"
+        self.autosave_after = None
+        self.autosaves_running = 0
+        self.autosave_again = False
+        self.autosave_var = Var(True)
+        self.title_var = Var("Title")
+        self.tags_var = Var("a,b")
+        self.category_var = Var("General")
+        self.content_text = Text("body")
+        self.saved_fields = self.form_fields()
+
+    def on_save(self, note_id, changes=None):
+        self.saves.append((note_id, changes))
+
+    def after(self, ms, fn):
+        assert ms == AUTOSAVE_IDLE_MS
+        timer = len(self.timers) + 1
+        self.timers[timer] = fn
+        return timer
+
+    def after_cancel(self, timer):
+        del self.timers[timer]
+
+    def fire(self):
+        (fn,) = self.timers.values()
+        self.timers.clear()
+        fn()
+
+    def complete(self):
+        method, callback = self.executor.submitted.pop(0)
+        callback(method(Database()))
+
+
+def test_unchanged_form_is_clean():
+    editor = EditorStub()
+    editor.title_var.set(" Title ")
+    assert editor.dirty_fields() == {}
+
+
+def test_dirty_fields_lists_only_edited_fields():
+    editor = EditorStub()
+    editor.tags_var.set("a,c")
+    editor.content_text.value = "new body"
+    # Content is tracked as a hash but sent as text
+    assert editor.dirty_fields() == {"tags": "a,c", "content": "new body"}
+
+
+def test_autosave_coalesces_edits():
+    editor = EditorStub()
+    for text in ("b", "bo", "bod!"):
+        editor.content_text.value = text
+        editor.schedule_autosave()
+    # Every edit restarted the one idle timer
+    assert len(editor.timers) == 1
+    editor.fire()
+    assert len(editor.executor.submitted) == 1
+
+    # Edits made while the write runs wait for it, then go out together
+    editor.title_var.set("Renamed")
+    editor.schedule_autosave()
+    editor.fire()
+    assert len(editor.executor.submitted) == 1
+    assert editor.autosave_again
+
+    editor.complete()
+    assert editor.saves == [(1, {"content": (None, "bod!")})]
+    editor.fire()
+    editor.complete()
+    assert editor.saves[-1] == (1, {"title": (None, "Renamed")})
+    assert editor.dirty_fields() == {}
+
+
+def test_flush_writes_pending_edits_at_once():
+    editor = EditorStub()
+    editor.category_var.set("Work")
+    editor.schedule_autosave()
+    editor.flush_autosave()
+    assert editor.timers == {}
+    editor.complete()
+    assert editor.saves == [(1, {"category": (None, "Work")})]
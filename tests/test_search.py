@@ -0,0 +1,49 @@
+import pytest
+
+from db.database import Database, match_query
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(str(tmp_path / "notes.db"))
+    yield db
+    db.close()
+
+
+def matches(db, query):
+    return [row["id"] for row in db.search_notes(query, limit=50)]
+
+
+@pytest.mark.parametrize("word", ["running", "meeting", "connecting", "stemmed"])
+def test_every_prefix_of_a_stemmed_word_matches(db, word):
+    note_id = db.add_note(f"Notes on {word}", f"All about {word} here", "", "General")
+    for end in range(1, len(word) + 1):
+        assert matches(db, match_query(word[:end])) == [note_id], word[:end]
+
+
+def test_whole_words_are_stemmed(db):
+    note_id = db.add_note("Weekly meetings", "", "", "General")
+    assert matches(db, match_query("meeting", prefix=False)) == [note_id]
+
+
+def test_prefix_index_follows_edits_and_deletes(db):
+    note_id = db.add_note("Running", "", "", "General")
+    db.update_note_fields(note_id, title="Walking")
+    assert matches(db, match_query("runn")) == []
+    assert matches(db, match_query("walki")) == [note_id]
+    db.delete_note(note_id)
+    assert matches(db, match_query("walki")) == []
+    assert db.check_search_index()
+
+
+def test_cached_results_see_writes_of_other_connections(db):
+    first = db.add_note("Garden plans", "", "", "General")
+    assert matches(db, "garden") == [first]
+    other = Database(db.db_path)
+    try:
+        second = other.add_note("Garden tools", "", "", "General")
+        assert sorted(matches(db, "garden")) == [first, second]
+        other.delete_note(first)
+        assert matches(db, "garden") == [second]
+    finally:
+        other.close()
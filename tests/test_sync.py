@@ -0,0 +1,134 @@
+from datetime import datetime
+
+import pytest
+
+from db.database import Database
+from db.sync import pull, sync_vaults
+
+EARLIER = datetime(2025, 3, 1, 9, 0)
+LATER = datetime(2025, 3, 1, 10, 0)
+
+
+@pytest.fixture
+def vaults(tmp_path):
+    local = Database(str(tmp_path / "local.db"))
+    remote = Database(str(tmp_path / "remote.db"))
+    yield local, remote
+    local.close()
+    remote.close()
+
+
+def uid(db, note_id):
+    return db.conn.execute("SELECT uid FROM notes WHERE id = ?", (note_id,)).fetchone()[0]
+
+
+def note_id(db, uid):
+    row = db.conn.execute("SELECT id FROM notes WHERE uid = ?", (uid,)).fetchone()
+    return row[0] if row else None
+
+
+def stamp(db, uid, when):
+    # Dates the last change of a note, so tests pick which edit is newer
+    with db.conn as conn:
+        conn.execute("UPDATE notes SET updated_at = ? WHERE uid = ?", (when, uid))
+        conn.execute("UPDATE note_journal SET changed_at = ? WHERE uid = ?", (when, uid))
+
+
+def edit(db, uid, content, when):
+    db.update_note_fields(note_id(db, uid), content=content)
+    stamp(db, uid, when)
+
+
+def delete(db, uid, when):
+    db.delete_note(note_id(db, uid))
+    stamp(db, uid, when)
+
+
+def notes(db):
+    return {
+        row[0]: tuple(row[1:])
+        for row in db.conn.execute("SELECT uid, title, content, tags, category FROM notes")
+    }
+
+
+def shared_note(local, remote):
+    # A note both vaults have, synced once
+    shared = uid(local, local.add_note("Shared", "first", "a, b", "Work"))
+    sync_vaults(local, remote)
+    return shared
+
+
+def test_round_trip_converges_and_skips_echoes(vaults):
+    local, remote = vaults
+    for i in range(3):
+        local.add_note(f"Local {i}", f"from local {i}", "x", "General")
+        remote.add_note(f"Remote {i}", f"from remote {i}", "y", "Ideas")
+    (received, applied), (sent, applied_there) = sync_vaults(local, remote)
+    assert (received, applied) == (3, 3)
+    # The remote's three changes come back once, along with local's own
+    assert (sent, applied_there) == (6, 3)
+    assert notes(local) == notes(remote)
+    assert len(notes(local)) == 6
+    # A second round trip has nothing new to apply on either side
+    (_, applied), (_, applied_there) = sync_vaults(local, remote)
+    assert applied == applied_there == 0
+    assert notes(local) == notes(remote)
+
+
+def test_changes_sent_back_to_their_origin_are_skipped(vaults):
+    local, remote = vaults
+    note = local.add_note("Note", "text", "", "General")
+    pull(remote, local)
+    revisions = local.get_revisions(note)
+    # The remote's journal now holds the local note; the local vault gets it
+    # back unchanged and applies nothing
+    received, applied = pull(local, remote)
+    assert (received, applied) == (1, 0)
+    assert local.get_revisions(note) == revisions
+    assert local.get_note_by_id(note)["content"] == "text"
+
+
+def test_newer_edit_wins_on_both_sides(vaults):
+    local, remote = vaults
+    shared = shared_note(local, remote)
+    edit(local, shared, "local edit", LATER)
+    edit(remote, shared, "remote edit", EARLIER)
+    sync_vaults(local, remote)
+    assert notes(local)[shared][1] == notes(remote)[shared][1] == "local edit"
+    # The losing edit is kept in the remote's history
+    remote_id = note_id(remote, shared)
+    newest = remote.get_revisions(remote_id)[0]["revision"]
+    assert remote.get_revision(remote_id, newest)["content"] == "remote edit"
+
+
+def test_equal_timestamps_resolve_the_same_way_everywhere(vaults):
+    local, remote = vaults
+    shared = shared_note(local, remote)
+    edit(local, shared, "local edit", LATER)
+    edit(remote, shared, "remote edit", LATER)
+    sync_vaults(local, remote)
+    # Ties go to the vault with the greater id
+    winner = "local edit" if local.vault_id > remote.vault_id else "remote edit"
+    assert notes(local)[shared][1] == notes(remote)[shared][1] == winner
+    (_, applied), (_, applied_there) = sync_vaults(local, remote)
+    assert applied == applied_there == 0
+
+
+def test_newer_delete_wins_over_an_edit(vaults):
+    local, remote = vaults
+    shared = shared_note(local, remote)
+    delete(local, shared, LATER)
+    edit(remote, shared, "remote edit", EARLIER)
+    sync_vaults(local, remote)
+    assert shared not in notes(local)
+    assert shared not in notes(remote)
+    assert notes(local) == notes(remote)
+
+
+def test_newer_edit_brings_a_deleted_note_back(vaults):
+    local, remote = vaults
+    shared = shared_note(local, remote)
+    delete(local, shared, EARLIER)
+    edit(remote, shared, "remote edit", LATER)
+    sync_vaults(local, remote)
+    assert notes(local)[shared] == notes(remote)[shared] == ("Shared", "remote edit", "a, b", "Work")
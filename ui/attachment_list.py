@@ -0,0 +1,131 @@
+import ttkbootstrap as ttk
+from ttkbootstrap.constants import *
+
+# Fits the Treeview row height set in static/styles/theme.py
+THUMBNAIL_SIZE = 24
+
+
+def format_size(size):
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+class AttachmentList(ttk.LabelFrame):
+    def __init__(self, parent, executor):
+        super().__init__(parent, text="Attachments", style="Card.TLabelframe")
+        self.executor = executor
+        self.note_id = None
+        # PhotoImages must stay referenced while the tree shows them
+        self.thumbnails = {}
+
+        self.attachment_tree = ttk.Treeview(
+            self,
+            columns=("name", "size"),
+            show="tree",
+            height=3,
+            style="Treeview",
+        )
+        self.attachment_tree.column("#0", width=THUMBNAIL_SIZE + 20, stretch=False)
+        self.attachment_tree.column("size", width=80, stretch=False, anchor=E)
+        self.attachment_tree.pack(side=LEFT, fill=BOTH, expand=True, padx=5, pady=5)
+
+        buttons = ttk.Frame(self)
+        buttons.pack(side=RIGHT, fill=Y, padx=5, pady=5)
+        self.attach_button = ttk.Button(
+            buttons, text="Attach...", style="secondary.TButton", command=self.attach
+        )
+        self.attach_button.pack(fill=X, pady=2)
+        ttk.Button(
+            buttons, text="Save As...", style="secondary.TButton", command=self.save_as
+        ).pack(fill=X, pady=2)
+        ttk.Button(
+            buttons, text="Remove", style="danger.TButton", command=self.remove
+        ).pack(fill=X, pady=2)
+        self.clear()
+
+    def show_for(self, note_id):
+        self.note_id = note_id
+        self.attach_button.configure(state="normal")
+        self.executor.submit(
+            "get_attachments", note_id, key="attachments", callback=self.show
+        )
+
+    def show(self, attachments):
+        self.attachment_tree.delete(*self.attachment_tree.get_children())
+        self.thumbnails.clear()
+        for row in attachments:
+            iid = str(row["id"])
+            self.attachment_tree.insert(
+                "", END, iid=iid, values=(row["name"], format_size(row["size"]))
+            )
+            # Thumbnails arrive one by one after the list is already shown
+            if (row["mime_type"] or "").startswith("image/"):
+                self.executor.submit(
+                    "get_thumbnail",
+                    row["id"],
+                    THUMBNAIL_SIZE,
+                    key=("attachments.thumbnail", iid),
+                    callback=lambda png, iid=iid: self.show_thumbnail(iid, png),
+                )
+
+    def show_thumbnail(self, iid, png):
+        if png is None or not self.attachment_tree.exists(iid):
+            return
+        # Tk decodes PNG itself, so Pillow is only needed on the worker
+        self.thumbnails[iid] = ttk.PhotoImage(data=png)
+        self.attachment_tree.item(iid, image=self.thumbnails[iid])
+
+    def clear(self):
+        self.note_id = None
+        self.executor.cancel("attachments")
+        self.attachment_tree.delete(*self.attachment_tree.get_children())
+        self.thumbnails.clear()
+        self.attach_button.configure(state="disabled")
+
+    def selected_id(self):
+        selected = self.attachment_tree.selection()
+        return int(selected[0]) if selected else None
+
+    def attach(self):
+        if self.note_id is None:
+            return
+        note_id = self.note_id
+        paths = ttk.filedialog.askopenfilenames(parent=self)
+        for path in paths:
+            self.executor.submit(
+                "add_attachment",
+                note_id,
+                path,
+                callback=lambda _: self.refresh(note_id),
+                errback=lambda error: ttk.messagebox.showerror("Attach failed", str(error)),
+            )
+
+    def save_as(self):
+        attachment_id = self.selected_id()
+        if attachment_id is None:
+            return
+        name = self.attachment_tree.set(str(attachment_id), "name")
+        filename = ttk.filedialog.asksaveasfilename(parent=self, initialfile=name)
+        if filename:
+            self.executor.submit(
+                "save_attachment",
+                attachment_id,
+                filename,
+                errback=lambda error: ttk.messagebox.showerror("Save failed", str(error)),
+            )
+
+    def remove(self):
+        attachment_id = self.selected_id()
+        if attachment_id is None:
+            return
+        note_id = self.note_id
+        self.executor.submit(
+            "delete_attachment", attachment_id, callback=lambda _: self.refresh(note_id)
+        )
+
+    def refresh(self, note_id):
+        if note_id == self.note_id:
+            self.show_for(note_id)
@@ -0,0 +1,63 @@
+import ttkbootstrap as ttk
+from ttkbootstrap.constants import *
+
+from db.database import month_range
+
+
+class FacetPanel(ttk.Frame):
+    # Category and month filters with their note counts. Several categories
+    # match any of them; several months span from the earliest to the latest.
+    def __init__(self, parent, on_change):
+        super().__init__(parent, style="Sidebar.TFrame")
+        self.on_change = on_change
+
+        self.category_list = ttk.Treeview(self, style="Treeview", show="tree", height=4)
+        self.category_list.pack(fill=X, padx=5, pady=5)
+        self.category_list.bind("<<TreeviewSelect>>", self.on_select)
+
+        self.month_list = ttk.Treeview(self, style="Treeview", show="tree", height=5)
+        self.month_list.pack(fill=X, padx=5, pady=5)
+        self.month_list.bind("<<TreeviewSelect>>", self.on_select)
+
+    def show(self, categories, months):
+        # (value, count) lists as the database returns them; months newest first
+        self.fill(self.category_list, "category", categories, lambda value: value or "(none)")
+        self.fill(
+            self.month_list,
+            "month",
+            [(month, count) for month, count in reversed(months) if month],
+            lambda value: value,
+        )
+
+    def fill(self, tree, facet, counts, label):
+        # Updates rows in place, so a recount keeps the selection
+        iids = [f"{facet}:{value}" for value, _ in counts]
+        stale = set(tree.get_children()) - set(iids)
+        if stale:
+            tree.delete(*stale)
+        for index, (iid, (value, count)) in enumerate(zip(iids, counts)):
+            text = f"{label(value)} ({count})"
+            if tree.exists(iid):
+                tree.item(iid, text=text)
+                tree.move(iid, "", index)
+            else:
+                tree.insert("", index, iid=iid, text=text)
+
+    def facets(self):
+        # The selection as Database.filter_notes() filters
+        facets = {}
+        categories = [iid.partition(":")[2] for iid in self.category_list.selection()]
+        if categories:
+            facets["categories"] = categories
+        months = sorted(iid.partition(":")[2] for iid in self.month_list.selection())
+        if months:
+            facets["since"] = month_range(months[0])[0]
+            facets["until"] = month_range(months[-1])[1]
+        return facets
+
+    def clear(self):
+        self.category_list.selection_set(())
+        self.month_list.selection_set(())
+
+    def on_select(self, event=None):
+        self.on_change()
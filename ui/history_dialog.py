@@ -0,0 +1,105 @@
+import ttkbootstrap as ttk
+from ttkbootstrap.constants import *
+
+
+class HistoryDialog(ttk.Toplevel):
+    # Earlier versions of one note; picking one shows it, Restore brings it back
+    def __init__(self, parent, executor, note_id, on_restore):
+        super().__init__(parent)
+        self.title("Note History")
+        self.geometry("800x500")
+        self.executor = executor
+        self.note_id = note_id
+        self.on_restore = on_restore
+
+        panes = ttk.PanedWindow(self, orient=HORIZONTAL)
+        panes.pack(fill=BOTH, expand=True, padx=5, pady=5)
+        self.revision_tree = ttk.Treeview(
+            panes,
+            columns=("revision", "saved_at", "title"),
+            show="headings",
+            style="Treeview",
+        )
+        self.revision_tree.heading("revision", text="#")
+        self.revision_tree.heading("saved_at", text="Saved")
+        self.revision_tree.heading("title", text="Title")
+        self.revision_tree.column("revision", width=40, stretch=False, anchor=E)
+        self.revision_tree.column("saved_at", width=150, stretch=False)
+        self.revision_tree.bind("<<TreeviewSelect>>", self.on_revision_select)
+        panes.add(self.revision_tree, weight=1)
+        self.content_text = ttk.Text(panes, wrap=WORD, font=("Helvetica", 11))
+        panes.add(self.content_text, weight=2)
+
+        buttons = ttk.Frame(self)
+        buttons.pack(fill=X, padx=5, pady=5)
+        self.restore_button = ttk.Button(
+            buttons,
+            text="Restore",
+            style="primary.TButton",
+            state="disabled",
+            command=self.restore,
+        )
+        self.restore_button.pack(side=RIGHT, padx=5)
+
+        self.protocol("WM_DELETE_WINDOW", self.close)
+        self.executor.submit(
+            "get_revisions", note_id, key="history.list", callback=self.show_revisions
+        )
+
+    def show_revisions(self, revisions):
+        for row in revisions:
+            self.revision_tree.insert(
+                "",
+                END,
+                iid=str(row["revision"]),
+                values=(row["revision"], str(row["saved_at"] or "")[:19], row["title"]),
+            )
+
+    def selected_revision(self):
+        selected = self.revision_tree.selection()
+        return int(selected[0]) if selected else None
+
+    def on_revision_select(self, event):
+        revision = self.selected_revision()
+        if revision is not None:
+            self.executor.submit(
+                "get_revision",
+                self.note_id,
+                revision,
+                key="history.load",
+                callback=self.show_revision,
+            )
+
+    def show_revision(self, revision):
+        self.content_text.delete("1.0", END)
+        if revision is not None:
+            self.content_text.insert("1.0", revision["content"])
+            self.restore_button.configure(state="normal")
+
+    def restore(self):
+        revision = self.selected_revision()
+        if revision is None:
+            return
+        self.restore_button.configure(state="disabled")
+        self.executor.submit(
+            "restore_revision",
+            self.note_id,
+            revision,
+            key="history.restore",
+            callback=lambda _: self.restored(),
+            errback=self.restore_failed,
+        )
+
+    def restored(self):
+        self.on_restore(self.note_id)
+        self.close()
+
+    def close(self):
+        # Results for a closed window are dropped; a restore still completes
+        for key in ("history.list", "history.load", "history.restore"):
+            self.executor.cancel(key)
+        self.destroy()
+
+    def restore_failed(self, error):
+        self.restore_button.configure(state="normal")
+        ttk.messagebox.showerror("Restore failed", str(error), parent=self)
@@ -1,29 +1,73 @@
+import bisect
+import logging
+import os
+import queue
+import sqlite3
+import threading
+from collections import OrderedDict
+
 import ttkbootstrap as ttk
 from ttkbootstrap.constants import *
-from PIL import Image, ImageTk
 from ui.note_list import NoteList
 from ui.note_editor import NoteEditor
-from db.database import Database
-from utils.export_utils import export_notes_to_json
+from ui.facet_panel import FacetPanel
+from ui.related_notes import RelatedNotes
+from db.database import Database, match_query, split_tags
+from db.executor import DatabaseExecutor
+from db.sync import sync_vaults
+from db.vaults import VaultSet
+from utils import instrumentation
 from static.styles.theme import apply_custom_styles
 
+logger = logging.getLogger(__name__)
+
+BG_IMAGE_PATH = "static/backgrounds/bg_image.jpg"
+# Full-quality rescale waits until the window stops changing size for this long
+RESIZE_SETTLE_MS = 150
+BG_CACHE_SIZE = 4
+# Search runs once typing pauses for this long
+SEARCH_DEBOUNCE_MS = 60
+
 
 class MainWindow(ttk.Window):
-    def __init__(self):
+    def __init__(self, vaults=()):
         super().__init__(themename="litera")
         self.title("Personal Knowledge Base")
         self.geometry("1200x700")
         self.minsize(800, 500)
         self.db = Database()
+        # Opt-in: PKB_INSTRUMENT=1 (slow-call threshold from PKB_SLOW_QUERY_MS)
+        self.stats = None
+        if os.environ.get("PKB_INSTRUMENT"):
+            self.stats = instrumentation.enable(
+                float(os.environ.get("PKB_SLOW_QUERY_MS", "50"))
+            )
+            instrumentation.instrument_database(self.db)
+            self.lag_monitor = instrumentation.EventLoopLagMonitor(self)
+            self.lag_monitor.start()
+        # All further database work happens on the executor's worker thread
+        self.executor = DatabaseExecutor(self.db, self)
+        # Extra vault files, searched (read-only) together with this one
+        self.vaults = VaultSet(self.db)
+        self.executor.interrupt_hooks.append(self.vaults.interrupt)
+        for path in vaults:
+            try:
+                self.vaults.mount(path)
+            except (OSError, sqlite3.Error) as e:
+                logger.warning("Could not mount vault %s: %s", path, e)
+        # Set by open_related_index, which starts once the widgets exist
+        self.related_index = None
+        self.db.release()
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
         apply_custom_styles()
 
-        # Load background image (fallback to solid color if image fails)
-        try:
-            bg_image = Image.open("static/backgrounds/bg_image.jpg")
-            bg_image = bg_image.resize((1200, 700), Image.Resampling.LANCZOS)
-            self.bg_photo = ImageTk.PhotoImage(bg_image)
-        except:
-            self.bg_photo = None
+        # The background is decoded once, after the window is up
+        self.bg_source = None
+        self.bg_cache = OrderedDict()
+        self.bg_size = (1200, 700)
+        self.bg_settle = None
+        self.bg_photo = None
+        self.after_idle(self.load_background)
 
         # Main container
         self.main_frame = ttk.Frame(self, style="Main.TFrame")
@@ -43,7 +87,11 @@ class MainWindow(ttk.Window):
             self.navbar, textvariable=self.search_var, style="primary.Entry"
         )
         self.search_entry.pack(side=LEFT, fill=X, expand=True, padx=5)
+        # Results follow typing; <Return> re-runs the search fully ranked
         self.search_entry.bind("<Return>", self.on_search)
+        self.search_entry.bind("<KeyRelease>", self.on_search_typed)
+        self.search_after = None
+        self.last_search = None
 
         self.export_btn = ttk.Button(
             self.navbar,
@@ -53,6 +101,31 @@ class MainWindow(ttk.Window):
         )
         self.export_btn.pack(side=RIGHT, padx=5)
 
+        self.vaults_btn = ttk.Button(
+            self.navbar,
+            text="Mount Vault...",
+            style="secondary.TButton",
+            command=self.mount_vaults,
+        )
+        self.vaults_btn.pack(side=RIGHT, padx=5)
+
+        self.sync_btn = ttk.Button(
+            self.navbar,
+            text="Sync...",
+            style="secondary.TButton",
+            command=self.sync_vault,
+        )
+        self.sync_btn.pack(side=RIGHT, padx=5)
+
+        if self.stats is not None:
+            self.stats_btn = ttk.Button(
+                self.navbar,
+                text="Stats",
+                style="info.TButton",
+                command=self.show_stats,
+            )
+            self.stats_btn.pack(side=RIGHT, padx=5)
+
         # Content area with sidebar and main content
         self.content_frame = ttk.Frame(self.main_frame, style="Main.TFrame")
         self.content_frame.pack(fill=BOTH, expand=True, padx=10, pady=5)
@@ -66,15 +139,38 @@ class MainWindow(ttk.Window):
 
         self.toggle_btn = ttk.Button(
             self.sidebar_frame,
-            text="Hide Tags",
+            text="Hide Filters",
             style="info.TButton",
             command=self.toggle_sidebar,
         )
         self.toggle_btn.pack(fill=X, padx=5, pady=5)
 
+        self.clear_filters_btn = ttk.Button(
+            self.sidebar_frame,
+            text="Clear Filters",
+            style="secondary.TButton",
+            command=self.clear_filters,
+        )
+        self.clear_filters_btn.pack(fill=X, padx=5, pady=(0, 5))
+
+        # Category and month filters; they combine with the tags below and
+        # with the search box
+        self.facet_panel = FacetPanel(self.sidebar_frame, self.on_filter_change)
+        self.facet_panel.pack(fill=X)
+        self.update_facets()
+
+        self.match_any_var = ttk.BooleanVar(value=False)
+        self.match_any_check = ttk.Checkbutton(
+            self.sidebar_frame,
+            text="Match any selected tag",
+            variable=self.match_any_var,
+            command=self.on_filter_change,
+        )
+        self.match_any_check.pack(fill=X, padx=5, pady=(0, 5))
+
         self.tag_list = ttk.Treeview(self.sidebar_frame, style="Treeview", show="tree")
         self.tag_list.pack(fill=BOTH, expand=True, padx=5, pady=5)
-        self.tag_list.bind("<<TreeviewSelect>>", self.on_tag_select)
+        self.tag_list.bind("<<TreeviewSelect>>", self.on_filter_change)
         self.update_tags()
 
         # Separator
@@ -90,72 +186,364 @@ class MainWindow(ttk.Window):
         # Note list
         self.note_list_frame = ttk.Frame(self.main_content, style="Main.TFrame")
         self.main_content.add(self.note_list_frame, weight=1)
-        self.note_list = NoteList(self.note_list_frame, self.db, self.on_note_select)
+        self.note_list = NoteList(
+            self.note_list_frame, self.executor, self.on_note_select, self.vaults
+        )
         self.note_list.pack(fill=BOTH, expand=True, padx=5, pady=5)
 
         # Note editor
         self.editor_frame = ttk.Frame(self.main_content, style="Main.TFrame")
         self.main_content.add(self.editor_frame, weight=2)
-        self.note_editor = NoteEditor(self.editor_frame, self.db, self.on_note_save)
+        self.note_editor = NoteEditor(self.editor_frame, self.executor, self.on_note_save)
         self.note_editor.pack(fill=BOTH, expand=True, padx=5, pady=5)
 
+        # Related notes
+        self.related_notes = RelatedNotes(
+            self.main_content, self.executor, self.related_index, self.on_note_select
+        )
+        self.main_content.add(self.related_notes, weight=1)
+        threading.Thread(target=self.open_related_index, daemon=True).start()
+
         # Bind resize for background
         self.bind("<Configure>", self.on_resize)
 
+    def load_background(self):
+        # Fallback to solid color if the image fails
+        from PIL import Image
+
+        try:
+            self.bg_source = Image.open(BG_IMAGE_PATH)
+            self.bg_source.load()
+        except OSError:
+            self.bg_source = None
+        self.bg_photo = self.scale_background(self.bg_size, final=True)
+
     def on_resize(self, event):
-        if self.bg_photo:
-            width, height = self.winfo_width(), self.winfo_height()
-            try:
-                bg_image = Image.open("static/backgrounds/bg_image.jpg")
-                bg_image = bg_image.resize((width, height), Image.Resampling.LANCZOS)
-                self.bg_photo = ImageTk.PhotoImage(bg_image)
-            except:
-                self.bg_photo = None
+        # <Configure> also fires for every child widget; only the window matters
+        if event.widget is not self or self.bg_source is None:
+            return
+        size = (event.width, event.height)
+        if size == self.bg_size:
+            return
+        self.bg_size = size
+        self.bg_photo = self.scale_background(size, final=False)
+        if self.bg_settle is not None:
+            self.after_cancel(self.bg_settle)
+        self.bg_settle = self.after(RESIZE_SETTLE_MS, self.finish_resize)
+
+    def finish_resize(self):
+        self.bg_settle = None
+        self.bg_photo = self.scale_background(self.bg_size, final=True)
+
+    def scale_background(self, size, final):
+        if self.bg_source is None:
+            return None
+        from PIL import Image, ImageTk
+
+        photo = self.bg_cache.get(size)
+        if photo is not None:
+            self.bg_cache.move_to_end(size)
+            return photo
+        if not final:
+            # Fast interim frame while the user is still dragging
+            return ImageTk.PhotoImage(
+                self.bg_source.resize(size, Image.Resampling.NEAREST)
+            )
+        photo = ImageTk.PhotoImage(
+            self.bg_source.resize(size, Image.Resampling.LANCZOS)
+        )
+        self.bg_cache[size] = photo
+        if len(self.bg_cache) > BG_CACHE_SIZE:
+            self.bg_cache.popitem(last=False)
+        return photo
 
     def toggle_sidebar(self):
         if self.sidebar_visible:
             self.sidebar_frame.pack_forget()
-            self.toggle_btn.configure(text="Show Tags")
+            self.toggle_btn.configure(text="Show Filters")
             self.sidebar_visible = False
         else:
             self.sidebar_frame.pack(side=LEFT, fill=Y, padx=(0, 5))
-            self.toggle_btn.configure(text="Hide Tags")
+            self.toggle_btn.configure(text="Hide Filters")
             self.sidebar_visible = True
 
+    def tag_counts(self, db, names=None):
+        # Runs on the worker; counts span all mounted vaults
+        source = self.vaults if self.vaults.federated else db
+        return source.get_tag_counts(names)
+
     def update_tags(self):
+        self.executor.submit(self.tag_counts, key="tags", callback=self.show_tags)
+
+    def show_tags(self, tag_counts):
         self.tag_list.delete(*self.tag_list.get_children())
-        tags = self.db.get_all_tags()
-        for tag in tags:
-            self.tag_list.insert("", END, text=tag, values=(tag,))
-
-    def on_tag_select(self, event):
-        selected = self.tag_list.selection()
-        if selected:
-            tag = self.tag_list.item(selected[0])["values"][0]
-            self.note_list.filter_by_tag(tag)
-        else:
-            self.note_list.load_notes()
+        for tag, count in tag_counts:
+            self.tag_list.insert("", END, iid=tag, text=f"{tag} ({count})")
+
+    def update_tag_counts(self, names):
+        # Recounts just these tags instead of reloading the sidebar
+        if names:
+            names = sorted(names)
+            self.executor.submit(
+                self.tag_counts,
+                names,
+                callback=lambda counts: self.show_tag_counts(names, dict(counts)),
+            )
+
+    def show_tag_counts(self, names, counts):
+        for tag in names:
+            if tag not in counts:
+                if self.tag_list.exists(tag):
+                    self.tag_list.delete(tag)
+            elif self.tag_list.exists(tag):
+                self.tag_list.item(tag, text=f"{tag} ({counts[tag]})")
+            else:
+                # The sidebar is sorted by name, as get_tag_counts returns it
+                index = bisect.bisect(self.tag_list.get_children(), tag)
+                self.tag_list.insert("", index, iid=tag, text=f"{tag} ({counts[tag]})")
+
+    def facet_counts(self, db):
+        # Runs on the worker; counts span all mounted vaults
+        source = self.vaults if self.vaults.federated else db
+        return source.get_category_counts(), source.get_month_counts()
+
+    def update_facets(self):
+        self.executor.submit(self.facet_counts, key="facets", callback=self.show_facets)
+
+    def show_facets(self, counts):
+        categories, months = counts
+        self.facet_panel.show(categories, months)
+        self.note_editor.set_categories(category for category, _ in categories)
+
+    def current_facets(self):
+        # Sidebar selections as Database.filter_notes() filters
+        facets = self.facet_panel.facets()
+        tags = list(self.tag_list.selection())
+        if tags:
+            facets["tags"] = tags
+            facets["match"] = "any" if self.match_any_var.get() else "all"
+        return facets
+
+    def on_filter_change(self, event=None):
+        self.last_search = match_query(self.search_var.get())
+        self.show_notes(self.last_search)
 
-    def on_search(self, event):
-        query = self.search_var.get().strip()
+    def clear_filters(self):
+        self.facet_panel.clear()
+        self.tag_list.selection_set(())
+
+    def show_notes(self, query, incremental=False):
+        facets = self.current_facets()
         if query:
-            self.note_list.search_notes(query)
+            self.note_list.search_notes(query, incremental=incremental, facets=facets)
+        elif facets:
+            self.note_list.filter_notes(facets)
         else:
             self.note_list.load_notes()
 
-    def on_note_select(self, note_id):
+    def on_search_typed(self, event):
+        if self.search_after is not None:
+            self.after_cancel(self.search_after)
+        self.search_after = self.after(SEARCH_DEBOUNCE_MS, self.on_search)
+
+    def on_search(self, event=None):
+        if self.search_after is not None:
+            self.after_cancel(self.search_after)
+            self.search_after = None
+        query = match_query(self.search_var.get())
+        # Arrow keys, Shift etc. also fire <KeyRelease>
+        if query == self.last_search and event is None:
+            return
+        self.last_search = query
+        self.show_notes(query, incremental=event is None)
+
+    def on_note_select(self, note_id, vault=None):
+        if vault is not None:
+            # Notes of mounted vaults open as unsaved copies of this vault
+            self.note_editor.load_copy(self.vaults, vault, note_id)
+            self.related_notes.clear()
+            return
         self.note_editor.load_note(note_id)
+        self.related_notes.show_for(note_id)
+
+    def mount_vaults(self):
+        paths = ttk.filedialog.askopenfilenames(
+            title="Mount vaults",
+            filetypes=[("SQLite databases", "*.db"), ("All files", "*.*")],
+        )
+        if paths:
+            # Mounting may upgrade the vault's schema, so it runs on the worker
+            self.executor.submit(
+                lambda db: [self.vaults.mount(path) for path in paths],
+                callback=lambda _: self.vaults_changed(),
+                errback=lambda error: ttk.messagebox.showerror("Mount failed", str(error)),
+            )
+
+    def sync_vault(self):
+        path = ttk.filedialog.askopenfilename(
+            title="Sync with vault",
+            filetypes=[("SQLite databases", "*.db"), ("All files", "*.*")],
+        )
+        if path:
+            self.sync_btn.configure(state="disabled", text="Syncing...")
+            self.executor.submit(
+                lambda db: self.run_sync(db, path),
+                callback=self.sync_done,
+                errback=self.sync_failed,
+            )
+
+    def run_sync(self, db, path):
+        # Runs on the worker, which then owns the other vault's connection
+        other = Database(path)
+        try:
+            return sync_vaults(db, other)
+        finally:
+            other.close()
+
+    def sync_done(self, result):
+        (received, applied), (sent, taken) = result
+        self.sync_btn.configure(state="normal", text="Sync...")
+        if applied:
+            self.update_tags()
+            self.update_facets()
+            self.on_filter_change()
+            # The open note may have changed; unsaved edits are left alone
+            note_id = self.note_editor.current_note_id
+            if note_id is not None and not self.note_editor.dirty_fields():
+                self.note_editor.load_note(note_id)
+        ttk.messagebox.showinfo(
+            "Sync",
+            f"Received {received} changes, applied {applied}.\nSent {sent} changes, applied {taken}.",
+        )
 
-    def on_note_save(self):
-        self.note_list.load_notes()
+    def sync_failed(self, error):
+        self.sync_btn.configure(state="normal", text="Sync...")
+        ttk.messagebox.showerror("Sync failed", str(error))
+
+    def vaults_changed(self):
         self.update_tags()
+        self.update_facets()
+        self.on_filter_change()
+
+    def on_note_save(self, note_id, deleted=False, changes=None):
+        # changes is {field: (old, new)} as written, or None if unknown; only
+        # what a write actually changed is refreshed
+        if deleted:
+            self.note_list.remove_note(note_id)
+            self.related_notes.clear()
+        elif changes is None or "title" in changes:
+            self.note_list.upsert_note(note_id)
+        if deleted or changes is None or "category" in changes:
+            # Category and month counts come from summary tables, so a
+            # full recount is cheap; a delete changes both
+            self.update_facets()
+        if changes is None:
+            self.update_tags()
+        elif "tags" in changes:
+            old, new = (set(split_tags(tags)) for tags in changes["tags"])
+            self.update_tag_counts(old ^ new)
+
+    def open_related_index(self):
+        # Imports (NumPy makes that slow), loads or builds the related-notes
+        # index off the Tk thread. It then follows every note change through
+        # the database listener; changes made before that are caught up by
+        # open().
+        from db.related import RelatedNotesIndex
+
+        index = RelatedNotesIndex(self.db.db_path)
+        self.db.add_listener(index.on_change)
+        self.related_index = self.related_notes.index = index
+        try:
+            index.open(self.db)
+        finally:
+            self.db.release()
+
+    def on_close(self):
+        # Queued writes, including a pending autosave, finish before shutdown
+        self.note_editor.flush_autosave()
+        self.executor.shutdown()
+        self.vaults.close()
+        index = self.related_index
+        if index is not None and index.ready and index.dirty:
+            index.save()
+        self.destroy()
 
     def new_note(self):
         self.note_editor.clear_form()
+        self.related_notes.clear()
+
+    def show_stats(self):
+        window = ttk.Toplevel(self)
+        window.title("Performance Stats")
+        window.geometry("900x500")
+        text = ttk.Text(window, wrap=NONE, font=("Courier", 10))
+        text.pack(fill=BOTH, expand=True, padx=5, pady=5)
+
+        def refresh():
+            text.delete("1.0", END)
+            text.insert("1.0", self.stats.format())
+
+        def save():
+            filename = ttk.filedialog.asksaveasfilename(
+                parent=window,
+                defaultextension=".json",
+                filetypes=[("JSON files", "*.json")],
+            )
+            if filename:
+                self.stats.dump(filename)
+
+        buttons = ttk.Frame(window)
+        buttons.pack(fill=X, padx=5, pady=5)
+        ttk.Button(buttons, text="Save to file", command=save).pack(side=RIGHT, padx=5)
+        ttk.Button(buttons, text="Refresh", command=refresh).pack(side=RIGHT, padx=5)
+        refresh()
 
     def export_notes(self):
         filename = ttk.filedialog.asksaveasfilename(
-            defaultextension=".json", filetypes=[("JSON files", "*.json")]
+            defaultextension=".json",
+            filetypes=[
+                ("JSON files", "*.json"),
+                ("JSON Lines files", "*.jsonl"),
+                ("Compressed JSON files", "*.json.gz"),
+                ("Compressed JSON Lines files", "*.jsonl.gz"),
+            ],
         )
-        if filename:
-            export_notes_to_json(self.db, filename)
+        if not filename:
+            return
+        fmt = "jsonl" if filename.endswith((".jsonl", ".jsonl.gz")) else "json"
+        self.export_btn.configure(state="disabled", text="Exporting...")
+        self.export_queue = queue.Queue()
+        threading.Thread(
+            target=self.run_export, args=(filename, fmt), daemon=True
+        ).start()
+        self.after(100, self.poll_export)
+
+    def run_export(self, filename, fmt):
+        # Runs off the Tk thread; reports back through export_queue
+        from utils.export_utils import export_notes
+
+        try:
+            count = export_notes(
+                self.db,
+                filename,
+                fmt,
+                progress=lambda done, total: self.export_queue.put(("progress", done, total)),
+            )
+            self.export_queue.put(("done", count, None))
+        except Exception as e:
+            self.export_queue.put(("error", e, None))
+        finally:
+            self.db.release()
+
+    def poll_export(self):
+        while not self.export_queue.empty():
+            kind, value, total = self.export_queue.get_nowait()
+            if kind == "progress":
+                percent = value * 100 // total if total else 100
+                self.export_btn.configure(text=f"Exporting {percent}%")
+                continue
+            self.export_btn.configure(state="normal", text="Export to JSON")
+            if kind == "error":
+                ttk.messagebox.showerror("Export failed", str(value))
+            return
+        self.after(100, self.poll_export)
@@ -1,5 +1,9 @@
 import ttkbootstrap as ttk
 from ttkbootstrap.constants import *
+from utils.html_render import IndexMapper, render_html
+
+# Index pairs passed to a single tag_add call
+TAG_BATCH = 500
 
 
 class MarkdownViewer(ttk.Frame):
@@ -19,40 +23,38 @@ class MarkdownViewer(ttk.Frame):
         # Configure basic styles
         self.text.tag_configure("bold", font=("Helvetica", 12, "bold"))
         self.text.tag_configure("italic", font=("Helvetica", 12, "italic"))
-        self.text.tag_configure("heading", font=("Helvetica", 16, "bold"))
+        for level, size in enumerate((20, 18, 16, 14, 13, 12), start=1):
+            self.text.tag_configure(
+                f"h{level}", font=("Helvetica", size, "bold"), spacing1=4, spacing3=4
+            )
+        self.text.tag_configure("code", font=("Courier", 11), background="#f1f3f5")
+        self.text.tag_configure(
+            "pre", font=("Courier", 11), background="#f1f3f5", lmargin1=10, lmargin2=10
+        )
+        self.text.tag_configure("link", foreground="#0d6efd", underline=True)
+        self.text.tag_configure(
+            "blockquote", foreground="#6c757d", lmargin1=20, lmargin2=20
+        )
+        for depth in range(1, 4):
+            self.text.tag_configure(
+                f"list{depth}", lmargin1=15 * depth, lmargin2=15 * depth + 12
+            )
 
     def update_content(self, html):
+        self.show_layout(*render_html(html))
+
+    def show_layout(self, text, ranges):
+        mapper = IndexMapper(text)
         self.text.configure(state="normal")
         self.text.delete("1.0", END)
-        current_tag = None
-        buffer = ""
-        i = 0
-        while i < len(html):
-            if html[i] == "<":
-                if buffer:
-                    self.text.insert(END, buffer)
-                    buffer = ""
-                i += 1
-                if html[i : i + 2] == "b>":
-                    current_tag = "bold"
-                    i += 2
-                elif html[i : i + 2] == "i>":
-                    current_tag = "italic"
-                    i += 2
-                elif html[i : i + 3] == "h1>":
-                    current_tag = "heading"
-                    i += 3
-                elif html[i : i + 3] in ["</b>", "</i>", "</h1>"]:
-                    current_tag = None
-                    i += 3
-            else:
-                buffer += html[i]
-                i += 1
-            if buffer and current_tag:
-                self.text.insert(END, buffer, current_tag)
-                buffer = ""
-        if buffer:
-            self.text.insert(END, buffer)
+        self.text.insert("1.0", text)
+        for tag, spans in ranges.items():
+            for i in range(0, len(spans), TAG_BATCH):
+                indexes = []
+                for start, end in spans[i : i + TAG_BATCH]:
+                    indexes.append(mapper.index(start))
+                    indexes.append(mapper.index(end))
+                self.text.tag_add(tag, *indexes)
         self.text.configure(state="disabled")
 
     def clear(self):
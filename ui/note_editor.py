@@ -1,15 +1,36 @@
+import time
+
 import ttkbootstrap as ttk
 from ttkbootstrap.constants import *
+from ui.attachment_list import AttachmentList
+from ui.history_dialog import HistoryDialog
 from ui.markdown_viewer import MarkdownViewer
+from ui.preview_pipeline import PreviewPipeline
+from utils.html_render import render_html
+from utils.instrumentation import record, timed
 from utils.markdown_utils import markdown_to_html
+from utils.render_cache import RenderCache, content_hash
+
+# Idle time after the last edit before autosave writes the note
+AUTOSAVE_IDLE_MS = 1500
+# Offered in the category box next to the categories the vault already uses
+DEFAULT_CATEGORIES = ("General", "Work", "Personal", "Study")
 
 
 class NoteEditor(ttk.Frame):
-    def __init__(self, parent, db, on_save):
+    def __init__(self, parent, executor, on_save):
         super().__init__(parent, style="Main.TFrame")
-        self.db = db
+        self.executor = executor
         self.on_save = on_save
         self.current_note_id = None
+        self.loaded_content = None
+        # Field values as last loaded or saved (content as a hash), for dirty tracking
+        self.saved_fields = {}
+        self.autosave_after = None
+        self.autosaves_running = 0
+        self.autosave_again = False
+        # The preview worker reads and fills the render cache on its own connection
+        self.render_cache = RenderCache(markdown_to_html, db=executor.db)
 
         # Form frame
         self.form_frame = ttk.LabelFrame(
@@ -37,12 +58,16 @@ class NoteEditor(ttk.Frame):
         self.category_combo = ttk.Combobox(
             self.form_frame,
             textvariable=self.category_var,
-            values=["General", "Work", "Personal", "Study"],
+            values=list(DEFAULT_CATEGORIES),
             style="primary.TCombobox",
         )
         self.category_combo.pack(fill=X, padx=5, pady=5)
         self.category_combo.set("General")
 
+        # Attachments (saved notes only)
+        self.attachments = AttachmentList(self, executor)
+        self.attachments.pack(fill=X, padx=5, pady=5)
+
         # Content and preview
         self.content_frame = ttk.PanedWindow(
             self, orient=HORIZONTAL, style="Main.Panedwindow"
@@ -65,7 +90,7 @@ class NoteEditor(ttk.Frame):
             insertbackground="#212529",
         )
         self.content_text.pack(fill=BOTH, expand=True, padx=5, pady=(0, 5))
-        self.content_text.bind("<KeyRelease>", self.update_preview)
+        self.content_text.bind("<KeyRelease>", self.on_content_edit)
 
         # Preview
         self.preview_pane = ttk.LabelFrame(
@@ -74,6 +99,12 @@ class NoteEditor(ttk.Frame):
         self.content_frame.add(self.preview_pane, weight=1)
         self.preview = MarkdownViewer(self.preview_pane)
         self.preview.pack(fill=BOTH, expand=True, padx=5, pady=5)
+        self.preview_pipeline = PreviewPipeline(
+            self,
+            get_text=self.preview_source,
+            render=self.render_preview,
+            paint=self.paint_preview,
+        )
 
         # Buttons
         self.button_frame = ttk.Frame(self)
@@ -99,49 +130,261 @@ class NoteEditor(ttk.Frame):
             command=self.clear_form,
         )
         self.clear_button.pack(side=RIGHT, padx=5)
+        self.history_button = ttk.Button(
+            self.button_frame,
+            text="History",
+            style="secondary.TButton",
+            command=self.show_history,
+        )
+        self.history_button.pack(side=LEFT, padx=5)
+        self.autosave_var = ttk.BooleanVar(value=False)
+        self.autosave_check = ttk.Checkbutton(
+            self.button_frame,
+            text="Autosave",
+            variable=self.autosave_var,
+            style="secondary.TCheckbutton",
+            command=self.schedule_autosave,
+        )
+        self.autosave_check.pack(side=LEFT, padx=5)
+        for var in (self.title_var, self.tags_var, self.category_var):
+            var.trace_add("write", lambda *_: self.schedule_autosave())
+
+    def set_categories(self, categories):
+        names = set(DEFAULT_CATEGORIES) | {name for name in categories if name}
+        self.category_combo.configure(values=sorted(names))
 
     def load_note(self, note_id):
-        note = self.db.get_note_by_id(note_id)
-        if note:
-            self.current_note_id = note_id
-            self.title_var.set(note["title"])
-            self.tags_var.set(note["tags"] or "")
-            self.category_var.set(note["category"] or "General")
-            self.content_text.delete("1.0", END)
-            self.content_text.insert("1.0", note["content"] or "")
-            self.update_preview()
+        # Pending autosave edits belong to the note being left
+        self.flush_autosave()
+        # Selecting another note before this one arrives supersedes it
+        requested = time.perf_counter()
+        self.executor.submit(
+            "get_note_by_id",
+            note_id,
+            key="note_editor.load",
+            callback=lambda note: self.show_note(note_id, note, requested),
+        )
+
+    def load_copy(self, vaults, vault, note_id):
+        # A note of another (read-only) vault; saving adds it to this vault
+        self.flush_autosave()
+        requested = time.perf_counter()
+        self.executor.submit(
+            lambda db: vaults.get_note(vault, note_id),
+            key="note_editor.load",
+            callback=lambda note: self.show_note(None, note, requested, vault),
+        )
+
+    def show_note(self, note_id, note, requested, vault=None):
+        if not note:
+            return
+        self.form_frame.configure(
+            text=f"Note Details (copy from {vault})" if vault else "Note Details"
+        )
+        self.current_note_id = note_id
+        self.loaded_content = note["content"] or ""
+        self.title_var.set(note["title"])
+        self.tags_var.set(note["tags"] or "")
+        self.category_var.set(note["category"] or "General")
+        self.content_text.delete("1.0", END)
+        self.content_text.insert("1.0", note["content"] or "")
+        self.saved_fields = self.form_fields()
+        self.cancel_autosave()
+        if note_id:
+            self.attachments.show_for(note_id)
+        else:
+            self.attachments.clear()
+        self.update_preview(delay_ms=0)
+        record("ui.note_editor.load_note", (time.perf_counter() - requested) * 1000)
+
+    def form_fields(self):
+        # The content is compared by hash so the saved copy is not kept twice
+        return {
+            "title": self.title_var.get().strip(),
+            "content": content_hash(self.content_text.get("1.0", END).strip()),
+            "tags": self.tags_var.get().strip(),
+            "category": self.category_var.get().strip(),
+        }
+
+    def dirty_fields(self):
+        # {field: value} for each field edited since the note was loaded or saved
+        current = self.form_fields()
+        dirty = {
+            name: value
+            for name, value in current.items()
+            if value != self.saved_fields.get(name)
+        }
+        if "content" in dirty:
+            dirty["content"] = self.content_text.get("1.0", END).strip()
+        return dirty
 
     def save_note(self):
         title = self.title_var.get().strip()
         if not title:
             ttk.messagebox.showerror("Error", "Title is required")
             return
-        content = self.content_text.get("1.0", END).strip()
-        tags = self.tags_var.get().strip()
-        category = self.category_var.get().strip()
-        if self.current_note_id:
-            self.db.update_note(self.current_note_id, title, content, tags, category)
+        self.cancel_autosave()
+        note_id = self.current_note_id
+        if note_id:
+            fields = self.dirty_fields()
+            if not fields:
+                # Nothing to write or refresh
+                self.clear_form()
+                return
         else:
-            self.current_note_id = self.db.add_note(title, content, tags, category)
-        self.on_save()
-        self.clear_form()
+            fields = {
+                "title": title,
+                "content": self.content_text.get("1.0", END).strip(),
+                "tags": self.tags_var.get().strip(),
+                "category": self.category_var.get().strip(),
+            }
+
+        def write(db):
+            if note_id:
+                return note_id, db.update_note_fields(note_id, **fields)
+            new_id = db.add_note(**fields)
+            return new_id, {name: (None, value) for name, value in fields.items()}
+
+        self.set_busy(True)
+        self.executor.submit(
+            write,
+            callback=lambda result: self.write_done(note_id, *result),
+            errback=lambda error: self.write_failed("Save failed", error),
+        )
+
+    def on_content_edit(self, event=None):
+        self.update_preview()
+        self.schedule_autosave()
+
+    def schedule_autosave(self):
+        # Every edit restarts the idle timer, so a burst of typing is one write
+        if self.autosave_after is not None:
+            self.after_cancel(self.autosave_after)
+            self.autosave_after = None
+        if self.autosave_var.get() and self.current_note_id:
+            self.autosave_after = self.after(AUTOSAVE_IDLE_MS, self.autosave)
+
+    def cancel_autosave(self):
+        if self.autosave_after is not None:
+            self.after_cancel(self.autosave_after)
+            self.autosave_after = None
+        self.autosave_again = False
+
+    def flush_autosave(self):
+        # Writes pending edits now, e.g. before the form switches notes
+        if self.autosave_after is not None or self.autosave_again:
+            self.cancel_autosave()
+            self.autosave(force=True)
+
+    def autosave(self, force=False):
+        self.autosave_after = None
+        if self.autosaves_running and not force:
+            # One write at a time; edits made meanwhile go in the next one
+            self.autosave_again = True
+            return
+        note_id = self.current_note_id
+        fields = self.dirty_fields()
+        if not note_id or not fields or not fields.get("title", True):
+            return
+        self.autosaves_running += 1
+        self.executor.submit(
+            lambda db: db.update_note_fields(note_id, **fields),
+            callback=lambda changes: self.autosave_done(note_id, changes),
+            errback=self.autosave_failed,
+        )
+        # The baseline moves now, so edits made during the write stay dirty
+        self.saved_fields = self.form_fields()
+        if "content" in fields:
+            self.loaded_content = fields["content"]
+
+    def autosave_done(self, note_id, changes):
+        self.autosaves_running -= 1
+        self.on_save(note_id, changes=changes)
+        if self.autosave_again:
+            self.autosave_again = False
+            self.schedule_autosave()
+
+    def autosave_failed(self, error):
+        self.autosaves_running -= 1
+        # Saving again will retry everything that was not written
+        self.saved_fields = {}
+        ttk.messagebox.showerror("Autosave failed", str(error))
 
     def delete_note(self):
         if self.current_note_id:
             if ttk.messagebox.askyesno("Confirm", "Delete this note?"):
-                self.db.delete_note(self.current_note_id)
-                self.on_save()
-                self.clear_form()
+                note_id = self.current_note_id
+                # Only the tags the note had need recounting
+                changes = {"tags": (self.saved_fields.get("tags", ""), "")}
+                self.cancel_autosave()
+                self.set_busy(True)
+                self.executor.submit(
+                    "delete_note",
+                    note_id,
+                    callback=lambda _: self.write_done(
+                        note_id, note_id, changes, deleted=True
+                    ),
+                    errback=lambda error: self.write_failed("Delete failed", error),
+                )
+
+    def show_history(self):
+        if self.current_note_id:
+            # Pending autosave edits become the newest version first
+            self.flush_autosave()
+            HistoryDialog(self, self.executor, self.current_note_id, self.restored)
+
+    def restored(self, note_id):
+        # A restore can touch every field, so the window refreshes everything
+        self.on_save(note_id)
+        if self.current_note_id == note_id:
+            # The restored version replaces the form; unsaved edits must not
+            # be autosaved over it
+            self.cancel_autosave()
+            self.load_note(note_id)
+
+    def write_done(self, form_note_id, note_id, changes, deleted=False):
+        self.set_busy(False)
+        self.on_save(note_id, deleted=deleted, changes=changes)
+        # Leave the form alone if another note was opened meanwhile
+        if self.current_note_id == form_note_id:
+            self.clear_form()
+
+    def write_failed(self, title, error):
+        self.set_busy(False)
+        ttk.messagebox.showerror(title, str(error))
+
+    def set_busy(self, busy):
+        state = "disabled" if busy else "normal"
+        self.save_button.configure(state=state)
+        self.delete_button.configure(state=state)
 
     def clear_form(self):
+        self.flush_autosave()
         self.current_note_id = None
+        self.loaded_content = None
+        self.saved_fields = {}
+        self.form_frame.configure(text="Note Details")
+        self.attachments.clear()
         self.title_var.set("")
         self.tags_var.set("")
         self.category_var.set("General")
         self.content_text.delete("1.0", END)
+        self.preview_pipeline.cancel()
         self.preview.clear()
 
-    def update_preview(self, event=None):
+    def preview_source(self):
         content = self.content_text.get("1.0", END).strip()
-        html = markdown_to_html(content)
-        self.preview.update_content(html)
+        # Renders of saved content are also kept in the database
+        note_id = self.current_note_id if content == self.loaded_content else None
+        return note_id, content
+
+    def render_preview(self, source):
+        note_id, content = source
+        return render_html(self.render_cache.render(content, note_id))
+
+    def paint_preview(self, layout):
+        with timed("ui.preview.paint", len(layout[0])):
+            self.preview.show_layout(*layout)
+
+    def update_preview(self, event=None, delay_ms=None):
+        self.preview_pipeline.schedule(delay_ms)
@@ -1,46 +1,243 @@
+import logging
+import time
+
 import ttkbootstrap as ttk
 from ttkbootstrap.constants import *
+from db.vaults import last_by_vault
+from utils.instrumentation import record, timed
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 200
+# Search pages carry excerpts, which cost far more per row than the other views
+SEARCH_PAGE_SIZE = 50
+# While typing, rank only this many of the newest matches
+SEARCH_RANK_WINDOW = 1000
+
+
+def sort_key(note):
+    # Position in the newest-first note list
+    return (note["created_at"] or "", note["id"])
 
 
 class NoteList(ttk.Frame):
-    def __init__(self, parent, db, on_select):
+    def __init__(self, parent, executor, on_select, vaults=None):
         super().__init__(parent, style="Main.TFrame")
-        self.db = db
+        self.executor = executor
         self.on_select = on_select
+        # Searches and tag filters span every mounted vault (db.vaults.VaultSet)
+        self.vaults = vaults
+
+        # Rows are fetched a page at a time as the list scrolls, on the
+        # database worker; a new view supersedes any page still in flight
+        self.fetch_page = None
+        self.refresh_start = None
+        self.last_row = None
+        # (created_at, id) of the top row in "all" mode; only notes newer
+        # than it are upserted above it
+        self.newest = None
+        # Last row seen from each vault, where federated views continue
+        self.seen = {}
+        self.row_count = 0
+        self.exhausted = True
+        self.loading = False
+        self.mode = "all"
+        self.page_size = PAGE_SIZE
 
         # Note list
+        self.scrollbar = ttk.Scrollbar(self, orient=VERTICAL)
+        self.scrollbar.pack(side=RIGHT, fill=Y, pady=5)
         self.note_tree = ttk.Treeview(
-            self, columns=("id", "title"), show="headings", style="Treeview"
+            self,
+            columns=("id", "title", "excerpt", "vault"),
+            displaycolumns=("id", "title"),
+            show="headings",
+            style="Treeview",
+            yscrollcommand=self.on_scroll,
         )
+        self.scrollbar.configure(command=self.note_tree.yview)
         self.note_tree.heading("title", text="Notes")
+        self.note_tree.heading("excerpt", text="Match")
+        self.note_tree.heading("vault", text="Vault")
         self.note_tree.column("id", width=0, stretch=False)
         self.note_tree.column("title", width=200)
+        self.note_tree.column("excerpt", width=300)
+        self.note_tree.column("vault", width=100, stretch=False)
         self.note_tree.pack(fill=BOTH, expand=True, padx=5, pady=5)
         self.note_tree.bind("<<TreeviewSelect>>", self.on_note_select)
 
         self.load_notes()
 
-    def load_notes(self):
+    def reset(self, mode, fetch_page, displaycolumns=("id", "title"), page_size=PAGE_SIZE):
+        self.mode = mode
+        self.fetch_page = fetch_page
+        self.page_size = page_size
+        self.last_row = None
+        self.newest = None
+        self.seen = {}
+        self.row_count = 0
+        self.exhausted = False
+        self.loading = False
+        self.refresh_start = time.perf_counter()
+        self.note_tree.configure(displaycolumns=displaycolumns)
         self.note_tree.delete(*self.note_tree.get_children())
-        notes = self.db.get_all_notes()
-        for note in notes:
-            self.note_tree.insert("", END, values=(note["id"], note["title"]))
+        self.load_page()
 
-    def filter_by_tag(self, tag):
-        self.note_tree.delete(*self.note_tree.get_children())
-        notes = self.db.get_all_notes()
-        for note in notes:
-            if note["tags"] and tag in [t.strip() for t in note["tags"].split(",")]:
-                self.note_tree.insert("", END, values=(note["id"], note["title"]))
+    def load_page(self):
+        if self.exhausted or self.loading:
+            return
+        self.loading = True
+        self.executor.submit(
+            self.fetch_page,
+            self.last_row,
+            self.seen,
+            key="note_list",
+            callback=self.show_page,
+            errback=self.page_failed,
+            interrupt=True,
+        )
 
-    def search_notes(self, query):
-        self.note_tree.delete(*self.note_tree.get_children())
-        notes = self.db.search_notes(query)
-        for note in notes:
-            self.note_tree.insert("", END, values=(note["id"], note["title"]))
+    def show_page(self, notes):
+        self.loading = False
+        with timed("ui.note_list.insert_rows", len(notes)):
+            for note in notes:
+                self.insert_row(note)
+        if notes and self.row_count == 0 and self.mode == "all":
+            self.newest = sort_key(notes[0])
+        self.row_count += len(notes)
+        if notes:
+            self.last_row = notes[-1]
+            if "vault" in notes[-1].keys():
+                self.seen = last_by_vault(notes, self.seen)
+        self.exhausted = len(notes) < self.page_size
+        if self.refresh_start is not None:
+            # Time from the view change until its first page is on screen
+            record(
+                f"ui.note_list.refresh.{self.mode}",
+                (time.perf_counter() - self.refresh_start) * 1000,
+            )
+            self.refresh_start = None
+
+    def page_failed(self, error):
+        # e.g. a locked database; the view stays as far as it got
+        logger.warning("Loading %s notes failed: %s", self.mode, error)
+        self.loading = False
+        self.exhausted = True
+        self.refresh_start = None
+
+    def insert_row(self, note, index=END):
+        keys = note.keys()
+        title = note["title_highlight"] if "title_highlight" in keys else note["title"]
+        excerpt = note["snippet"] if "snippet" in keys else ""
+        vault = note["vault"] if "vault" in keys else ""
+        # Notes of the primary vault keep their plain id as iid, so
+        # upsert_note and remove_note find them in any view
+        if self.vaults is not None and vault == self.vaults.primary:
+            vault = ""
+        iid = f"{vault}:{note['id']}" if vault else str(note["id"])
+        # A note upserted or moved by a write between pages can come again
+        if self.note_tree.exists(iid):
+            return
+        self.note_tree.insert("", index, iid=iid, values=(note["id"], title, excerpt, vault))
+
+    def federated(self):
+        return self.vaults is not None and self.vaults.federated
+
+    def columns(self, *columns):
+        return columns + ("vault",) if self.federated() else columns
+
+    def on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        if float(last) > 0.9 and not self.exhausted:
+            self.after_idle(self.load_page)
+
+    def load_notes(self):
+        self.reset(
+            "all",
+            lambda db, last, seen: db.get_note_page(
+                after=(last["created_at"], last["id"]) if last else None,
+                limit=PAGE_SIZE,
+            ),
+        )
+
+    def filter_notes(self, facets):
+        # facets: filters for db.database.Database.filter_notes(), newest first
+        if self.federated():
+            vaults = self.vaults
+            self.reset(
+                "filter",
+                lambda db, last, seen: vaults.filter_notes(
+                    limit=PAGE_SIZE, after=seen, **facets
+                ),
+                displaycolumns=self.columns("id", "title"),
+            )
+            return
+        self.reset(
+            "filter",
+            lambda db, last, seen: db.filter_notes(
+                after=(last["created_at"], last["id"]) if last else None,
+                limit=PAGE_SIZE,
+                **facets,
+            ),
+        )
+
+    def search_notes(self, query, incremental=False, facets=None):
+        # query is an FTS5 expression, see db.database.match_query(); an
+        # incremental search bounds ranking so it keeps up with typing.
+        # facets narrows the matches like filter_notes().
+        search = {
+            "limit": SEARCH_PAGE_SIZE,
+            "weights": (10.0, 1.0),
+            "excerpts": True,
+            "rank_window": SEARCH_RANK_WINDOW if incremental else None,
+            "facets": facets,
+        }
+        if self.federated():
+            # Every page is ranked across all mounted vaults
+            vaults = self.vaults
+            fetch_page = lambda db, last, seen: vaults.search_notes(
+                query, after=seen, **search
+            )
+        else:
+            fetch_page = lambda db, last, seen: db.search_notes(
+                query, after=(last["score"], last["id"]) if last else None, **search
+            )
+        self.reset(
+            "search",
+            fetch_page,
+            displaycolumns=self.columns("id", "title", "excerpt"),
+            page_size=SEARCH_PAGE_SIZE,
+        )
+
+    def upsert_note(self, note_id):
+        self.executor.submit(
+            "get_note_summary",
+            note_id,
+            key=("note_list.upsert", note_id),
+            callback=lambda note: self.apply_upsert(note_id, note),
+        )
+
+    def apply_upsert(self, note_id, note):
+        if note is None:
+            self.remove_note(note_id)
+        elif self.note_tree.exists(str(note_id)):
+            self.note_tree.set(str(note_id), "title", note["title"])
+        elif self.mode == "all" and not (self.loading and self.row_count == 0):
+            # Only a note newer than the top row belongs there; an older one
+            # (e.g. renamed before its page loaded) arrives with its page. A
+            # first page still in flight will include the note anyway.
+            if self.newest is None or sort_key(note) > self.newest:
+                self.newest = sort_key(note)
+                self.insert_row(note, index=0)
+
+    def remove_note(self, note_id):
+        if self.note_tree.exists(str(note_id)):
+            self.note_tree.delete(str(note_id))
 
     def on_note_select(self, event):
         selected = self.note_tree.selection()
         if selected:
-            note_id = self.note_tree.item(selected[0])["values"][0]
-            self.on_select(note_id)
+            # Taken from the iid: ttk turns numeric-looking values (e.g. a
+            # vault named 2024) into ints
+            vault, _, note_id = selected[0].rpartition(":")
+            self.on_select(int(note_id), vault=vault or None)
@@ -0,0 +1,110 @@
+import logging
+import queue
+import threading
+import time
+
+from utils import instrumentation
+
+logger = logging.getLogger(__name__)
+
+DEBOUNCE_MS = 120
+POLL_MS = 15
+LATENCY_BUDGET_MS = 200
+
+
+class PreviewPipeline:
+    def __init__(self, widget, get_text, render, paint, delay_ms=DEBOUNCE_MS):
+        self.widget = widget
+        self.get_text = get_text
+        self.render = render
+        self.paint = paint
+        self.delay_ms = delay_ms
+
+        self.generation = 0
+        self.submitted = 0
+        self.keystroke_times = {}
+        self.last_text = None
+        self.pending = None
+        self.poll_id = None
+        self.last_latency_ms = None
+        self.over_budget = 0
+
+        self.requests = queue.Queue()
+        self.results = queue.Queue()
+        self.worker = threading.Thread(target=self.work, daemon=True)
+        self.worker.start()
+
+    def schedule(self, delay_ms=None):
+        self.generation += 1
+        self.keystroke_times[self.generation] = time.perf_counter()
+        if self.pending is not None:
+            self.widget.after_cancel(self.pending)
+        delay = self.delay_ms if delay_ms is None else delay_ms
+        self.pending = self.widget.after(delay, self.submit)
+
+    def cancel(self):
+        # Anything already queued or rendering becomes stale
+        if self.pending is not None:
+            self.widget.after_cancel(self.pending)
+            self.pending = None
+        if self.poll_id is not None:
+            self.widget.after_cancel(self.poll_id)
+            self.poll_id = None
+        self.generation += 1
+        self.submitted = self.generation
+        self.keystroke_times.clear()
+        self.last_text = None
+
+    def submit(self):
+        self.pending = None
+        text = self.get_text()
+        if text == self.last_text:
+            self.keystroke_times.clear()
+            return
+        self.last_text = text
+        self.submitted = self.generation
+        self.requests.put((self.generation, text))
+        if self.poll_id is None:
+            self.poll_id = self.widget.after(POLL_MS, self.poll)
+
+    def work(self):
+        while True:
+            generation, text = self.requests.get()
+            # Only the newest request matters; skip ones superseded while queued
+            while not self.requests.empty():
+                generation, text = self.requests.get_nowait()
+            if generation != self.submitted:
+                continue
+            try:
+                result = self.render(text)
+            except Exception:
+                logger.exception("Preview render failed")
+                result = None
+            self.results.put((generation, result))
+
+    def poll(self):
+        latest = None
+        while not self.results.empty():
+            latest = self.results.get_nowait()
+        if latest is None or latest[0] != self.submitted:
+            self.poll_id = self.widget.after(POLL_MS, self.poll)
+            return
+        self.poll_id = None
+        generation, result = latest
+        if result is None:
+            self.keystroke_times.clear()
+            return
+        self.paint(result)
+        started = self.keystroke_times.get(generation)
+        self.keystroke_times.clear()
+        if started is not None:
+            self.last_latency_ms = (time.perf_counter() - started) * 1000
+            if instrumentation.stats is not None:
+                instrumentation.stats.record("ui.preview.keystroke_to_paint", self.last_latency_ms)
+            if self.last_latency_ms > LATENCY_BUDGET_MS:
+                self.over_budget += 1
+                logger.warning(
+                    "Preview took %.0f ms from keystroke to paint (budget %d ms)",
+                    self.last_latency_ms,
+                    LATENCY_BUDGET_MS,
+                )
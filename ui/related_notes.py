@@ -0,0 +1,59 @@
+import ttkbootstrap as ttk
+from ttkbootstrap.constants import *
+
+RELATED_COUNT = 10
+
+
+class RelatedNotes(ttk.LabelFrame):
+    def __init__(self, parent, executor, index, on_select):
+        super().__init__(parent, text="Related Notes", style="Card.TLabelframe")
+        self.executor = executor
+        self.index = index
+        self.on_select = on_select
+
+        self.note_tree = ttk.Treeview(
+            self,
+            columns=("id", "title", "score"),
+            displaycolumns=("title", "score"),
+            show="headings",
+            style="Treeview",
+        )
+        self.note_tree.heading("title", text="Title")
+        self.note_tree.heading("score", text="Similarity")
+        self.note_tree.column("title", width=180)
+        self.note_tree.column("score", width=70, stretch=False, anchor=E)
+        self.note_tree.pack(fill=BOTH, expand=True, padx=5, pady=5)
+        self.note_tree.bind("<<TreeviewSelect>>", self.on_note_select)
+
+    def show_for(self, note_id):
+        # Scoring runs on the database worker, which also owns the titles
+        self.executor.submit(
+            self.fetch, note_id, key="related_notes", callback=self.show
+        )
+
+    def fetch(self, db, note_id):
+        # index is None until MainWindow has imported it
+        if self.index is None:
+            return []
+        related = []
+        for other_id, score in self.index.related(note_id, RELATED_COUNT):
+            note = db.get_note_summary(other_id)
+            if note is not None:
+                related.append((other_id, note["title"], score))
+        return related
+
+    def show(self, related):
+        self.note_tree.delete(*self.note_tree.get_children())
+        for note_id, title, score in related:
+            self.note_tree.insert(
+                "", END, iid=str(note_id), values=(note_id, title, f"{score:.2f}")
+            )
+
+    def clear(self):
+        self.executor.cancel("related_notes")
+        self.note_tree.delete(*self.note_tree.get_children())
+
+    def on_note_select(self, event):
+        selected = self.note_tree.selection()
+        if selected:
+            self.on_select(self.note_tree.item(selected[0])["values"][0])
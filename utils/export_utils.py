@@ -1,18 +1,71 @@
+import gzip
 import json
+from datetime import datetime
+
+EXPORT_FIELDS = ("id", "title", "content", "tags", "category", "created_at")
+
+
+def _timestamp(value):
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.isoformat()
+    try:
+        return datetime.fromisoformat(value).isoformat()
+    except ValueError:
+        return value
+
+
+def note_to_dict(note, fields=EXPORT_FIELDS):
+    data = {field: note[field] for field in fields}
+    for field in ("created_at", "updated_at"):
+        if field in data:
+            data[field] = _timestamp(data[field])
+    return data
+
+
+def export_notes(
+    db,
+    filename,
+    fmt="json",
+    compress=None,
+    since=None,
+    after_id=None,
+    progress=None,
+    cancel=None,
+    batch_size=500,
+):
+    # Streams notes straight from a database cursor; memory stays flat with vault size
+    if compress is None:
+        compress = filename.endswith(".gz")
+    fields = EXPORT_FIELDS if since is None else EXPORT_FIELDS + ("updated_at",)
+    total = db.count_notes(since, after_id) if progress else None
+    opener = gzip.open if compress else open
+    written = 0
+    with opener(filename, "wt", encoding="utf-8") as f:
+        if fmt == "json":
+            f.write("[")
+        for note in db.iter_notes(since, after_id, batch_size):
+            data = note_to_dict(note, fields)
+            if fmt == "json":
+                # Same layout json.dump(..., indent=2) gives the whole list
+                f.write(",\n  " if written else "\n  ")
+                f.write(json.dumps(data, indent=2).replace("\n", "\n  "))
+            else:
+                f.write(json.dumps(data, ensure_ascii=False))
+                f.write("\n")
+            written += 1
+            if written % batch_size == 0:
+                if progress:
+                    progress(written, total)
+                if cancel is not None and cancel.is_set():
+                    break
+        if fmt == "json":
+            f.write("\n]" if written else "]")
+    if progress and (written % batch_size or not written):
+        progress(written, total)
+    return written
 
 
 def export_notes_to_json(db, filename):
-    notes = db.get_all_notes()
-    notes_data = [
-        {
-            "id": note["id"],
-            "title": note["title"],
-            "content": note["content"],
-            "tags": note["tags"],
-            "category": note["category"],
-            "created_at": note["created_at"].isoformat(),
-        }
-        for note in notes
-    ]
-    with open(filename, "w") as f:
-        json.dump(notes_data, f, indent=2)
+    return export_notes(db, filename, "json")
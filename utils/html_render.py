@@ -0,0 +1,163 @@
+import bisect
+import re
+from html.parser import HTMLParser
+
+INLINE_TAGS = {
+    "strong": "bold",
+    "b": "bold",
+    "em": "italic",
+    "i": "italic",
+    "code": "code",
+    "a": "link",
+}
+BLOCK_TAGS = {
+    "h1": "h1",
+    "h2": "h2",
+    "h3": "h3",
+    "h4": "h4",
+    "h5": "h5",
+    "h6": "h6",
+    "pre": "pre",
+    "blockquote": "blockquote",
+    "p": None,
+    "div": None,
+    "table": None,
+    "dl": None,
+}
+LIST_TAGS = ("ul", "ol")
+MAX_LIST_DEPTH = 3
+
+WHITESPACE = re.compile(r"\s+")
+
+
+class TextLayout(HTMLParser):
+    # One pass over the HTML: plain text chunks plus (start, end) offsets per tag
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.chunks = []
+        self.length = 0
+        self.ranges = {}
+        self.open_tags = []
+        self.lists = []
+        self.pre_depth = 0
+        self.at_line_start = True
+        # Nothing emitted yet since the last list bullet
+        self.item_start = False
+
+    def emit(self, text):
+        if text:
+            self.chunks.append(text)
+            self.length += len(text)
+            self.at_line_start = text.endswith("\n")
+            self.item_start = False
+
+    def break_line(self, blank=False):
+        if self.length == 0:
+            return
+        tail = "".join(self.chunks[-2:])
+        wanted = "\n\n" if blank else "\n"
+        missing = len(wanted) - (len(tail) - len(tail.rstrip("\n")))
+        if missing > 0:
+            self.emit("\n" * missing)
+
+    def open_tag(self, name):
+        self.open_tags.append((name, self.length))
+
+    def close_tag(self, name):
+        for i in range(len(self.open_tags) - 1, -1, -1):
+            if self.open_tags[i][0] == name:
+                _, start = self.open_tags.pop(i)
+                if self.length > start:
+                    self.ranges.setdefault(name, []).append((start, self.length))
+                return
+
+    def handle_starttag(self, tag, attrs):
+        if tag in INLINE_TAGS:
+            self.open_tag(INLINE_TAGS[tag])
+        elif tag in BLOCK_TAGS:
+            # The first paragraph of a loose list item goes on the bullet's line
+            if not self.item_start:
+                self.break_line(blank=not self.lists)
+            if tag == "pre":
+                self.pre_depth += 1
+            if BLOCK_TAGS[tag]:
+                self.open_tag(BLOCK_TAGS[tag])
+        elif tag in LIST_TAGS:
+            self.break_line(blank=not self.lists)
+            self.lists.append([tag, 0])
+        elif tag == "li":
+            self.break_line()
+            depth = min(len(self.lists), MAX_LIST_DEPTH) or 1
+            self.open_tag(f"list{depth}")
+            if self.lists and self.lists[-1][0] == "ol":
+                self.lists[-1][1] += 1
+                self.emit(f"{self.lists[-1][1]}. ")
+            else:
+                self.emit("• ")
+            # Text after the bullet starts like a new line: no leading spaces
+            self.item_start = True
+            self.at_line_start = True
+        elif tag == "br":
+            self.emit("\n")
+        elif tag == "hr":
+            self.break_line()
+            self.emit("―" * 20)
+            self.break_line(blank=True)
+
+    def handle_endtag(self, tag):
+        if tag in INLINE_TAGS:
+            self.close_tag(INLINE_TAGS[tag])
+        elif tag in BLOCK_TAGS:
+            if BLOCK_TAGS[tag]:
+                self.close_tag(BLOCK_TAGS[tag])
+            if tag == "pre":
+                self.pre_depth -= 1
+            self.break_line(blank=not self.lists)
+        elif tag in LIST_TAGS:
+            if self.lists:
+                self.lists.pop()
+            self.break_line(blank=not self.lists)
+        elif tag == "li":
+            self.close_tag(f"list{min(len(self.lists), MAX_LIST_DEPTH) or 1}")
+            self.break_line()
+
+    def handle_data(self, data):
+        if self.pre_depth:
+            self.emit(data)
+            return
+        data = WHITESPACE.sub(" ", data)
+        if self.at_line_start:
+            data = data.lstrip(" ")
+        self.emit(data)
+
+    def result(self):
+        while self.open_tags:
+            self.close_tag(self.open_tags[-1][0])
+        text = "".join(self.chunks).rstrip("\n")
+        end = len(text)
+        ranges = {
+            tag: [(start, min(stop, end)) for start, stop in spans if start < end]
+            for tag, spans in self.ranges.items()
+        }
+        return text, ranges
+
+
+def render_html(html):
+    layout = TextLayout()
+    layout.feed(html)
+    layout.close()
+    return layout.result()
+
+
+class IndexMapper:
+    # Converts character offsets to Tk "line.column" indexes without rescanning
+    def __init__(self, text):
+        self.line_starts = [0]
+        position = text.find("\n")
+        while position != -1:
+            self.line_starts.append(position + 1)
+            position = text.find("\n", position + 1)
+
+    def index(self, offset):
+        line = bisect.bisect_right(self.line_starts, offset) - 1
+        return f"{line + 1}.{offset - self.line_starts[line]}"
@@ -0,0 +1,162 @@
+import gzip
+import json
+import os
+import re
+import time
+from datetime import datetime
+
+JSON_CHUNK = 1024 * 1024
+SEPARATORS = re.compile(r"[\s,]*")
+
+
+def _open_text(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, encoding="utf-8")
+
+
+def read_json(path):
+    # Streams the elements of a top-level JSON array, as written by export_notes
+    decoder = json.JSONDecoder()
+    with _open_text(path) as f:
+        buffer = f.read(JSON_CHUNK).lstrip()
+        if not buffer.startswith("["):
+            raise ValueError(f"{path} does not contain a JSON array")
+        pos = 1
+        eof = False
+        while True:
+            pos = SEPARATORS.match(buffer, pos).end()
+            if buffer.startswith("]", pos):
+                return
+            try:
+                item, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                chunk = f.read(JSON_CHUNK)
+                eof = not chunk
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                continue
+            yield item
+
+
+def read_jsonl(path):
+    with _open_text(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def parse_front_matter(text):
+    if not text.startswith("---"):
+        return {}, text
+    end = text.find("\n---", 3)
+    if end == -1:
+        return {}, text
+    meta = {}
+    for line in text[3:end].strip().splitlines():
+        key, sep, value = line.partition(":")
+        if sep:
+            value = value.strip().strip("\"'")
+            if value.startswith("[") and value.endswith("]"):
+                value = ",".join(v.strip().strip("\"'") for v in value[1:-1].split(","))
+            meta[key.strip().lower()] = value
+    body = text[end + 4 :]
+    return meta, body.lstrip("\n")
+
+
+def read_markdown_dir(path):
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            if not name.lower().endswith(".md"):
+                continue
+            file_path = os.path.join(root, name)
+            with open(file_path, encoding="utf-8") as f:
+                meta, body = parse_front_matter(f.read())
+            title = meta.get("title")
+            if not title:
+                first_line = body.split("\n", 1)[0]
+                if first_line.startswith("# "):
+                    title = first_line[2:].strip()
+                else:
+                    title = os.path.splitext(name)[0]
+            modified = datetime.fromtimestamp(os.path.getmtime(file_path))
+            yield {
+                "title": title,
+                "content": body.strip(),
+                "tags": meta.get("tags", ""),
+                "category": meta.get("category", "General"),
+                "created_at": meta.get("created_at") or meta.get("date") or modified,
+                "updated_at": meta.get("updated_at") or modified,
+            }
+
+
+READERS = {"json": read_json, "jsonl": read_jsonl, "markdown": read_markdown_dir}
+
+
+def detect_format(path):
+    if os.path.isdir(path):
+        return "markdown"
+    if path.endswith((".jsonl", ".jsonl.gz")):
+        return "jsonl"
+    return "json"
+
+
+def _timestamp(value, default):
+    if not value:
+        return default
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        return default
+
+
+def note_row(item, now):
+    created_at = _timestamp(item.get("created_at"), now)
+    return (
+        item.get("title") or "Untitled",
+        item.get("content") or "",
+        item.get("tags") or "",
+        # An exported note without a category keeps NULL; files that have
+        # no category field at all get the default
+        item.get("category", "General"),
+        created_at,
+        _timestamp(item.get("updated_at"), created_at),
+    )
+
+
+def import_notes(db, path, fmt=None, batch_size=5000, progress=None, resume=True):
+    # Batched, resumable import; returns (notes imported, notes per second)
+    fmt = fmt or detect_format(path)
+    source = f"{fmt}:{os.path.abspath(path)}"
+    skip = db.get_import_position(source) if resume else 0
+    position = 0
+    imported = 0
+    batch = []
+    now = datetime.now()
+    start = time.perf_counter()
+
+    def flush():
+        nonlocal imported, batch
+        imported += db.bulk_insert_notes(batch, source, position)
+        batch = []
+        if progress:
+            progress(imported, imported / max(time.perf_counter() - start, 1e-9))
+
+    for item in READERS[fmt](path):
+        position += 1
+        if position <= skip:
+            continue
+        batch.append(note_row(item, now))
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    db.finish_import(source)
+    rate = imported / max(time.perf_counter() - start, 1e-9)
+    return imported, rate
@@ -0,0 +1,263 @@
+import bisect
+import functools
+import inspect
+import json
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Upper bounds (ms) of the latency histogram buckets; the last one is open-ended
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "REPLACE")
+MAX_CAPTURED_STATEMENTS = 50
+# The trace callback sees SQL with the parameters filled in, note bodies
+# included; longer string and blob literals are cut down to this many chars
+MAX_LITERAL_LENGTH = 40
+MAX_LOGGED_SQL_LENGTH = 2000
+LITERAL = re.compile(r"([xX]?)'((?:[^']|'')*)'")
+
+# Global registry; None unless instrumentation was enabled
+stats = None
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+
+    def add(self, ms, rows=None):
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        if rows is not None:
+            self.rows += rows
+
+    def percentile(self, fraction):
+        # Bucket upper bound containing the requested fraction of samples
+        target = fraction * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS_MS + (self.max_ms,), self.counts):
+            seen += count
+            if seen >= target:
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "mean_ms": self.total_ms / self.count if self.count else 0.0,
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "max_ms": self.max_ms,
+            "rows": self.rows,
+            "buckets": dict(
+                zip([f"<={b}" for b in BUCKETS_MS] + ["inf"], self.counts)
+            ),
+        }
+
+
+class Stats:
+    def __init__(self, slow_ms=50, slow_log_size=100):
+        self.slow_ms = slow_ms
+        self.histograms = {}
+        self.slow_queries = deque(maxlen=slow_log_size)
+        self.lock = threading.Lock()
+
+    def record(self, name, ms, rows=None):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.add(ms, rows)
+
+    def record_slow(self, entry):
+        with self.lock:
+            self.slow_queries.append(entry)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "timings": {
+                    name: histogram.snapshot()
+                    for name, histogram in sorted(self.histograms.items())
+                },
+                "slow_queries": list(self.slow_queries),
+            }
+
+    def dump(self, path):
+        with open(path, "w") as f:
+            json.dump(self.snapshot(), f, indent=2)
+
+    def format(self):
+        snapshot = self.snapshot()
+        lines = [f"{'name':<40}{'count':>8}{'mean':>9}{'p95':>9}{'max':>9}{'rows':>9}"]
+        for name, t in snapshot["timings"].items():
+            lines.append(
+                f"{name:<40}{t['count']:>8}{t['mean_ms']:>9.2f}{t['p95_ms']:>9.2f}{t['max_ms']:>9.2f}{t['rows']:>9}"
+            )
+        lines.append("")
+        lines.append(f"Slow calls (>= {self.slow_ms} ms), newest last:")
+        for entry in snapshot["slow_queries"]:
+            lines.append(f"  {entry['name']}  {entry['ms']:.1f} ms")
+            for statement in entry["statements"]:
+                lines.append(f"    {statement['sql'][:200]}")
+                for step in statement["plan"]:
+                    lines.append(f"      {step}")
+        return "\n".join(lines)
+
+
+def enable(slow_ms=50):
+    global stats
+    stats = Stats(slow_ms)
+    return stats
+
+
+def record(name, ms, rows=None):
+    # For spans that start and end in different callbacks
+    if stats is not None:
+        stats.record(name, ms, rows)
+
+
+@contextmanager
+def timed(name, rows=None):
+    if stats is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.record(name, (time.perf_counter() - start) * 1000, rows)
+
+
+def _row_count(result):
+    if isinstance(result, (list, tuple)):
+        return len(result)
+    if result is None:
+        return 0
+    return 1
+
+
+def _query_plan(conn, sql):
+    try:
+        return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql)]
+    except Exception as e:
+        return [f"(no plan: {e})"]
+
+
+def _shorten_literal(match):
+    prefix, body = match.groups()
+    if len(body) <= MAX_LITERAL_LENGTH:
+        return match.group(0)
+    if prefix:
+        # Cut hex would not parse; an empty blob keeps the plan the same
+        return prefix + "''"
+    body = body[:MAX_LITERAL_LENGTH]
+    # An odd number of quotes means the cut split an escaped ''
+    if body.count("'") % 2:
+        body = body[:-1]
+    return f"'{body}…'"
+
+
+def shorten_sql(sql):
+    # Whitespace collapsed and long literals cut, still valid for EXPLAIN
+    return LITERAL.sub(_shorten_literal, " ".join(sql.split()))
+
+
+def instrument_database(db, registry=None):
+    # Wraps the public methods of one Database instance in place
+    registry = registry or stats
+    local = threading.local()
+
+    def trace(sql):
+        captured = getattr(local, "statements", None)
+        if captured is not None:
+            sql = shorten_sql(sql)
+            # Trigger and FTS sub-statements repeat the outer SQL or are internal
+            if (
+                sql.upper().startswith(EXPLAINABLE)
+                and (not captured or captured[-1] != sql)
+                and len(captured) < MAX_CAPTURED_STATEMENTS
+            ):
+                captured.append(sql)
+
+    connect = db._connect
+
+    def traced_connect():
+        conn = connect()
+        conn.set_trace_callback(trace)
+        return conn
+
+    db._connect = traced_connect
+    for conn in list(db._connections):
+        conn.set_trace_callback(trace)
+
+    def wrap(name, method):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            outer = getattr(local, "statements", None) is None
+            if outer:
+                local.statements = []
+            start = time.perf_counter()
+            try:
+                result = method(*args, **kwargs)
+            finally:
+                ms = (time.perf_counter() - start) * 1000
+                statements = local.statements
+                if outer:
+                    local.statements = None
+            registry.record(f"db.{name}", ms, _row_count(result))
+            if outer and ms >= registry.slow_ms:
+                conn = db.conn
+                registry.record_slow(
+                    {
+                        "name": f"db.{name}",
+                        "ms": ms,
+                        "at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                        "statements": [
+                            {"sql": sql[:MAX_LOGGED_SQL_LENGTH], "plan": _query_plan(conn, sql)}
+                            for sql in statements
+                        ],
+                    }
+                )
+            return result
+
+        return wrapper
+
+    for name, method in inspect.getmembers(db, inspect.ismethod):
+        if name.startswith("_") or name in ("close", "release"):
+            continue
+        if inspect.isgeneratorfunction(method):
+            continue
+        setattr(db, name, wrap(name, method))
+    return db
+
+
+class EventLoopLagMonitor:
+    # Schedules a probe every interval and records how late it actually ran
+    def __init__(self, widget, interval_ms=100, registry=None):
+        self.widget = widget
+        self.interval_ms = interval_ms
+        self.registry = registry or stats
+        self.expected = None
+        self.after_id = None
+
+    def start(self):
+        self.expected = time.perf_counter() + self.interval_ms / 1000
+        self.after_id = self.widget.after(self.interval_ms, self.probe)
+
+    def stop(self):
+        if self.after_id is not None:
+            self.widget.after_cancel(self.after_id)
+            self.after_id = None
+
+    def probe(self):
+        lag = max(0.0, (time.perf_counter() - self.expected) * 1000)
+        self.registry.record("tk.event_loop_lag", lag)
+        self.start()
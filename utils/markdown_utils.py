@@ -1,6 +1,22 @@
-import markdown
+import threading
+
+# Building a Markdown instance loads every extension, so each thread keeps one
+_local = threading.local()
+
+
+def get_converter():
+    md = getattr(_local, "md", None)
+    if md is None:
+        # Imported on first use so startup does not pay for it
+        import markdown
+
+        md = _local.md = markdown.Markdown(extensions=["extra"])
+    return md
 
 
 def markdown_to_html(text):
-    md = markdown.Markdown(extensions=["extra"])
-    return md.convert(text)
+    md = get_converter()
+    try:
+        return md.convert(text)
+    finally:
+        md.reset()
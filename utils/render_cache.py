@@ -0,0 +1,76 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def content_hash(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class RenderCache:
+    # LRU of rendered HTML keyed by content hash, optionally backed by the database
+    def __init__(self, convert, max_bytes=32 * 1024 * 1024, db=None):
+        self.convert = convert
+        self.max_bytes = max_bytes
+        self.db = db
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.stored_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def render(self, text, note_id=None):
+        key = content_hash(text)
+        with self.lock:
+            html = self.entries.get(key)
+            if html is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return html
+        if note_id is not None and self.db is not None:
+            html = self.db.get_rendered_note(note_id, key)
+            if html is not None:
+                with self.lock:
+                    self.stored_hits += 1
+                self.put(key, html)
+                return html
+        html = self.convert(text)
+        with self.lock:
+            self.misses += 1
+        self.put(key, html)
+        if note_id is not None and self.db is not None:
+            self.db.save_rendered_note(note_id, text, key, html)
+        return html
+
+    def put(self, key, html):
+        cost = len(key) + len(html)
+        if cost > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.size -= len(key) + len(self.entries.pop(key))
+            self.entries[key] = html
+            self.size += cost
+            while self.size > self.max_bytes:
+                old_key, old_html = self.entries.popitem(last=False)
+                self.size -= len(old_key) + len(old_html)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "stored_hits": self.stored_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }